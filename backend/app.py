@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -39,9 +39,23 @@ migrate = Migrate(app, db)
 
 # Imports made after db is initialized
 from models.user import User
+from models.order import OrderRecord, FillRecord
 from routes import trading_routes, auth_routes
 from routes import conversation_routes
-from services import ib_service
+from services import ib_broker, ib_service, metrics_service, order_service
+
+# Persist the order book through the app's database (the broker process owns
+# the order book when web workers share one)
+if not ib_broker.enabled():
+    order_service.init_app(app)
+
+# Route latency histograms, plus per-request profiling behind X-Profile
+metrics_service.init_app(app)
+if ib_broker.enabled():
+    # A scrape reaches any one worker, so each keeps the broker's copy current
+    metrics_service.start_reporting(
+        lambda snapshot: ib_broker.call("metrics_service", "collect", os.getpid(), snapshot)
+    )
 
 # Register blueprints
 app.register_blueprint(trading_routes.bp)
@@ -60,6 +74,48 @@ def test_endpoint():
     return jsonify(response)
 
 
+def _ib_connection_state():
+    if not ib_broker.enabled():
+        return ib_service.get_connection_state()
+    try:
+        return ib_broker.call("ib_service", "get_connection_state")
+    except ConnectionError as e:
+        return {"state": "broker unreachable", "connected": False, "last_error": str(e)}
+
+
+# Liveness: the process is up and serving, whatever the state of IBKR
+@app.route("/api/health", methods=["GET"])
+def health():
+    return jsonify({"status": "ok", "ib": _ib_connection_state()})
+
+
+# Readiness: 503 until IBKR is connected (and again while reconnecting)
+@app.route("/api/ready", methods=["GET"])
+def ready():
+    ib_state = _ib_connection_state()
+    if ib_state["connected"]:
+        return jsonify({"ready": True, "ib": ib_state})
+    return jsonify({"ready": False, "ib": ib_state}), 503
+
+
+# Prometheus metrics. With a broker, the totals across every worker (each as of
+# its last report) plus the broker's own IB round-trips, loop lag and in-flight
+# futures, so counters do not jump between scrapes that reach different workers
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    snapshots = [metrics_service.snapshot()]
+    if ib_broker.enabled():
+        try:
+            snapshots = ib_broker.call(
+                "metrics_service", "collect", os.getpid(), snapshots[0]
+            )
+        except ConnectionError as e:
+            print(f"--- Could not collect broker metrics: {e} ---")
+    return Response(
+        metrics_service.render(*snapshots), mimetype="text/plain; version=0.0.4"
+    )
+
+
 # Root endpoint
 @app.route("/", methods=["GET"])
 async def root():
@@ -68,6 +124,9 @@ async def root():
             "message": "Welcome to the API",
             "endpoints": {
                 "test": "/api/test",
+                "health": "/api/health",
+                "ready": "/api/ready",
+                "metrics": "/api/metrics",
                 "auth": "/api/auth",
                 "trading": "/api/trading",
             },
@@ -75,17 +134,20 @@ async def root():
     )
 
 
-# Initialize IBKR connection at start up
-print("=== Server starting. Establishing IBKR connection ===")
-ib_service.startup_ib_connection()
-app.ib_connected = ib_service.ib.isConnected()
-if app.ib_connected:
-    print("=== Successfully connected to IBKR ===")
+if ib_broker.enabled():
+    # One broker process holds the IBKR connection for every worker
+    print(f"=== Server starting. Using IB broker at {ib_broker.broker_address()} ===")
+elif os.getenv("ASGI_SERVER"):
+    # asgi.py connects on the server's own event loop once it is running
+    pass
 else:
-    print("=== Failed to connect to IBKR ===")
+    # Connect to IBKR in the background (retrying until it is up) so startup
+    # never waits on the gateway; /api/ready reports when it is connected
+    print("=== Server starting. Connecting to IBKR in the background ===")
+    ib_service.startup_ib_connection()
 
-# Discconect from IBKR API when server shutdown process begins
-atexit.register(ib_service.disconnect_from_ib)
+    # Discconect from IBKR API when server shutdown process begins
+    atexit.register(ib_service.disconnect_from_ib)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+# uvicorn asgi:app --host 127.0.0.1 --port 5000
+#
+# Single-process async server. ib_async runs on the server's own event loop, so
+# the IB-backed trading routes (routes/async_trading_routes.py) await it
+# directly and a stream costs a coroutine rather than a thread. Every other
+# route is the Flask app, run on a thread pool; its IB calls reach the same loop.
+# IB allows one session per client id, so run one process and no IB broker.
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+# Tells app.py not to start its own IB loop thread
+os.environ["ASGI_SERVER"] = "1"
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Mount
+
+from app import app as flask_app
+from routes import async_trading_routes
+from services import ib_broker, ib_service, metrics_service
+
+if ib_broker.enabled():
+    raise RuntimeError("asgi.py holds the IBKR connection itself, unset IB_BROKER_ADDRESS")
+
+# Threads for the Flask routes; their IB calls wait here without blocking the loop
+WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "8"))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    print("=== Server starting. Connecting to IBKR on the server event loop ===")
+    ib_service.startup_ib_connection(asyncio.get_running_loop())
+    yield
+    ib_service.disconnect_from_ib()
+
+
+app = metrics_service.asgi_middleware(
+    Starlette(
+        routes=[
+            *async_trading_routes.routes,
+            Mount("/", WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+        ],
+        middleware=[
+            Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+        ],
+        lifespan=lifespan,
+    )
+)
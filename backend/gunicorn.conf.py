@@ -0,0 +1,83 @@
+# gunicorn -c gunicorn.conf.py app:app
+#
+# Every worker imports app.py, but IB only accepts one session per client id,
+# so a single broker process (services/ib_broker.py) owns the IBKR connection
+# and the workers reach it over a local socket.
+import multiprocessing
+import os
+import secrets
+import subprocess
+import sys
+import time
+
+# gunicorn reads this file before it puts the working directory on sys.path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+from dotenv import load_dotenv
+
+# A key from .env counts as set explicitly
+load_dotenv()
+
+from services.ib_broker import DEFAULT_ADDRESS, parse_address
+
+# Set before any worker is forked, which switches app.py into broker-client mode
+os.environ.setdefault("IB_BROKER_ADDRESS", DEFAULT_ADDRESS)
+if not os.getenv("IB_BROKER_AUTHKEY"):
+    if not isinstance(parse_address(os.environ["IB_BROKER_ADDRESS"]), str):
+        raise RuntimeError("Set IB_BROKER_AUTHKEY explicitly to serve the IB broker over TCP")
+    # A fresh secret per run, inherited by the broker and the workers
+    os.environ["IB_BROKER_AUTHKEY"] = secrets.token_hex(32)
+
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+# SSE streams hold a thread each for their whole lifetime
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = 60
+
+BROKER_START_TIMEOUT = 30
+
+_broker = None
+
+
+def _broker_ready():
+    address = parse_address(os.environ["IB_BROKER_ADDRESS"])
+    if isinstance(address, str):
+        return os.path.exists(address)
+    import socket
+
+    try:
+        socket.create_connection(address, timeout=1).close()
+        return True
+    except OSError:
+        return False
+
+
+def on_starting(server):
+    global _broker
+    address = os.environ["IB_BROKER_ADDRESS"]
+    if isinstance(parse_address(address), str) and os.path.exists(address):
+        os.remove(address)
+
+    _broker = subprocess.Popen(
+        [sys.executable, "-m", "services.ib_broker"],
+        cwd=BACKEND_DIR,
+    )
+    deadline = time.monotonic() + BROKER_START_TIMEOUT
+    while not _broker_ready():
+        if _broker.poll() is not None:
+            raise RuntimeError(f"IB broker exited with code {_broker.returncode}")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"IB broker did not start listening on {address}")
+        time.sleep(0.1)
+    server.log.info(f"IB broker running (pid {_broker.pid}) at {address}")
+
+
+def on_exit(server):
+    if _broker and _broker.poll() is None:
+        _broker.terminate()
+        try:
+            _broker.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _broker.kill()
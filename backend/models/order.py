@@ -0,0 +1,36 @@
+from app import db
+from datetime import datetime
+
+
+class OrderRecord(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    ib_order_id = db.Column(db.Integer, index=True)
+    symbol = db.Column(db.String(20), nullable=False)
+    request = db.Column(db.Text, nullable=False)
+    legs = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False)
+    filled = db.Column(db.Float, default=0)
+    remaining = db.Column(db.Float, default=0)
+    avg_fill_price = db.Column(db.Float, default=0)
+    error = db.Column(db.String(255))
+    submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    placed_at = db.Column(db.DateTime)
+    first_fill_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<OrderRecord {self.id} {self.status}>'
+
+
+class FillRecord(db.Model):
+    exec_id = db.Column(db.String(64), primary_key=True)
+    order_id = db.Column(db.String(32), db.ForeignKey('order_record.id'), index=True)
+    ib_order_id = db.Column(db.Integer)
+    local_symbol = db.Column(db.String(40))
+    side = db.Column(db.String(10))
+    shares = db.Column(db.Float)
+    price = db.Column(db.Float)
+    time = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<FillRecord {self.exec_id}>'
@@ -0,0 +1,199 @@
+# The IB-backed trading routes for the ASGI server (asgi.py). They run on the
+# same event loop as ib_async and await it directly, where the Flask versions in
+# trading_routes.py park a thread on a future for every IB call. Paths, query
+# parameters and responses match the Flask routes.
+import asyncio
+
+from flask import json
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from routes.trading_routes import (
+    ORDER_FIELDS,
+    STREAM_HEARTBEAT_SECONDS,
+    TIMEOUT_ERRORS,
+    _is_batch_order,
+    _parse_order,
+    _sse,
+)
+from services import account_state_service, ib_service, order_service
+
+PREFIX = "/api/trading"
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+class _JSONResponse(JSONResponse):
+    # Encoded like Flask's jsonify (dates, NaN) so both servers answer alike
+    def render(self, content):
+        return json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _error(message, status):
+    return _JSONResponse({"error": message}, status_code=status)
+
+
+async def get_account_summary(request: Request):
+    try:
+        if account_state_service.is_ready():
+            return _JSONResponse(account_state_service.get_snapshot()["account"])
+
+        summary = await ib_service.get_account_summary_async()
+        return _JSONResponse({item.tag: (item.value, item.currency) for item in summary})
+    except ConnectionError as e:
+        return _error(str(e), 503)
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def get_portfolio(request: Request):
+    try:
+        if account_state_service.is_ready():
+            return _JSONResponse(account_state_service.get_snapshot()["portfolio"])
+
+        portfolio = await ib_service.get_portfolio_async()
+        return _JSONResponse(
+            [account_state_service.portfolio_item_to_dict(item) for item in portfolio]
+        )
+    except ConnectionError as e:
+        return _error(str(e), 503)
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def get_historic_data_batch(request: Request):
+    symbols = request.query_params.get("symbols", "")
+    bar_size = request.query_params.get("bar", ib_service.STREAM_BAR_SIZE)
+    duration = request.query_params.get("duration", ib_service.STREAM_DURATION)
+
+    try:
+        data = await ib_service.get_historic_bars_async(symbols.split(","), bar_size, duration)
+        return _JSONResponse(data)
+    except ValueError as e:
+        return _error(str(e), 400)
+    except ConnectionError as e:
+        return _error(str(e), 503)
+    except TIMEOUT_ERRORS:
+        return _error("Request to IBKR timed out.", 504)
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def get_historic_data(request: Request):
+    symbol = request.path_params["symbol"]
+    try:
+        return _JSONResponse(await ib_service.get_historic_market_data_async(symbol))
+    except ConnectionError as e:
+        return _error(str(e), 503)
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def stream_historic_data(request: Request):
+    symbol = request.path_params["symbol"]
+    try:
+        snapshot, updates = await ib_service.listen_market_data_async(symbol)
+    except ConnectionError as e:
+        return _error(str(e), 503)
+    except TIMEOUT_ERRORS:
+        return _error("Request to IBKR timed out.", 504)
+    except Exception as e:
+        return _error(str(e), 500)
+
+    # Cancelled when the client disconnects, which runs the finally
+    async def events():
+        try:
+            yield _sse("snapshot", {"symbol": symbol.upper(), "data": snapshot})
+            while True:
+                try:
+                    event = await asyncio.wait_for(updates.get(), STREAM_HEARTBEAT_SECONDS)
+                except TIMEOUT_ERRORS:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    yield _sse("end", {"symbol": symbol.upper()})
+                    break
+                yield _sse("bar", event)
+        finally:
+            ib_service.unlisten_market_data(symbol, updates)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def place_order(request: Request):
+    data = await _json_body(request)
+    if not isinstance(data, dict) or not all(field in data for field in ORDER_FIELDS):
+        return _error("Missing required fields", 400)
+
+    try:
+        # Only queues the order on this loop, placeOrder runs right after
+        [handle] = ib_service.submit_batch([_parse_order(data)])
+        return _JSONResponse(
+            {"message": "Order submitted.", "orderHandle": handle, "status": "Submitting"},
+            status_code=202,
+        )
+    except ValueError as e:
+        return _error(str(e), 400)
+    except ConnectionError as e:
+        return _error(str(e), 503)
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def place_orders(request: Request):
+    data = await _json_body(request)
+    orders = data.get("orders") if isinstance(data, dict) else None
+    if not orders:
+        return _error("Missing orders", 400)
+    if not all(_is_batch_order(order) for order in orders):
+        return _error("Missing required fields", 400)
+
+    try:
+        handles = ib_service.submit_batch([_parse_order(o) for o in orders])
+        return _JSONResponse({"orderHandles": handles, "status": "Submitting"}, status_code=202)
+    except ValueError as e:
+        return _error(str(e), 400)
+    except ConnectionError as e:
+        return _error(str(e), 503)
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def stream_fills(request: Request):
+    fills = order_service.listen_fills_async()
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    fill = await asyncio.wait_for(fills.get(), STREAM_HEARTBEAT_SECONDS)
+                except TIMEOUT_ERRORS:
+                    yield ": keep-alive\n\n"
+                    continue
+                if fill is None:
+                    break
+                yield _sse("fill", fill)
+        finally:
+            order_service.unlisten_fills(fills)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+routes = [
+    Route(f"{PREFIX}/account-summary", get_account_summary, methods=["GET"]),
+    Route(f"{PREFIX}/portfolio", get_portfolio, methods=["GET"]),
+    Route(f"{PREFIX}/historic-data", get_historic_data_batch, methods=["GET"]),
+    Route(f"{PREFIX}/historic-data/{{symbol}}", get_historic_data, methods=["GET"]),
+    Route(f"{PREFIX}/historic-data/{{symbol}}/stream", stream_historic_data, methods=["GET"]),
+    Route(f"{PREFIX}/place-order", place_order, methods=["POST"]),
+    Route(f"{PREFIX}/place-orders", place_orders, methods=["POST"]),
+    Route(f"{PREFIX}/orders/fills/stream", stream_fills, methods=["GET"]),
+]
@@ -1,19 +1,41 @@
-from flask import Blueprint, json, jsonify, request
-import services.ib_service as ib_service
-import csv
+from flask import Blueprint, Response, json, jsonify, request, stream_with_context
+import asyncio
+import concurrent.futures
 import os
-from pathlib import Path
+import queue
 import services.strategy_log_service as strategy_log_service
+import services.strategy_index_service as strategy_index_service
+import services.past_trades_service as past_trades_service
+import services.ml_service as ml_service
+import services.risk_service as risk_service
+import services.symbol_service as symbol_service
+from services import ib_broker
+
+# IB-backed services live in the broker process when IB_BROKER_ADDRESS is set
+ib_service = ib_broker.service("ib_service")
+account_state_service = ib_broker.service("account_state_service")
+order_service = ib_broker.service("order_service")
 
 from ib_async import PortfolioItem, Stock
 
 bp = Blueprint("trading", __name__, url_prefix="/api/trading")
 
+STREAM_HEARTBEAT_SECONDS = 15
+# Until Python 3.11 the asyncio and concurrent.futures timeouts are not the builtin one
+TIMEOUT_ERRORS = (TimeoutError, asyncio.TimeoutError, concurrent.futures.TimeoutError)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 
 # Getting account smmary for the dashboard
 @bp.route("/account-summary", methods=["GET"])
 def get_account_summary():
     try:
+        if account_state_service.is_ready():
+            return jsonify(account_state_service.get_snapshot()["account"])
+
         summary = ib_service.get_account_summary()
         print("=== RAW ACCOUNT SUMMARY FROM IBKR ===")
         print(summary)
@@ -31,20 +53,12 @@ def get_account_summary():
 @bp.route("/portfolio", methods=["GET"])
 def get_portfolio():
     try:
+        if account_state_service.is_ready():
+            return jsonify(account_state_service.get_snapshot()["portfolio"])
+
         portfolio = ib_service.get_portfolio()
         portfolio_list = [
-            {
-                "symbol": item.contract.symbol,
-                "secType": item.contract.secType,
-                "exchange": item.contract.exchange,
-                "position": item.position,
-                "marketPrice": item.marketPrice,
-                "marketValue": item.marketValue,
-                "averageCost": item.averageCost,
-                "unrealizedPNL": item.unrealizedPNL,
-                "realizedPNL": item.realizedPNL,
-            }
-            for item in portfolio
+            account_state_service.portfolio_item_to_dict(item) for item in portfolio
         ]
         return jsonify(portfolio_list)
     except ConnectionError as e:
@@ -53,6 +67,69 @@ def get_portfolio():
         return jsonify({"error": str(e)}), 500
 
 
+# Portfolio Greeks, spreads and a P&L grid over underlying moves x IV shifts x days
+@bp.route("/risk", methods=["GET"])
+def get_risk():
+    try:
+        risk = risk_service.get_risk(
+            moves=request.args.get("moves", risk_service.MOVE_STEPS, type=int),
+            iv_steps=request.args.get("iv_steps", risk_service.IV_STEPS, type=int),
+            days=request.args.get("days", risk_service.DAY_STEPS, type=int),
+            move_range=request.args.get("move_range", risk_service.MOVE_RANGE, type=float),
+            iv_range=request.args.get("iv_range", risk_service.IV_RANGE, type=float),
+        )
+        return jsonify(risk)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ConnectionError as e:
+        return jsonify({"error": str(e)}), 503
+    except TIMEOUT_ERRORS:
+        return jsonify({"error": "Request to IBKR timed out."}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Versioned account/portfolio mirror. Send If-None-Match with the last ETag for
+# a 304, or ?since=<version> to get only the account tags/positions that changed
+@bp.route("/state", methods=["GET"])
+def get_account_state():
+    snapshot = account_state_service.get_snapshot()
+    etag = str(snapshot["version"])
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    since = request.args.get("since", type=int)
+    delta = account_state_service.get_changes(since) if since is not None else None
+    if delta is not None:
+        response = jsonify({"delta": True, **delta})
+    else:
+        response = jsonify({"delta": False, **snapshot})
+    response.set_etag(etag)
+    return response
+
+
+# Getting OHLCV bars for several symbols, e.g. ?symbols=SPY,QQQ&bar=1 hour&duration=30 D
+@bp.route("/historic-data", methods=["GET"])
+def get_historic_data_batch():
+    symbols = request.args.get("symbols", "")
+    bar_size = request.args.get("bar", ib_service.STREAM_BAR_SIZE)
+    duration = request.args.get("duration", ib_service.STREAM_DURATION)
+
+    try:
+        data = ib_service.get_historic_bars(symbols.split(","), bar_size, duration)
+        return jsonify(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ConnectionError as e:
+        return jsonify({"error": str(e)}), 503
+    except TIMEOUT_ERRORS:
+        return jsonify({"error": "Request to IBKR timed out."}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # Getting historic data for a stock symbol
 @bp.route("/historic-data/<string:symbol>", methods=["GET"])
 def get_historic_data(symbol):
@@ -62,15 +139,109 @@ def get_historic_data(symbol):
     try:
         data = ib_service.get_historic_market_data(symbol)
         return jsonify(data)
+    except ConnectionError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Type-ahead symbol search by symbol or company name prefix, e.g. ?q=AP&limit=10
+@bp.route("/symbols/search", methods=["GET"])
+def search_symbols():
+    try:
+        matches = symbol_service.search(
+            request.args.get("q"),
+            request.args.get("limit", symbol_service.SEARCH_LIMIT, type=int),
+        )
+        return jsonify(matches)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ConnectionError as e:
+        return jsonify({"error": str(e)}), 503
+    except TIMEOUT_ERRORS:
+        return jsonify({"error": "Request to IBKR timed out."}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# Snapshot quotes for several symbols, e.g. ?symbols=SPY,QQQ,AAPL
+@bp.route("/quotes", methods=["GET"])
+def get_quotes():
+    try:
+        return jsonify(symbol_service.get_quotes(request.args.get("symbols", "").split(",")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ConnectionError as e:
+        return jsonify({"error": str(e)}), 503
+    except TIMEOUT_ERRORS:
+        return jsonify({"error": "Request to IBKR timed out."}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Contract details and a snapshot quote for one symbol
+@bp.route("/market-data/<string:symbol>", methods=["GET"])
+def get_market_data(symbol):
+    try:
+        data = symbol_service.get_market_data(symbol)
+        if data:
+            return jsonify(data)
+        return jsonify({"error": f"Unknown symbol {symbol.upper()}"}), 404
+    except ConnectionError as e:
+        return jsonify({"error": str(e)}), 503
+    except TIMEOUT_ERRORS:
+        return jsonify({"error": "Request to IBKR timed out."}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Streaming live bars for a stock symbol (Server-Sent Events)
+@bp.route("/historic-data/<string:symbol>/stream", methods=["GET"])
+def stream_historic_data(symbol):
+    try:
+        snapshot, updates = ib_service.listen_market_data(symbol)
+    except ConnectionError as e:
+        return jsonify({"error": str(e)}), 503
+    except TIMEOUT_ERRORS:
+        return jsonify({"error": "Request to IBKR timed out."}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    def events():
+        try:
+            yield _sse("snapshot", {"symbol": symbol.upper(), "data": snapshot})
+            while True:
+                try:
+                    event = updates.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    yield _sse("end", {"symbol": symbol.upper()})
+                    break
+                yield _sse("bar", event)
+        finally:
+            ib_service.unlisten_market_data(symbol, updates)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _parse_fields():
+    fields = request.args.get("fields")
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
 # Get latest strategy log
 @bp.route("/strategy-log", methods=["GET"])
 def get_strategy_log():
     try:
-        log_data = strategy_log_service.get_latest_strategy_log()
+        log_data = strategy_log_service.get_latest_strategy_log(_parse_fields())
         if log_data:
             return jsonify(log_data)
         return jsonify({"message": "No strategy log found"}), 404
@@ -78,88 +249,264 @@ def get_strategy_log():
         return jsonify({"error": str(e)}), 500
 
 
+# List available strategy logs by date
+@bp.route("/strategy-logs", methods=["GET"])
+def list_strategy_logs():
+    try:
+        return jsonify(strategy_log_service.list_strategy_logs())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Days whose strategy log texts match a full-text query (FTS5 syntax)
+@bp.route("/strategy-logs/search", methods=["GET"])
+def search_strategy_logs():
+    try:
+        return jsonify(
+            strategy_index_service.search(
+                request.args.get("q"),
+                section=request.args.get("section"),
+                start_date=request.args.get("from"),
+                end_date=request.args.get("to"),
+                limit=request.args.get("limit", strategy_index_service.SEARCH_LIMIT, type=int),
+            )
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Structured per-day fields extracted from the strategy logs
+@bp.route("/strategy-logs/days", methods=["GET"])
+def get_strategy_log_days():
+    try:
+        return jsonify(
+            strategy_index_service.get_days(
+                start_date=request.args.get("from"),
+                end_date=request.args.get("to"),
+                decision=request.args.get("decision"),
+            )
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Distribution of decisions (or direction / spread type) by month, week or year
+@bp.route("/strategy-logs/stats", methods=["GET"])
+def get_strategy_log_stats():
+    try:
+        return jsonify(
+            strategy_index_service.get_distribution(
+                field=request.args.get("field", "decision"),
+                period=request.args.get("period", "month"),
+                start_date=request.args.get("from"),
+                end_date=request.args.get("to"),
+            )
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Get the strategy log for one date (YYYY-MM-DD)
+@bp.route("/strategy-logs/<date>", methods=["GET"])
+def get_strategy_log_for_date(date):
+    try:
+        log_data = strategy_log_service.get_strategy_log(date, _parse_fields())
+        if log_data:
+            return jsonify(log_data)
+        return jsonify({"message": f"No strategy log found for {date}"}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# LSTM next-close prediction for one symbol
+@bp.route("/predict", methods=["GET"])
+def predict():
+    symbol = request.args.get("symbol")
+    if not symbol:
+        return jsonify({"error": "Symbol is required"}), 400
+
+    try:
+        return jsonify(ml_service.registry.predict(symbol))
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except TIMEOUT_ERRORS:
+        return jsonify({"error": "Prediction timed out."}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Predictions for a watchlist; symbols sharing a model run in one forward pass
+@bp.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    data = request.get_json()
+    if not data or not isinstance(data.get("symbols"), list) or not data["symbols"]:
+        return jsonify({"error": "Missing required field: symbols"}), 400
+
+    try:
+        return jsonify(ml_service.registry.predict_many(data["symbols"]))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+ORDER_FIELDS = ["symbol", "expirationDate", "strike", "right", "action", "quantity"]
+BATCH_ORDER_FIELDS = ["symbol", "expirationDate", "right", "quantity"]
+
+
+# A batch order is a single leg (strike/action) or a spread (shortStrike/longStrike)
+def _is_batch_order(order):
+    is_single = "strike" in order and "action" in order
+    is_spread = "shortStrike" in order and "longStrike" in order
+    return all(field in order for field in BATCH_ORDER_FIELDS) and (is_single or is_spread)
+
+
+def _parse_order(data):
+    order = {
+        "symbol": data["symbol"],
+        "expiration_date": data["expirationDate"],
+        "right": data["right"],
+        "quantity": float(data["quantity"]),
+        "price": float(data["price"]) if data.get("price") is not None else None,
+    }
+    if "shortStrike" in data:
+        order["short_strike"] = float(data["shortStrike"])
+        order["long_strike"] = float(data["longStrike"])
+        order["order_type"] = data.get("orderType", "LMT")
+    else:
+        order["strike"] = float(data["strike"])
+        order["action"] = data["action"]
+        order["order_type"] = data.get("orderType", "MKT")
+    # IB rejects a limit order without one, after the 202 has gone out
+    if order["order_type"] == "LMT" and order["price"] is None:
+        raise ValueError("A price is required for LMT orders")
+    return order
+
+
 # Place a stock option order
 @bp.route("/place-order", methods=["POST"])
 def place_order():
     data = request.get_json()
-    required_fields = [
-        "symbol",
-        "expirationDate",
-        "strike",
-        "right",
-        "action",
-        "quantity",
-    ]
-
-    if not data or not all(field in data for field in required_fields):
+    if not data or not all(field in data for field in ORDER_FIELDS):
         return jsonify({"error": "Missing required fields"}), 400
 
     try:
-        symbol = data["symbol"]
-        expiration_date = data["expirationDate"]
-        strike = float(data["strike"])
-        right = data["right"]
-        action = data["action"]
-        quantity = float(data["quantity"])
-        order_type = data.get("orderType", "MKT")
-        price = float(data["price"]) if data.get("price") else None
-
-        trade = ib_service.order_contract(
-            symbol, expiration_date, strike, right, action, quantity, order_type, price
+        [handle] = ib_service.submit_batch([_parse_order(data)])
+        return (
+            jsonify(
+                {
+                    "message": "Order submitted.",
+                    "orderHandle": handle,
+                    "status": "Submitting",
+                }
+            ),
+            202,
         )
 
-        return jsonify(
-            {
-                "message": "Order placed successfully.",
-                "status": trade.orderStatus.status,
-                "orderId": trade.order.orderId,
-                "filled": trade.orderStatus.filled,
-                "remaining": trade.orderStatus.remaining,
-            }
-        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ConnectionError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Place several orders at once; spreads (shortStrike/longStrike) go out as one
+# combo order, and every leg in the batch is qualified in a single IB request.
+# Returns order handles immediately, poll /orders/<handle> for status
+@bp.route("/place-orders", methods=["POST"])
+def place_orders():
+    data = request.get_json()
+    orders = data.get("orders") if data else None
+    if not orders:
+        return jsonify({"error": "Missing orders"}), 400
+
+    if not all(_is_batch_order(order) for order in orders):
+        return jsonify({"error": "Missing required fields"}), 400
+
+    try:
+        handles = ib_service.submit_batch([_parse_order(o) for o in orders])
+        return jsonify({"orderHandles": handles, "status": "Submitting"}), 202
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ConnectionError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 
-    except TimeoutError:
-        return jsonify({"error": "Order placement timed out"}), 504
+# Order status, per-leg details and fills for a handle from /place-order(s)
+@bp.route("/orders/<string:handle>", methods=["GET"])
+def get_order(handle):
+    try:
+        order = order_service.get_order(handle)
+        if order:
+            return jsonify(order)
+        return jsonify({"error": "Order not found"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# Streaming fills as they are reported by IB (Server-Sent Events)
+@bp.route("/orders/fills/stream", methods=["GET"])
+def stream_fills():
+    fills = order_service.listen_fills()
+
+    def events():
+        try:
+            # Flush headers right away so clients see the stream open
+            yield ": connected\n\n"
+            while True:
+                try:
+                    fill = fills.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if fill is None:
+                    break
+                yield _sse("fill", fill)
+        finally:
+            order_service.unlisten_fills(fills)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # Getting past trades from CSV files
 @bp.route("/past-trades", methods=["GET"])
 def get_past_trades():
     try:
-        # Get the path to the past_trades directory
-        past_trades_dir = Path(__file__).parent.parent / "past_trades"
-        
-        if not past_trades_dir.exists():
-            return jsonify({"error": "Past trades directory not found"}), 404
-        
-        all_trades = []
-        
-        # Read all CSV files in the past_trades directory
-        for csv_file in past_trades_dir.glob("*.csv"):
-            try:
-                with open(csv_file, 'r', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        all_trades.append({
-                            "run_timestamp_utc": row.get("run_timestamp_utc", ""),
-                            "symbol": row.get("symbol", ""),
-                            "prediction_for_trade_date": row.get("prediction_for_trade_date", ""),
-                            "direction": row.get("direction", ""),
-                            "spread_type": row.get("spread_type", ""),
-                            "short_strike": float(row.get("short_strike", 0)) if row.get("short_strike") else 0,
-                            "long_strike": float(row.get("long_strike", 0)) if row.get("long_strike") else 0,
-                            "width": float(row.get("width", 0)) if row.get("width") else 0,
-                            "confidence": int(row.get("confidence", 0)) if row.get("confidence") else 0,
-                        })
-            except Exception as e:
-                print(f"Error reading {csv_file}: {str(e)}")
-                continue
-        
-        # Sort by timestamp (most recent first)
-        all_trades.sort(key=lambda x: x["run_timestamp_utc"], reverse=True)
-        
-        return jsonify(all_trades)
+        limit = request.args.get("limit", type=int)
+        if limit is not None and limit < 1:
+            return jsonify({"error": "limit must be at least 1"}), 400
+
+        trades, next_cursor = past_trades_service.get_past_trades(
+            limit=limit,
+            cursor=request.args.get("cursor"),
+            symbol=request.args.get("symbol"),
+            direction=request.args.get("direction"),
+            start_date=request.args.get("from"),
+            end_date=request.args.get("to"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+    # Serialize row by row instead of building the whole document up front
+    def generate():
+        yield "["
+        for i, trade in enumerate(trades):
+            yield ("," if i else "") + json.dumps(trade)
+        yield "]"
+
+    headers = {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(generate(), mimetype="application/json", headers=headers)
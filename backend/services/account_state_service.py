@@ -0,0 +1,123 @@
+from collections import deque
+
+# Number of versions a client can lag behind and still get a delta
+HISTORY_SIZE = 1000
+
+# Mutable state, only ever touched from the IB background loop
+_account = {}
+_portfolio = {}
+_version = 0
+_changes = deque(maxlen=HISTORY_SIZE)
+
+# Published, read-only snapshot. Flask handlers read this reference without
+# locking; it is replaced wholesale on every update, never mutated in place.
+_snapshot = {"version": 0, "account": {}, "portfolio": []}
+
+
+def portfolio_item_to_dict(item):
+    return {
+        "conId": item.contract.conId,
+        "symbol": item.contract.symbol,
+        "secType": item.contract.secType,
+        "exchange": item.contract.exchange,
+        "position": item.position,
+        "marketPrice": item.marketPrice,
+        "marketValue": item.marketValue,
+        "averageCost": item.averageCost,
+        "unrealizedPNL": item.unrealizedPNL,
+        "realizedPNL": item.realizedPNL,
+    }
+
+
+def _account_to_dict():
+    # Same {tag: (value, currency)} shape as /account-summary; a real currency
+    # wins over the "BASE" aggregate when IB reports both
+    return {
+        tag: (value, currency)
+        for (tag, currency), value in sorted(
+            _account.items(), key=lambda item: item[0][1] != "BASE"
+        )
+    }
+
+
+def _publish(section, key, value):
+    global _version, _snapshot
+    _version += 1
+    _changes.append((_version, section, key, value))
+    _snapshot = {
+        "version": _version,
+        "account": _account_to_dict(),
+        "portfolio": list(_portfolio.values()),
+    }
+
+
+def on_account_value(value):
+    key = (value.tag, value.currency)
+    if _account.get(key) == value.value:
+        return
+    _account[key] = value.value
+    _publish("account", value.tag, (value.value, value.currency))
+
+
+def on_portfolio_item(item):
+    key = (item.account, item.contract.conId)
+    if item.position == 0:
+        if _portfolio.pop(key, None) is None:
+            return
+        _publish("portfolio", item.contract.conId, None)
+        return
+
+    data = portfolio_item_to_dict(item)
+    if _portfolio.get(key) == data:
+        return
+    _portfolio[key] = data
+    _publish("portfolio", item.contract.conId, data)
+
+
+def reset():
+    global _version, _snapshot
+    _account.clear()
+    _portfolio.clear()
+    _changes.clear()
+    _version += 1
+    _snapshot = {"version": _version, "account": {}, "portfolio": []}
+
+
+def attach(ib):
+    ib.accountValueEvent += on_account_value
+    ib.updatePortfolioEvent += on_portfolio_item
+    ib.disconnectedEvent += reset
+
+
+def is_ready():
+    return bool(_snapshot["account"])
+
+
+def get_snapshot():
+    return _snapshot
+
+
+def get_changes(since_version):
+    """Return only what changed after ``since_version``.
+
+    Returns None when the client is too far behind (or from before a reset)
+    and must fetch the full snapshot instead.
+    """
+    snapshot = _snapshot
+    if since_version > snapshot["version"]:
+        return None
+
+    changes = [change for change in list(_changes) if change[0] > since_version]
+    if since_version < snapshot["version"] and (
+        not changes or changes[0][0] != since_version + 1
+    ):
+        return None
+
+    delta = {"version": snapshot["version"], "account": {}, "portfolio": {}}
+    for version, section, key, value in changes:
+        if version > snapshot["version"]:
+            break
+        if section == "account":
+            value = snapshot["account"].get(key)
+        delta[section][str(key)] = value
+    return delta
@@ -0,0 +1,317 @@
+import numpy as np
+import pandas as pd
+
+from services import option_chain_store
+
+DECISION_COLUMNS = [
+    "run_timestamp_utc",
+    "symbol",
+    "prediction_for_trade_date",
+    "direction",
+    "spread_type",
+    "short_strike",
+    "long_strike",
+    "width",
+    "confidence",
+    "raw_decision",
+]
+
+RESULT_COLUMNS = [
+    "timestamp",
+    "trade_date",
+    "target_expiration",
+    "symbol",
+    "direction",
+    "spread_type",
+    "short_strike",
+    "long_strike",
+    "option_type",
+    "confidence",
+    "premium_collected",
+    "short_premium",
+    "long_premium",
+    "short_expiration",
+    "long_expiration",
+    "match_status",
+]
+
+OPTION_TYPE_BY_SPREAD = {
+    "bull_put_credit_spread": "P",
+    "bear_call_credit_spread": "C",
+}
+
+MATCHED = "MATCHED"
+NO_MATCH = "NO_MATCH"
+NO_DATA_FOR_DATE = "NO_DATA_FOR_DATE"
+
+# Strikes are quoted to at most 3 decimals; keys pack (quote_date, right,
+# expiration, strike) into one sortable int64 so every leg is a searchsorted.
+_STRIKE_SCALE = 1000
+_EXPIRATION_SCALE = 10_000_000
+_RIGHT_SCALE = 100_000
+
+
+def load_decisions(path):
+    """Load a credit_spread_decisions CSV, with or without its header row."""
+    with open(path, "r", encoding="utf-8") as f:
+        has_header = f.readline().startswith(DECISION_COLUMNS[0])
+
+    decisions = pd.read_csv(
+        path,
+        header=0 if has_header else None,
+        names=None if has_header else DECISION_COLUMNS,
+    )
+    return decisions[DECISION_COLUMNS]
+
+
+def _encode_keys(quote_days, rights, expiration_days, strikes):
+    quote_days = np.asarray(quote_days, dtype=np.int64)
+    rights = np.asarray(rights, dtype=np.int64)
+    expiration_days = np.asarray(expiration_days, dtype=np.int64)
+    strikes = np.rint(np.asarray(strikes, dtype=np.float64) * _STRIKE_SCALE).astype(
+        np.int64
+    )
+    return (
+        ((quote_days * 2 + rights) * _RIGHT_SCALE + expiration_days)
+        * _EXPIRATION_SCALE
+        + strikes
+    )
+
+
+def _to_days(values):
+    return np.asarray(values, dtype="datetime64[D]").astype(np.int64)
+
+
+def _load_quote_book(trades, price_field, max_expiration_gap_days):
+    """Gather priced legs for every (trade_date, right) the decisions need.
+
+    Returns sorted keys, the matching prices and, per (trade_date, right), the
+    candidate expirations, all read from the memory-mapped chain store.
+    """
+    keys, prices, candidates = [], [], {}
+
+    for (trade_date, right), group in trades.groupby(["trade_date", "option_type"]):
+        if not option_chain_store.has_date(trade_date):
+            continue
+
+        targets = _to_days(group["target_expiration"].to_numpy())
+        window_lo = targets.min() - max_expiration_gap_days
+        window_hi = targets.max() + max_expiration_gap_days
+        expirations = [
+            expiration
+            for expiration in option_chain_store.get_expirations(trade_date, right)
+            if window_lo <= _to_days(expiration) <= window_hi
+        ]
+        candidates[(trade_date, right)] = _to_days(expirations)
+
+        for expiration in expirations:
+            chain = option_chain_store.get_chain_slice(
+                trade_date,
+                expiration=expiration,
+                option_type=right,
+                columns=["strike", price_field],
+            )
+            # Legs that never traded carry a 0.0 price and are not fillable
+            priced = chain[price_field] > 0
+            strikes = chain["strike"][priced]
+            keys.append(
+                _encode_keys(
+                    _to_days(trade_date),
+                    right == "C",
+                    _to_days(expiration),
+                    strikes,
+                )
+            )
+            prices.append(np.asarray(chain[price_field][priced], dtype=np.float64))
+
+    if not keys:
+        return np.empty(0, np.int64), np.empty(0), candidates
+
+    keys = np.concatenate(keys)
+    prices = np.concatenate(prices)
+    order = np.argsort(keys, kind="stable")
+    return keys[order], prices[order], candidates
+
+
+def _lookup(book_keys, book_prices, keys):
+    if not len(book_keys):
+        return np.zeros(len(keys), bool), np.full(len(keys), np.nan)
+    pos = np.searchsorted(book_keys, keys)
+    pos_clipped = np.minimum(pos, len(book_keys) - 1)
+    found = (pos < len(book_keys)) & (book_keys[pos_clipped] == keys)
+    return found, np.where(found, book_prices[pos_clipped], np.nan)
+
+
+def run_backtest(
+    decisions,
+    target_dte=7,
+    max_expiration_gap_days=7,
+    price_field="open",
+):
+    """Match a whole decisions table against the option chain history.
+
+    Both legs must be priced on the same expiration; the expiration closest to
+    ``trade_date + target_dte`` (ties go to the earlier one) within
+    ``max_expiration_gap_days`` wins.  HOLD rows are skipped.
+    """
+    trades = decisions[decisions["spread_type"].isin(list(OPTION_TYPE_BY_SPREAD))]
+    trades = trades.reset_index(drop=True)
+
+    trade_dates = pd.to_datetime(trades["prediction_for_trade_date"])
+    trades = trades.assign(
+        trade_date=trade_dates.dt.strftime("%Y-%m-%d"),
+        target_expiration=(trade_dates + pd.Timedelta(days=target_dte)).dt.strftime(
+            "%Y-%m-%d"
+        ),
+        option_type=trades["spread_type"].map(OPTION_TYPE_BY_SPREAD),
+    )
+
+    book_keys, book_prices, candidates = _load_quote_book(
+        trades, price_field, max_expiration_gap_days
+    )
+
+    # Expand every trade into (trade, candidate expiration) pairs
+    trade_idx, cand_exp = [], []
+    for (trade_date, right), rows in trades.groupby(
+        ["trade_date", "option_type"]
+    ).indices.items():
+        expirations = candidates.get((trade_date, right))
+        if expirations is None or not len(expirations):
+            continue
+        trade_idx.append(np.repeat(rows, len(expirations)))
+        cand_exp.append(np.tile(expirations, len(rows)))
+
+    n = len(trades)
+    short_premium = np.full(n, np.nan)
+    long_premium = np.full(n, np.nan)
+    matched_exp = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+
+    if trade_idx:
+        trade_idx = np.concatenate(trade_idx)
+        cand_exp = np.concatenate(cand_exp)
+
+        quote_days = _to_days(trades["trade_date"].to_numpy())[trade_idx]
+        rights = (trades["option_type"].to_numpy() == "C")[trade_idx]
+        targets = _to_days(trades["target_expiration"].to_numpy())[trade_idx]
+        short_strikes = trades["short_strike"].to_numpy(dtype=np.float64)[trade_idx]
+        long_strikes = trades["long_strike"].to_numpy(dtype=np.float64)[trade_idx]
+
+        short_found, short_px = _lookup(
+            book_keys,
+            book_prices,
+            _encode_keys(quote_days, rights, cand_exp, short_strikes),
+        )
+        long_found, long_px = _lookup(
+            book_keys,
+            book_prices,
+            _encode_keys(quote_days, rights, cand_exp, long_strikes),
+        )
+        gap = np.abs(cand_exp - targets)
+        ok = short_found & long_found & (gap <= max_expiration_gap_days)
+
+        # Best candidate per trade: smallest gap, then earliest expiration
+        order = np.lexsort((cand_exp[ok], gap[ok], trade_idx[ok]))
+        ok_idx = np.flatnonzero(ok)[order]
+        first = np.unique(trade_idx[ok_idx], return_index=True)[1]
+        best = ok_idx[first]
+
+        winners = trade_idx[best]
+        short_premium[winners] = short_px[best]
+        long_premium[winners] = long_px[best]
+        matched_exp[winners] = cand_exp[best]
+
+    has_data = np.array(
+        [option_chain_store.has_date(d) for d in trades["trade_date"]], dtype=bool
+    )
+    is_matched = ~np.isnan(short_premium)
+    match_status = np.where(
+        is_matched, MATCHED, np.where(has_data, NO_MATCH, NO_DATA_FOR_DATE)
+    )
+
+    expiration = np.where(
+        is_matched, matched_exp.astype("datetime64[D]").astype(str), ""
+    )
+
+    results = pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(trades["run_timestamp_utc"]).astype(str),
+            "trade_date": trades["trade_date"],
+            "target_expiration": trades["target_expiration"],
+            "symbol": trades["symbol"],
+            "direction": trades["direction"],
+            "spread_type": trades["spread_type"],
+            "short_strike": trades["short_strike"].astype(float),
+            "long_strike": trades["long_strike"].astype(float),
+            "option_type": trades["option_type"],
+            "confidence": trades["confidence"],
+            "premium_collected": short_premium - long_premium,
+            "short_premium": short_premium,
+            "long_premium": long_premium,
+            "short_expiration": expiration,
+            "long_expiration": expiration,
+            "match_status": match_status,
+        }
+    )
+    return results[RESULT_COLUMNS]
+
+
+def settle_backtest(results, contracts=1):
+    """Add expiration settlement and P&L columns to ``run_backtest`` output.
+
+    Spreads are held to expiration and settled at the underlying EOD mid of
+    the last stored quote date on or before expiration.  Trades that expire
+    after the stored history, or all of them when the store is empty, stay
+    unsettled (NaN P&L).
+    """
+    quote_days, closes = option_chain_store.get_underlying_closes()
+    quote_days = quote_days.astype(np.int64)
+
+    if len(quote_days):
+        matched = (results["match_status"] == MATCHED).to_numpy()
+        expiration_days = np.full(len(results), np.iinfo(np.int64).max, dtype=np.int64)
+        expiration_days[matched] = _to_days(results["short_expiration"].to_numpy()[matched])
+
+        pos = np.searchsorted(quote_days, expiration_days, side="right") - 1
+        settled = matched & (pos >= 0) & (expiration_days <= quote_days[-1])
+        underlying = np.where(settled, closes[np.clip(pos, 0, None)], np.nan)
+    else:
+        underlying = np.full(len(results), np.nan)
+
+    short_strike = results["short_strike"].to_numpy(dtype=np.float64)
+    long_strike = results["long_strike"].to_numpy(dtype=np.float64)
+    is_put = (results["option_type"] == "P").to_numpy()
+    short_value = np.where(
+        is_put,
+        np.maximum(short_strike - underlying, 0),
+        np.maximum(underlying - short_strike, 0),
+    )
+    long_value = np.where(
+        is_put,
+        np.maximum(long_strike - underlying, 0),
+        np.maximum(underlying - long_strike, 0),
+    )
+    spread_value = short_value - long_value
+
+    return results.assign(
+        underlying_at_expiration=underlying,
+        spread_value=spread_value,
+        pnl=(results["premium_collected"].to_numpy() - spread_value) * 100 * contracts,
+    )
+
+
+def run_backtest_file(decisions_path, output_path=None, **params):
+    option_chain_store.ingest_historical_data()
+    results = run_backtest(load_decisions(decisions_path), **params)
+    if output_path:
+        results.to_csv(output_path, index=False)
+        print(f"--- Wrote {len(results)} backtest rows to {output_path} ---")
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    run_backtest_file(
+        sys.argv[1],
+        sys.argv[2] if len(sys.argv) > 2 else None,
+    )
@@ -0,0 +1,280 @@
+import http.client
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+API_ENDPOINTS = {
+    "account-summary": ("GET", "/api/trading/account-summary", None),
+    "portfolio": ("GET", "/api/trading/portfolio", None),
+    "historic-data": ("GET", "/api/trading/historic-data/SPY", None),
+    "place-order": (
+        "POST",
+        "/api/trading/place-order",
+        {
+            "symbol": "SPY",
+            "expirationDate": "20261120",
+            "strike": 500,
+            "right": "P",
+            "action": "SELL",
+            "quantity": 1,
+            "orderType": "LMT",
+            "price": 1.25,
+        },
+    ),
+    "strategy-log": ("GET", "/api/trading/strategy-log", None),
+    "past-trades": ("GET", "/api/trading/past-trades?limit=100", None),
+}
+# Endpoints that place orders; only ever sent to the in-process stub server
+ORDER_ENDPOINTS = {"place-order"}
+READY_TIMEOUT = 30
+# A benchmark counts as a regression when it is this much slower than the baseline
+REGRESSION_TOLERANCE = 0.20
+
+
+def _summary(name, timings, wall_seconds, **extra):
+    timings = np.asarray(timings) * 1000
+    return {
+        "name": name,
+        **extra,
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p99_ms": float(np.percentile(timings, 99)),
+        "mean_ms": float(timings.mean()),
+        "throughput_per_s": len(timings) / wall_seconds,
+    }
+
+
+def start_stub_server(latency=0.005, recording=None):
+    """Serve the app on a free local port against StubIB; returns its base URL.
+
+    Must run before anything imports ``app``: the stub, latency and a
+    throwaway database are picked through the environment at import time.
+    """
+    os.environ.update(
+        IB_STUB="1",
+        IB_STUB_LATENCY=str(latency),
+        IB_STUB_SEED="0",
+        # Talk to the stub directly, never to a broker from the environment
+        IB_BROKER_ADDRESS="",
+        DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}",
+    )
+    if recording:
+        os.environ["IB_STUB_RECORDING"] = recording
+
+    from werkzeug.serving import make_server
+
+    from app import app, db
+
+    # One access log line per request would drown out the results
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    with app.app_context():
+        db.create_all()
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    deadline = time.monotonic() + READY_TIMEOUT
+    while _request(url, "GET", "/api/ready", None) != 200:
+        if time.monotonic() > deadline:
+            raise TimeoutError("Stub IB did not connect")
+        time.sleep(0.05)
+    return url
+
+
+def _request(url, method, path, body):
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def _timed_request(url, method, path, body):
+    started = time.perf_counter()
+    status = _request(url, method, path, body)
+    return time.perf_counter() - started, status
+
+
+def benchmark_api(
+    url=None,
+    endpoints=None,
+    requests=200,
+    concurrency=8,
+    warmup=10,
+    latency=0.005,
+    recording=None,
+):
+    """p50/p99 latency and throughput of each trading endpoint under load.
+
+    Each endpoint gets ``requests`` calls from ``concurrency`` threads after
+    ``warmup`` unmeasured calls. Without ``url`` the app is started in-process
+    against StubIB (``latency`` seconds per IB request, replaying
+    ``recording`` if given); pass the URL of a running server to measure it
+    as deployed. A running server may be connected to a real account, so
+    the order endpoints are left out for it.
+    """
+    if url is None:
+        endpoints = endpoints or list(API_ENDPOINTS)
+        url = start_stub_server(latency, recording)
+    elif endpoints is None:
+        endpoints = [name for name in API_ENDPOINTS if name not in ORDER_ENDPOINTS]
+    elif ORDER_ENDPOINTS.intersection(endpoints):
+        raise ValueError(
+            f"{', '.join(sorted(ORDER_ENDPOINTS.intersection(endpoints)))} would place real "
+            "orders; order endpoints only run against the in-process stub"
+        )
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for name in endpoints:
+            method, path, body = API_ENDPOINTS[name]
+            for _ in range(warmup):
+                _timed_request(url, method, path, body)
+
+            started = time.perf_counter()
+            results = list(
+                executor.map(lambda _: _timed_request(url, method, path, body), range(requests))
+            )
+            wall_seconds = time.perf_counter() - started
+            errors = sum(status >= 400 for _, status in results)
+            rows.append(
+                _summary(
+                    name,
+                    [seconds for seconds, _ in results],
+                    wall_seconds,
+                    requests=requests,
+                    concurrency=concurrency,
+                    errors=errors,
+                )
+            )
+            print(f"--- {name}: {rows[-1]['p50_ms']:.1f} ms p50, {errors} errors ---")
+    return pd.DataFrame(rows)
+
+
+def _time(fn, repeat):
+    timings = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings, time.perf_counter() - started
+
+
+def benchmark_micro(symbol="SPY", quote_date=None, repeat=5):
+    """Timings of the data and ML hot paths outside of Flask.
+
+    Covers ``MLService.prepare_data`` on the symbol's full history, a short
+    ``train`` (written to a temporary directory), and option-chain loading:
+    the raw CSV, a cold and a warm read from the chain store, and the
+    vectorized Greeks for the whole day.
+    """
+    from services import greeks_service, ml_service, option_chain_store
+
+    rows = []
+    history = ml_service.load_history(symbol)
+    service = ml_service.MLService(symbol)
+
+    timings, wall = _time(lambda: service.prepare_data(history, features=ml_service.OHLCV_COLUMNS), repeat)
+    rows.append(_summary("prepare_data", timings, wall, input=len(history)))
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        service.model_path = os.path.join(model_dir, "model.pth")
+        service.scaler_path = os.path.join(model_dir, "scaler.pkl")
+        train_rows = history.tail(500)
+        timings, wall = _time(lambda: service.train(train_rows, epochs=2, batch_size=64), repeat)
+        rows.append(_summary("train", timings, wall, input=len(train_rows)))
+
+    quote_date = quote_date or option_chain_store.available_dates()[-1]
+    csv_path = os.path.join(
+        option_chain_store.HISTORICAL_DATA_DIR, f"UnderlyingOptionsEODQuotes_{quote_date}.csv"
+    )
+    if os.path.exists(csv_path):
+        timings, wall = _time(lambda: pd.read_csv(csv_path), repeat)
+        rows.append(_summary("chain_csv_read", timings, wall, input=quote_date))
+
+    def cold_chain():
+        option_chain_store._partitions.pop(quote_date, None)
+        return option_chain_store.get_chain_frame(quote_date)
+
+    timings, wall = _time(cold_chain, repeat)
+    rows.append(_summary("chain_store_cold", timings, wall, input=quote_date))
+
+    expiration = option_chain_store.get_expirations(quote_date, "P")[0]
+    timings, wall = _time(
+        lambda: option_chain_store.get_chain_slice(quote_date, expiration=expiration, option_type="P"),
+        repeat,
+    )
+    rows.append(_summary("chain_store_slice", timings, wall, input=quote_date))
+
+    timings, wall = _time(lambda: greeks_service.compute_chain_greeks(quote_date), repeat)
+    rows.append(_summary("chain_greeks", timings, wall, input=quote_date))
+    return pd.DataFrame(rows)
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Join ``results`` with a saved baseline and flag p50/p99 slowdowns past ``tolerance``."""
+    merged = results.merge(baseline, on="name", suffixes=("", "_baseline"))
+    for column in ("p50_ms", "p99_ms"):
+        merged[f"{column}_change"] = merged[column] / merged[f"{column}_baseline"] - 1
+    merged["regression"] = (merged["p50_ms_change"] > tolerance) | (
+        merged["p99_ms_change"] > tolerance
+    )
+    return merged[
+        ["name", "p50_ms", "p50_ms_baseline", "p50_ms_change", "p99_ms", "p99_ms_baseline", "p99_ms_change", "regression"]
+    ]
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Benchmark the trading API or the data/ML hot paths")
+    parser.add_argument("mode", choices=["api", "micro"])
+    parser.add_argument("--url", help="benchmark a running server instead of an in-process stub")
+    parser.add_argument("--endpoints", nargs="+", choices=list(API_ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.005, help="stub IB round-trip in seconds")
+    parser.add_argument("--recording", help="IB session recorded with services.ib_stub")
+    parser.add_argument("--symbol", default="SPY")
+    parser.add_argument("--quote-date")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results to this CSV (use it as a later --baseline)")
+    parser.add_argument("--baseline", help="CSV from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    if args.mode == "api":
+        results = benchmark_api(
+            url=args.url,
+            endpoints=args.endpoints,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            latency=args.latency,
+            recording=args.recording,
+        )
+    else:
+        results = benchmark_micro(args.symbol, args.quote_date, args.repeat)
+    print(results.to_string(index=False))
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"--- Wrote {len(results)} benchmark results to {args.output} ---")
+    if args.baseline:
+        comparison = compare(results, pd.read_csv(args.baseline), args.tolerance)
+        print(comparison.to_string(index=False))
+        if comparison["regression"].any():
+            sys.exit(1)
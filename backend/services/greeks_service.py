@@ -0,0 +1,246 @@
+import os
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+from services import option_chain_store
+
+RISK_FREE_RATE = 0.04
+DIVIDEND_YIELD = 0.013
+
+# Quote snapshot -> (bid, ask, underlying bid, underlying ask, minutes to the 16:00 close)
+SNAPSHOTS = {
+    "1545": ("bid_1545", "ask_1545", "underlying_bid_1545", "underlying_ask_1545", 15),
+    "eod": ("bid_eod", "ask_eod", "underlying_bid_eod", "underlying_ask_eod", 0),
+}
+GREEK_COLUMNS = ["mid", "iv", "delta", "gamma", "theta", "vega", "prob_itm", "prob_touch"]
+
+IV_LOWER = 1e-4
+IV_UPPER = 5.0
+IV_TOLERANCE = 1e-6
+IV_MAX_ITERATIONS = 100
+MINUTES_PER_YEAR = 365 * 24 * 60
+# Parsed chains kept in memory; each is ~9k rows x 8 float64 columns
+CACHE_SIZE = 32
+
+_cache = OrderedDict()
+_lock = Lock()
+
+
+def _norm_pdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def _d1_d2(S, K, T, r, q, sigma):
+    sqrt_t = np.sqrt(T)
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / (sigma * sqrt_t)
+    return d1, d1 - sigma * sqrt_t
+
+
+def black_scholes_price(S, K, T, r, q, sigma, is_call):
+    """European price with a continuous dividend yield, broadcast over arrays."""
+    d1, d2 = _d1_d2(S, K, T, r, q, sigma)
+    disc_s = S * np.exp(-q * T)
+    disc_k = K * np.exp(-r * T)
+    call = disc_s * ndtr(d1) - disc_k * ndtr(d2)
+    put = disc_k * ndtr(-d2) - disc_s * ndtr(-d1)
+    return np.where(is_call, call, put)
+
+
+def implied_volatility(price, S, K, T, r, q, is_call):
+    """Solve every contract's IV at once with safeguarded Newton iterations.
+
+    Each contract keeps a [lo, hi] bracket that shrinks on every step. When the
+    Newton step leaves it (or vega vanishes), the step bisects instead. Only
+    unconverged contracts are carried into the next iteration. Prices outside
+    the no-arbitrage bounds get NaN.
+    """
+    price, S, K, T, is_call = np.broadcast_arrays(
+        *(np.asarray(a, dtype=np.float64) for a in (price, S, K, T)), np.asarray(is_call)
+    )
+    disc_s = S * np.exp(-q * T)
+    disc_k = K * np.exp(-r * T)
+    lower = np.maximum(np.where(is_call, disc_s - disc_k, disc_k - disc_s), 0)
+    upper = np.where(is_call, disc_s, disc_k)
+    valid = np.isfinite(price) & (T > 0) & (price > lower) & (price < upper)
+
+    iv = np.full(price.shape, np.nan)
+    idx = np.flatnonzero(valid)
+    p, s, k, t, c = price.ravel()[idx], S.ravel()[idx], K.ravel()[idx], T.ravel()[idx], is_call.ravel()[idx]
+    # Brenner-Subrahmanyam starting point, kept inside the bracket
+    sigma = np.clip(np.sqrt(2 * np.pi / t) * p / s, 0.05, 2.0)
+    lo = np.full(len(idx), IV_LOWER)
+    hi = np.full(len(idx), IV_UPPER)
+
+    for _ in range(IV_MAX_ITERATIONS):
+        if not len(idx):
+            break
+        diff = black_scholes_price(s, k, t, r, q, sigma, c) - p
+        done = np.abs(diff) < IV_TOLERANCE
+        iv.ravel()[idx[done]] = sigma[done]
+
+        keep = ~done
+        idx, p, s, k, t, c = idx[keep], p[keep], s[keep], k[keep], t[keep], c[keep]
+        sigma, lo, hi, diff = sigma[keep], lo[keep], hi[keep], diff[keep]
+        hi = np.where(diff > 0, sigma, hi)
+        lo = np.where(diff > 0, lo, sigma)
+
+        d1, _ = _d1_d2(s, k, t, r, q, sigma)
+        vega = s * np.exp(-q * t) * _norm_pdf(d1) * np.sqrt(t)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            newton = sigma - diff / vega
+        bisect = ~np.isfinite(newton) | (newton <= lo) | (newton >= hi)
+        sigma = np.where(bisect, 0.5 * (lo + hi), newton)
+    return iv
+
+
+def greeks(S, K, T, r, q, sigma, is_call):
+    """Delta, gamma, theta (per calendar day), vega (per vol point) and
+    probabilities of finishing in the money and of touching the strike."""
+    d1, d2 = _d1_d2(S, K, T, r, q, sigma)
+    sqrt_t = np.sqrt(T)
+    disc_q = np.exp(-q * T)
+    disc_r = np.exp(-r * T)
+    pdf = _norm_pdf(d1)
+
+    decay = -S * disc_q * pdf * sigma / (2 * sqrt_t)
+    call_theta = decay - r * K * disc_r * ndtr(d2) + q * S * disc_q * ndtr(d1)
+    put_theta = decay + r * K * disc_r * ndtr(-d2) - q * S * disc_q * ndtr(-d1)
+    prob_itm = np.where(is_call, ndtr(d2), ndtr(-d2))
+    otm = np.where(is_call, K > S, K < S)
+
+    return {
+        "delta": np.where(is_call, disc_q * ndtr(d1), -disc_q * ndtr(-d1)),
+        "gamma": disc_q * pdf / (S * sigma * sqrt_t),
+        "theta": np.where(is_call, call_theta, put_theta) / 365,
+        "vega": S * disc_q * pdf * sqrt_t / 100,
+        "prob_itm": prob_itm,
+        # Reflection-principle approximation: twice the chance of expiring past it
+        "prob_touch": np.where(otm, np.minimum(1.0, 2 * prob_itm), 1.0),
+    }
+
+
+def compute_chain_greeks(quote_date, snapshot="1545", rate=RISK_FREE_RATE, dividend_yield=DIVIDEND_YIELD):
+    """IV and Greeks for every contract of one stored day, in chain-store row order."""
+    bid_col, ask_col, ubid_col, uask_col, minutes_to_close = SNAPSHOTS[snapshot]
+    chain = option_chain_store.get_chain_slice(
+        quote_date,
+        columns=["expiration", "option_type", "strike", bid_col, ask_col, ubid_col, uask_col],
+    )
+
+    bid = np.asarray(chain[bid_col])
+    ask = np.asarray(chain[ask_col])
+    # A zero bid leaves no reliable mid to invert
+    mid = np.where((bid > 0) & (ask >= bid), (bid + ask) / 2, np.nan)
+    spot = (np.asarray(chain[ubid_col]) + np.asarray(chain[uask_col])) / 2
+    strike = np.asarray(chain["strike"])
+    is_call = np.asarray(chain["option_type"]) == b"C"
+    days = (np.asarray(chain["expiration"]) - np.datetime64(quote_date, "D")).astype(np.int64)
+    T = (days * 24 * 60 + minutes_to_close) / MINUTES_PER_YEAR
+
+    iv = implied_volatility(mid, spot, strike, T, rate, dividend_yield, is_call)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = greeks(spot, strike, T, rate, dividend_yield, iv, is_call)
+    return {"mid": mid, "iv": iv, **result}
+
+
+def get_chain_greeks(quote_date, snapshot="1545", rate=RISK_FREE_RATE, dividend_yield=DIVIDEND_YIELD):
+    """Cached ``compute_chain_greeks``: in memory, then next to the chain partition on disk."""
+    quote_date = str(quote_date)
+    key = (quote_date, snapshot, rate, dividend_yield)
+    with _lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+            return result
+
+    path = option_chain_store.partition_path(quote_date, f"greeks_{snapshot}.npz")
+    source = option_chain_store.partition_path(quote_date, "strike.npy")
+    result = None
+    # Re-ingesting the day rewrites its columns, which invalidates the saved Greeks
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source):
+        with np.load(path) as saved:
+            if saved["params"].tolist() == [rate, dividend_yield]:
+                result = {column: saved[column] for column in GREEK_COLUMNS}
+    if result is None:
+        result = compute_chain_greeks(quote_date, snapshot, rate, dividend_yield)
+        # A file of its own per writer: sweep workers may compute the same day at once
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp.npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, params=np.array([rate, dividend_yield]), **result)
+            os.replace(tmp_file, path)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+
+    with _lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def get_chain_greeks_frame(quote_date, snapshot="1545", **params):
+    """Chain contracts with their IV and Greeks as one DataFrame."""
+    frame = option_chain_store.get_chain_frame(
+        quote_date, columns=["expiration", "option_type", "strike"]
+    )
+    result = get_chain_greeks(quote_date, snapshot, **params)
+    return frame.assign(**{column: result[column] for column in GREEK_COLUMNS})
+
+
+def strikes_near_delta(
+    quote_date,
+    expiration=None,
+    target_delta=0.20,
+    option_type="P",
+    snapshot="1545",
+    count=1,
+    **params,
+):
+    """The ``count`` strikes whose |delta| is closest to ``target_delta``.
+
+    Covers one expiration, or every stored expiration when ``expiration`` is
+    None. Returns one row per pick with its IV, Greeks and probabilities.
+    """
+    quote_date = str(quote_date)
+    result = get_chain_greeks(quote_date, snapshot, **params)
+    chain = option_chain_store.get_chain_slice(quote_date, columns=["expiration", "strike"])
+    delta = result["delta"]
+
+    picks = []
+    for (run_expiration, run_type), (start, stop) in sorted(
+        option_chain_store.get_runs(quote_date).items()
+    ):
+        if run_type != option_type or (expiration is not None and run_expiration != str(expiration)):
+            continue
+        error = np.abs(np.abs(delta[start:stop]) - target_delta)
+        error[~np.isfinite(error)] = np.inf
+        best = np.argsort(error, kind="stable")[:count]
+        picks.extend(start + best[np.isfinite(error[best])])
+
+    picks = np.array(picks, dtype=np.int64)
+    expirations = np.asarray(chain["expiration"])[picks]
+    return pd.DataFrame(
+        {
+            "quote_date": quote_date,
+            "expiration": pd.to_datetime(expirations).strftime("%Y-%m-%d"),
+            "option_type": option_type,
+            "dte": (expirations - np.datetime64(quote_date, "D")).astype(np.int64),
+            "strike": np.asarray(chain["strike"])[picks],
+            **{column: result[column][picks] for column in GREEK_COLUMNS},
+        }
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    quote_date = sys.argv[1]
+    target_delta = float(sys.argv[2]) if len(sys.argv) > 2 else 0.20
+    print(strikes_near_delta(quote_date, target_delta=target_delta).to_string(index=False))
@@ -0,0 +1,339 @@
+import getpass
+import importlib
+import os
+import queue
+import tempfile
+import threading
+from multiprocessing.connection import Client, Listener
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# IB_BROKER_ADDRESS is set in every web worker (gunicorn.conf.py does it) to
+# route IB calls to the broker process instead of opening one IB connection per
+# worker. A path is a unix socket, host:port is TCP. Both it and the
+# IB_BROKER_AUTHKEY shared secret are read when used, so workers forked from a
+# master that imported this module still see them.
+# The socket lives in a directory only this user can enter
+DEFAULT_ADDRESS = os.path.join(
+    tempfile.gettempdir(), f"moneymaker9000-{getpass.getuser()}", "ib-broker.sock"
+)
+
+# Everything a worker may call in the broker; all of it is picklable in and out.
+# order_batch and friends return ib_async Trades, whose events are not, so
+# workers place orders through submit_batch
+REMOTE_METHODS = {
+    "ib_service": {
+        "is_connected",
+        "get_connection_state",
+        "get_account_summary",
+        "get_portfolio",
+        "get_historic_market_data",
+        "get_historic_bars",
+        "match_symbols",
+        "get_contract_details",
+        "get_quotes",
+        "submit_batch",
+    },
+    "account_state_service": {"is_ready", "get_snapshot", "get_changes"},
+    "order_service": {"get_order"},
+    "metrics_service": {"snapshot", "collect"},
+}
+# Queue-returning calls get a dedicated connection that the broker pushes onto
+STREAM_METHODS = {
+    "ib_service": {"listen_market_data": "unlisten_market_data"},
+    "order_service": {"listen_fills": "unlisten_fills"},
+}
+STREAM_HEARTBEAT_SECONDS = 5
+STREAM_QUEUE_SIZE = 100
+
+_local = threading.local()
+
+
+def broker_address():
+    return os.getenv("IB_BROKER_ADDRESS")
+
+
+def enabled():
+    return bool(broker_address())
+
+
+def authkey():
+    # Connections carry pickles, so there is deliberately no default secret
+    key = os.getenv("IB_BROKER_AUTHKEY")
+    if not key:
+        raise RuntimeError("IB_BROKER_AUTHKEY must be set to use the IB broker")
+    return key.encode()
+
+
+def parse_address(address):
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def _connect():
+    address = broker_address()
+    try:
+        return Client(parse_address(address), authkey=authkey())
+    except OSError as e:
+        raise ConnectionError(f"IB broker not reachable at {address}: {e}")
+
+
+def _reply(conn):
+    status, value = conn.recv()
+    if status == "error":
+        raise value
+    return value
+
+
+def call(module, name, *args, **kwargs):
+    """Run ``module.name(*args, **kwargs)`` in the broker and return its result.
+
+    Each thread keeps one connection open. Exceptions raised in the broker are
+    re-raised here, so ConnectionError/TimeoutError still map to 503/504.
+    """
+    conn = getattr(_local, "conn", None)
+    request = ("call", module, name, args, kwargs)
+    try:
+        if conn is None:
+            raise EOFError
+        conn.send(request)
+    except (EOFError, OSError):
+        # Stale connection from before a broker restart; nothing was sent yet
+        if conn is not None:
+            conn.close()
+        conn = _local.conn = _connect()
+        conn.send(request)
+
+    try:
+        return _reply(conn)
+    except (EOFError, OSError) as e:
+        conn.close()
+        _local.conn = None
+        raise ConnectionError(f"Lost connection to the IB broker: {e!r}")
+
+
+def _read_stream(conn, updates, stop):
+    try:
+        while not stop.is_set():
+            if not conn.poll(1.0):
+                continue
+            status, value = conn.recv()
+            if status == "event":
+                try:
+                    updates.put_nowait(value)
+                except queue.Full:
+                    pass
+            elif status == "end":
+                break
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+        if not stop.is_set():
+            updates.put(None)
+
+
+# Stop flags of open streams, keyed by id() of the queue handed to the caller
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+def listen(module, name, *args):
+    """Open a broker-side stream; returns (initial result, queue).
+
+    Events are forwarded onto the queue as they arrive and a ``None`` marks the
+    end of the stream (including the broker going away), just like the local
+    listeners. Hand the queue to ``unlisten`` when done.
+    """
+    conn = _connect()
+    try:
+        conn.send(("listen", module, name, args, {}))
+        initial = _reply(conn)
+    except (EOFError, OSError) as e:
+        conn.close()
+        raise ConnectionError(f"Lost connection to the IB broker: {e!r}")
+    except Exception:
+        conn.close()
+        raise
+
+    updates = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    stop = threading.Event()
+    with _streams_lock:
+        _streams[id(updates)] = stop
+    threading.Thread(target=_read_stream, args=(conn, updates, stop), daemon=True).start()
+    return initial, updates
+
+
+def unlisten(updates):
+    with _streams_lock:
+        stop = _streams.pop(id(updates), None)
+    # The reader closes the connection; the broker notices on its next send
+    if stop:
+        stop.set()
+
+
+class RemoteService:
+    """Stand-in for a service module whose IB-facing calls run in the broker.
+
+    Whitelisted calls are forwarded, listen/unlisten pairs become streams, and
+    anything else (pure helpers such as ``portfolio_item_to_dict``) comes from
+    the local module.
+    """
+
+    def __init__(self, module):
+        self._module = module
+        self._local_module = importlib.import_module(f"services.{module}")
+
+    def __getattr__(self, name):
+        module = self._module
+        streams = STREAM_METHODS.get(module, {})
+        if name in REMOTE_METHODS.get(module, ()):
+            return lambda *args, **kwargs: call(module, name, *args, **kwargs)
+        if name in streams:
+            return self._listener(name)
+        if name in streams.values():
+            # unlisten_market_data(symbol, queue) / unlisten_fills(queue)
+            return lambda *args: unlisten(args[-1])
+        return getattr(self._local_module, name)
+
+    def _listener(self, name):
+        def listen_remote(*args):
+            initial, updates = listen(self._module, name, *args)
+            # listen_fills only returns its queue
+            return updates if initial is None else (initial, updates)
+
+        return listen_remote
+
+
+def service(module):
+    """The service module to call from web code: the real one, or its broker proxy."""
+    if enabled():
+        return RemoteService(module)
+    return importlib.import_module(f"services.{module}")
+
+
+# Broker side
+
+
+def _resolve(kind, module, name):
+    allowed = STREAM_METHODS if kind == "listen" else REMOTE_METHODS
+    if name not in allowed.get(module, ()):
+        raise AttributeError(f"{module}.{name} is not available through the IB broker")
+    return getattr(importlib.import_module(f"services.{module}"), name)
+
+
+def _send_error(conn, e):
+    try:
+        conn.send(("error", e))
+    except Exception:
+        # Not every exception pickles; keep the type name and message
+        conn.send(("error", RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+def _serve_stream(conn, module, name, args, app):
+    with app.app_context():
+        result = _resolve("listen", module, name)(*args)
+    initial, listener = result if isinstance(result, tuple) else (None, result)
+    unlisten_fn = getattr(importlib.import_module(f"services.{module}"), STREAM_METHODS[module][name])
+    try:
+        conn.send(("ok", initial))
+        while True:
+            try:
+                event = listener.get(timeout=STREAM_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                conn.send(("ping", None))
+                continue
+            if event is None:
+                conn.send(("end", None))
+                break
+            conn.send(("event", event))
+    except (EOFError, OSError):
+        pass
+    finally:
+        unlisten_fn(*args, listener)
+
+
+def _handle(conn, app):
+    with conn:
+        while True:
+            try:
+                kind, module, name, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+
+            if kind == "listen":
+                try:
+                    _serve_stream(conn, module, name, args, app)
+                except Exception as e:
+                    _send_error(conn, e)
+                return
+
+            try:
+                # order_service.get_order falls back to the database
+                with app.app_context():
+                    result = _resolve(kind, module, name)(*args, **kwargs)
+            except Exception as e:
+                _send_error(conn, e)
+                continue
+            try:
+                conn.send(("ok", result))
+            except (EOFError, OSError):
+                return
+
+
+def private_socket_dir(path):
+    """Create the socket's directory for this user only, or refuse a shared one."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if hasattr(os, "getuid"):
+        info = os.stat(directory)
+        if info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise RuntimeError(f"{directory} must be owned by this user with mode 0700")
+
+
+def _listen(address, key):
+    if not isinstance(address, str):
+        return Listener(address, authkey=key)
+    private_socket_dir(address)
+    if os.path.exists(address):
+        os.remove(address)
+    # Created 0600 rather than chmod-ed afterwards, so it is never open to others
+    umask = os.umask(0o177)
+    try:
+        return Listener(address, authkey=key)
+    finally:
+        os.umask(umask)
+
+
+def serve(address, app):
+    """Accept worker connections forever, one thread per connection."""
+    address = parse_address(address)
+    with _listen(address, authkey()) as listener:
+        print(f"=== IB broker listening on {address} ===")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # Failed handshakes (wrong authkey, port scanners) are not fatal
+                print(f"--- IB broker rejected a connection: {e} ---")
+                continue
+            threading.Thread(target=_handle, args=(conn, app), daemon=True).start()
+
+
+if __name__ == "__main__":
+    import sys
+
+    # This process owns the IB connection, so the app must not proxy to itself.
+    # Blank rather than unset so load_dotenv() cannot bring it back from .env
+    address = os.getenv("IB_BROKER_ADDRESS") or DEFAULT_ADDRESS
+    os.environ["IB_BROKER_ADDRESS"] = ""
+    if "--stub" in sys.argv:
+        os.environ["IB_STUB"] = "1"
+
+    from app import app
+
+    serve(address, app)
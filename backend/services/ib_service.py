@@ -1,15 +1,116 @@
 import asyncio
+import concurrent.futures
+import math
 import os
-from threading import Thread
+import queue
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from threading import Lock, RLock, Thread
 
 from dotenv import load_dotenv
-from ib_async import IB, Stock, Option, Order
+import numpy as np
+from ib_async import IB, ComboLeg, Contract, Stock, Option, Order
+
+from services import account_state_service, metrics_service, ohlcv_store, order_service
+from services.ib_stub import StubIB
 
 load_dotenv()
 
 background_loop = None
+# False when an async server lent its own loop (see asgi.py)
+_owns_loop = False
+
+# IB_STUB=1 swaps TWS/Gateway for a local simulated account (development, tests)
+ib = StubIB() if os.getenv("IB_STUB") else IB()
+
+CONNECT_TIMEOUT = 10
+# Seconds between reconnect attempts, doubling after each failure
+RECONNECT_INITIAL_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+_connection = {
+    "state": "disconnected",
+    "attempts": 0,
+    "last_error": None,
+    "connected_since": None,
+    "next_attempt_at": None,
+}
+_reconnect_task = None
+_stopping = False
+
+# How often the background loop checks how late it wakes up
+LOOP_LAG_INTERVAL = 1.0
+# Order states that mean IB has not acknowledged the order yet
+PENDING_ORDER_STATES = {"PendingSubmit", "ApiPending"}
+# Until Python 3.11 the asyncio and concurrent.futures timeouts are not the builtin one
+TIMEOUT_ERRORS = (TimeoutError, asyncio.TimeoutError, concurrent.futures.TimeoutError)
+
+# Live bar subscriptions, one per symbol, shared by every client
+STREAM_DURATION = "30 D"
+STREAM_BAR_SIZE = "1 hour"
+MAX_STREAM_BARS = 1000
+STREAM_QUEUE_SIZE = 100
+
+_streams = {}
+_streams_lock = Lock()
+
+# Batched historical bars. IB's pacing rules: at most 60 historical requests
+# in any 10 minutes, 5 for the same contract within 2 seconds, and no identical
+# request within 15 seconds (skipping fresh series covers that one)
+HISTORIC_BAR_SIZES = {
+    "1 min": 60,
+    "5 mins": 300,
+    "15 mins": 900,
+    "30 mins": 1800,
+    "1 hour": 3600,
+    "4 hours": 4 * 3600,
+    "1 day": 86400,
+}
+DURATION_UNITS = {"S": 1, "D": 86400, "W": 7 * 86400, "M": 30 * 86400, "Y": 365 * 86400}
+PACING_WINDOW = 600
+PACING_MAX_REQUESTS = 60
+CONTRACT_PACING_WINDOW = 2
+CONTRACT_PACING_MAX_REQUESTS = 5
+HISTORIC_MAX_CONCURRENT = 10
+# A stored series younger than min(bar length, this) is served without asking IB
+HISTORIC_MAX_STALENESS = 300
+HISTORIC_MIN_STALENESS = 15
+# Markets close for weekends and holidays, so the first stored bar may trail
+# the requested start by this much without the head counting as missing
+HISTORIC_HEAD_SLACK = 4 * 86400
+MAX_BATCH_SYMBOLS = 100
+HISTORIC_BATCH_TIMEOUT = 120
+
+# Symbol search, contract details and snapshot quotes; symbol_service caches them
+SYMBOL_REQUEST_TIMEOUT = 15
 
-ib = IB()
+# All of these are only touched from the background loop
+_historic_semaphore = asyncio.Semaphore(HISTORIC_MAX_CONCURRENT)
+_historic_sent = deque()
+_historic_sent_by_symbol = {}
+_historic_locks = {}
+# (symbol, bar size) -> loop time of the last fetch / earliest start fetched
+_historic_fetched_at = {}
+_historic_backfilled = {}
+_stock_contracts = {}
+
+# Seconds a cached IB response stays fresh; IB update events invalidate earlier
+CACHE_TTLS = {
+    "account_summary": 10.0,
+    "portfolio": 5.0,
+    "historic_data": 60.0,
+}
+CACHE_MAX_ENTRIES = 256
+
+_cache = OrderedDict()
+_inflight = {}
+_cache_generation = 0
+_cache_lock = RLock()
+
+# Qualified option contracts keyed by (symbol, expiry, strike, right); only
+# touched from the background loop
+_qualified_contracts = {}
 
 
 def _run_loop(loop):
@@ -17,136 +118,1051 @@ def _run_loop(loop):
     loop.run_forever()
 
 
-def startup_ib_connection():
-    global background_loop
-    if background_loop is None:
-        background_loop = asyncio.new_event_loop()
-        t = Thread(target=_run_loop, args=(background_loop,), daemon=True)
-        t.start()
+def _submit(coro):
+    """Schedule ``coro`` on the background loop, counting it while in flight."""
+    future = asyncio.run_coroutine_threadsafe(coro, background_loop)
+    metrics_service.IB_INFLIGHT_FUTURES.inc()
+    future.add_done_callback(lambda f: metrics_service.IB_INFLIGHT_FUTURES.dec())
+    return future
 
-    if ib.isConnected():
-        return
 
-    async def connect_and_subscribe():
-        await ib.connectAsync(
-            host=os.getenv("IB_HOST", "127.0.0.1"),
-            port=int(os.getenv("IB_PORT", "4002")),
-            clientId=int(os.getenv("IB_CLIENT_ID", "3")),
-            timeout=10,
+async def _timed(request, awaitable):
+    with metrics_service.IB_REQUEST_SECONDS.time(request=request):
+        return await awaitable
+
+
+# Anything blocking the loop (a slow callback, a long sync call) shows up here
+async def _monitor_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        metrics_service.IB_LOOP_LAG_SECONDS.set(
+            max(0.0, loop.time() - started - LOOP_LAG_INTERVAL)
         )
-        ib.reqAccountUpdates(True)
 
-    future = asyncio.run_coroutine_threadsafe(
-        connect_and_subscribe(),
-        background_loop,
+
+async def _connect_and_subscribe():
+    await ib.connectAsync(
+        host=os.getenv("IB_HOST", "127.0.0.1"),
+        port=int(os.getenv("IB_PORT", "4002")),
+        clientId=int(os.getenv("IB_CLIENT_ID", "3")),
+        timeout=CONNECT_TIMEOUT,
     )
+    ib.reqAccountUpdates(True)
 
-    try:
-        future.result(timeout=10)
-    except Exception as e:
-        print(f"--- API connection failed: Type: {type(e)}, Error: {repr(e)} ---")
+
+# Runs on the background loop until connected, backing off between attempts
+async def _maintain_connection():
+    delay = RECONNECT_INITIAL_DELAY
+    while not _stopping and not ib.isConnected():
+        _connection["state"] = "connecting"
+        _connection["attempts"] += 1
+        _connection["next_attempt_at"] = None
+        try:
+            await _connect_and_subscribe()
+        except Exception as e:
+            if ib.isConnected():
+                ib.disconnect()
+            _connection["state"] = "disconnected"
+            _connection["last_error"] = repr(e)
+            _connection["next_attempt_at"] = time.time() + delay
+            print(
+                f"--- IB connection attempt {_connection['attempts']} failed: {e!r}. "
+                f"Retrying in {delay:.0f}s ---"
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+            continue
+
+        _connection.update(
+            state="connected", attempts=0, last_error=None, connected_since=time.time()
+        )
+        print("=== Successfully connected to IBKR ===")
+
+
+def _start_reconnecting():
+    global _reconnect_task
+    if _stopping or (_reconnect_task and not _reconnect_task.done()):
+        return
+    _reconnect_task = background_loop.create_task(_maintain_connection())
+
+
+def _on_disconnected():
+    # disconnect_from_ib asked for this one
+    if _stopping:
+        return
+    if _connection["state"] == "connected":
+        print("--- Lost connection to IBKR, reconnecting ---")
+        _connection.update(state="disconnected", connected_since=None)
+    background_loop.call_soon_threadsafe(_start_reconnecting)
+
+
+def startup_ib_connection(loop=None):
+    """Start the IB event loop and connect in the background; returns immediately.
+
+    Failed attempts and dropped connections are retried with exponential
+    backoff until ``disconnect_from_ib``. ``get_connection_state`` reports
+    progress. An async server passes its running ``loop`` so that IB shares
+    it and routes can await the ``*_async`` functions; otherwise IB gets a
+    loop on a thread of its own.
+    """
+    global background_loop, _stopping, _owns_loop
+    _stopping = False
+    if background_loop is None:
+        if loop is None:
+            background_loop = asyncio.new_event_loop()
+            t = Thread(target=_run_loop, args=(background_loop,), daemon=True)
+            t.start()
+            _owns_loop = True
+        else:
+            background_loop = loop
+
+        ib.disconnectedEvent += _reset_streams
+        ib.disconnectedEvent += invalidate_cache
+        ib.disconnectedEvent += _on_disconnected
+        ib.accountValueEvent += lambda value: invalidate_cache("account_summary")
+        ib.updatePortfolioEvent += lambda item: invalidate_cache("portfolio")
+        account_state_service.attach(ib)
+        order_service.attach(ib)
+        asyncio.run_coroutine_threadsafe(_monitor_loop_lag(), background_loop)
+
+    background_loop.call_soon_threadsafe(_start_reconnecting)
+
+
+def is_connected():
+    return ib.isConnected()
+
+
+def get_connection_state():
+    state = dict(_connection, connected=ib.isConnected())
+    if state["next_attempt_at"]:
+        state["retry_in_seconds"] = round(max(0.0, state["next_attempt_at"] - time.time()), 1)
+    for key in ("connected_since", "next_attempt_at"):
+        if state[key]:
+            state[key] = datetime.fromtimestamp(state[key], timezone.utc).isoformat()
+    return state
 
 
 def disconnect_from_ib():
+    global _stopping
+    _stopping = True
+    _connection.update(state="disconnected", connected_since=None)
     if ib.isConnected():
         ib.disconnect()
 
-    if background_loop and background_loop.is_running():
+    # A borrowed loop belongs to the server, which stops it
+    if _owns_loop and background_loop.is_running():
         background_loop.call_soon_threadsafe(background_loop.stop)
 
 
+def _drop_cached(key):
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        _cache.pop(key, None)
+
+
+def invalidate_cache(kind=None):
+    """Drop cached responses of one kind (e.g. "portfolio"), or all of them."""
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        for key in [key for key in _cache if kind is None or key[0] == kind]:
+            del _cache[key]
+
+
+def _store_cached(key, ttl, generation, future):
+    with _cache_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+        # Skip results that raced with an invalidation
+        if future.cancelled() or future.exception() or generation != _cache_generation:
+            return
+        _cache[key] = (time.monotonic() + ttl, future.result())
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def _lookup_cached(key, make_coro):
+    """(True, value) on a cache hit, else (False, future) of the in-flight call."""
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            _cache.move_to_end(key)
+            metrics_service.CACHE_REQUESTS.inc(cache=key[0], result="hit")
+            return True, entry[1]
+
+        future = _inflight.get(key)
+        if future is not None:
+            metrics_service.CACHE_REQUESTS.inc(cache=key[0], result="shared")
+        else:
+            metrics_service.CACHE_REQUESTS.inc(cache=key[0], result="miss")
+            future = _submit(make_coro())
+            _inflight[key] = future
+            generation = _cache_generation
+            future.add_done_callback(
+                lambda f: _store_cached(key, CACHE_TTLS[key[0]], generation, f)
+            )
+    return False, future
+
+
+def _cached_call(key, make_coro, timeout):
+    """Run ``make_coro()`` on the background loop behind a TTL/LRU cache.
+
+    Concurrent callers asking for the same key share one in-flight coroutine
+    instead of each scheduling their own IB round-trip.
+    """
+    hit, result = _lookup_cached(key, make_coro)
+    return result if hit else result.result(timeout=timeout)
+
+
+async def _cached_call_async(key, make_coro, timeout):
+    """``_cached_call`` for callers already running on the background loop."""
+    hit, result = _lookup_cached(key, make_coro)
+    if hit:
+        return result
+    # Shielded so one caller timing out does not cancel the call others share
+    return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(result)), timeout)
+
+
 # Helper function
-async def _get_account_summary_async():
-    return await ib.accountSummaryAsync()
+async def _fetch_account_summary():
+    return await _timed("account_summary", ib.accountSummaryAsync())
 
 
 def get_account_summary():
     if not ib.isConnected() or not background_loop:
         raise ConnectionError("IBKR not connected")
 
-    future = asyncio.run_coroutine_threadsafe(
-        _get_account_summary_async(), background_loop
-    )
-    return future.result(timeout=10)
+    return _cached_call(("account_summary",), _fetch_account_summary, timeout=10)
+
+
+async def get_account_summary_async():
+    if not ib.isConnected() or not background_loop:
+        raise ConnectionError("IBKR not connected")
+
+    return await _cached_call_async(("account_summary",), _fetch_account_summary, timeout=10)
 
 
 # Helper function
-async def _get_portfolio_async():
-    return ib.portfolio
+async def _fetch_portfolio():
+    return ib.portfolio()
 
 
 def get_portfolio():
     if not ib.isConnected() or not background_loop:
         raise ConnectionError("IBKR not connected")
 
-    future = asyncio.run_coroutine_threadsafe(_get_portfolio_async(), background_loop)
-    return future.result(timeout=10)
+    return _cached_call(("portfolio",), _fetch_portfolio, timeout=10)
+
+
+async def get_portfolio_async():
+    if not ib.isConnected() or not background_loop:
+        raise ConnectionError("IBKR not connected")
+
+    return await _cached_call_async(("portfolio",), _fetch_portfolio, timeout=10)
+
+
+def _bar_to_dict(bar):
+    return {
+        "Date": str(bar.date),
+        # "Open": bar.open,
+        # "High": bar.high,
+        # "Low": bar.low,
+        "Close": bar.close,
+        # "Volume": bar.volume,
+        # "barCount": bar.barCount,
+    }
+
+
+# Runs on the background loop for every keepUpToDate bar update
+def _on_bar_update(symbol, bars, has_new_bar):
+    if len(bars) > MAX_STREAM_BARS:
+        del bars[: len(bars) - MAX_STREAM_BARS]
+
+    stream = _streams.get(symbol)
+    if not stream or not bars:
+        return
+
+    stream["version"] += 1
+    _drop_cached(("historic_data", symbol, STREAM_BAR_SIZE))
+    event = {
+        "symbol": symbol,
+        "version": stream["version"],
+        "newBar": has_new_bar,
+        "bar": _bar_to_dict(bars[-1]),
+    }
+    for listener in list(stream["listeners"]):
+        try:
+            listener.put_nowait(event)
+        except (queue.Full, asyncio.QueueFull):
+            # Slow client, it will resync from a fresh snapshot on reconnect
+            pass
+
+
+def _reset_streams():
+    with _streams_lock:
+        streams = list(_streams.values())
+        _streams.clear()
+
+    for stream in streams:
+        for listener in list(stream["listeners"]):
+            try:
+                listener.put_nowait(None)
+            except (queue.Full, asyncio.QueueFull):
+                pass
 
 
 # Helper function
-async def _fetch_historic_market_data(symbol):
-    contract = Stock(symbol.upper(), "SMART", "USD")
-    await ib.qualifyContractsAsync(contract)
-
-    bars = await ib.reqHistoricalDataAsync(
-        contract,
-        endDateTime="",
-        durationStr="30 D",
-        barSizeSetting="1 hour",
-        whatToShow="TRADES",
-        useRTH=True,
+async def _subscribe_market_data(symbol):
+    contract = Stock(symbol, "SMART", "USD")
+    await _timed("qualify", ib.qualifyContractsAsync(contract))
+
+    bars = await _timed(
+        "historical_data",
+        ib.reqHistoricalDataAsync(
+            contract,
+            endDateTime="",
+            durationStr=STREAM_DURATION,
+            barSizeSetting=STREAM_BAR_SIZE,
+            whatToShow="TRADES",
+            useRTH=True,
+            keepUpToDate=True,
+        ),
+    )
+    bars.updateEvent += lambda bars, has_new_bar: _on_bar_update(
+        symbol, bars, has_new_bar
     )
 
-    print("--- Finished fetching data from IBKR ---")
-    processed_bars = [
-        {
-            "Date": str(bar.date),
-            # "Open": bar.open,
-            # "High": bar.high,
-            # "Low": bar.low,
-            "Close": bar.close,
-            # "Volume": bar.volume,
-            # "barCount": bar.barCount,
-        }
-        for bar in bars
-    ]
-    return processed_bars
+    print(f"--- Subscribed to live bars for {symbol} ---")
+    return bars
+
+
+def _get_stream(symbol):
+    if not ib.isConnected() or not background_loop:
+        raise ConnectionError("IBKR not connected")
+
+    with _streams_lock:
+        stream = _streams.get(symbol)
+        if stream is None:
+            stream = {
+                "future": _submit(_subscribe_market_data(symbol)),
+                "version": 0,
+                "listeners": set(),
+            }
+            _streams[symbol] = stream
+    return stream
+
+
+# Drop a failed subscription so the next request retries it
+def _drop_stream(symbol, stream):
+    with _streams_lock:
+        if _streams.get(symbol) is stream:
+            del _streams[symbol]
+
+
+def subscribe_market_data(symbol):
+    """Subscribe once per symbol and return its live stream entry.
+
+    The first caller starts the keepUpToDate request on the background loop;
+    every later caller reuses the same rolling bar buffer.
+    """
+    symbol = symbol.upper()
+    stream = _get_stream(symbol)
+    try:
+        stream["future"].result(timeout=30)
+    except Exception:
+        _drop_stream(symbol, stream)
+        raise
+    return stream
+
+
+async def subscribe_market_data_async(symbol):
+    symbol = symbol.upper()
+    stream = _get_stream(symbol)
+    try:
+        await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(stream["future"])), 30)
+    except Exception:
+        _drop_stream(symbol, stream)
+        raise
+    return stream
+
+
+def _snapshot(stream):
+    return [_bar_to_dict(bar) for bar in list(stream["future"].result())]
+
+
+# Helper function, snapshots on the loop so no bar update lands mid-copy
+async def _snapshot_async(stream):
+    return _snapshot(stream)
 
 
 def get_historic_market_data(symbol):
     if not background_loop:
         raise ConnectionError("IB event loop is not running")
-    future = asyncio.run_coroutine_threadsafe(
-        _fetch_historic_market_data(symbol), background_loop
-    )
 
     try:
-        processed_data = future.result(timeout=30)
-        return {"data": processed_data}
+        symbol = symbol.upper()
+        stream = subscribe_market_data(symbol)
+        data = _cached_call(
+            ("historic_data", symbol, STREAM_BAR_SIZE),
+            lambda: _snapshot_async(stream),
+            timeout=10,
+        )
+        return {"data": data}
+
+    except TIMEOUT_ERRORS:
+        print("--- Task Timed Out ---")
+        return {"error": "Request to IBKR timed out."}
+
+    except ConnectionError:
+        raise
+
+    except Exception as e:
+        print(f"--- An error occured in the IBKR task: {e} ---")
+        return {"error": f"An error occured: {str(e)}"}
+
+
+async def get_historic_market_data_async(symbol):
+    if not background_loop:
+        raise ConnectionError("IB event loop is not running")
+
+    try:
+        symbol = symbol.upper()
+        stream = await subscribe_market_data_async(symbol)
+        data = await _cached_call_async(
+            ("historic_data", symbol, STREAM_BAR_SIZE),
+            lambda: _snapshot_async(stream),
+            timeout=10,
+        )
+        return {"data": data}
 
-    except asyncio.TimeoutError:
+    except TIMEOUT_ERRORS:
         print("--- Task Timed Out ---")
         return {"error": "Request to IBKR timed out."}
 
+    except ConnectionError:
+        raise
+
     except Exception as e:
         print(f"--- An error occured in the IBKR task: {e} ---")
         return {"error": f"An error occured: {str(e)}"}
 
 
+def listen_market_data(symbol):
+    """Return (snapshot, queue) for a live bar stream; updates land on the queue.
+
+    A ``None`` on the queue means the subscription was dropped.  Callers must
+    hand the queue back to ``unlisten_market_data`` when they are done.
+    """
+    symbol = symbol.upper()
+    listener = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    while True:
+        stream = subscribe_market_data(symbol)
+        if _add_listener(symbol, stream, listener):
+            break
+    try:
+        # Bar updates change the list on the loop, so it is copied there too
+        snapshot = _submit(_snapshot_async(stream)).result(timeout=10)
+    except BaseException:
+        unlisten_market_data(symbol, listener)
+        raise
+    return snapshot, listener
+
+
+async def listen_market_data_async(symbol):
+    """``listen_market_data`` on the background loop, with an asyncio queue."""
+    symbol = symbol.upper()
+    listener = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+    while True:
+        stream = await subscribe_market_data_async(symbol)
+        if _add_listener(symbol, stream, listener):
+            return _snapshot(stream), listener
+
+
+# False when the last listener left and the stream was cancelled meanwhile
+def _add_listener(symbol, stream, listener):
+    with _streams_lock:
+        if _streams.get(symbol) is not stream:
+            return False
+        stream["listeners"].add(listener)
+        return True
+
+
 # Helper function
-async def _order_contract(
-    symbol, expiration_date, strike, right, action, quantity, order_type, price=None
-):
-    contract = Option(symbol, expiration_date, strike, right, "SMART", "100", "USD")
-    await ib.qualifyContractsAsync(contract)
+async def _cancel_market_data(symbol, stream):
+    try:
+        bars = await asyncio.wrap_future(stream["future"])
+    except Exception:
+        # The subscription never started
+        return
+    if ib.isConnected():
+        ib.cancelHistoricalData(bars)
+    print(f"--- Unsubscribed from live bars for {symbol} ---")
+
+
+def unlisten_market_data(symbol, listener):
+    """Stop feeding ``listener``; the last one to leave cancels the subscription."""
+    symbol = symbol.upper()
+    with _streams_lock:
+        stream = _streams.get(symbol)
+        if stream is None or listener not in stream["listeners"]:
+            return
+        stream["listeners"].discard(listener)
+        if stream["listeners"]:
+            return
+        # Every open keepUpToDate request holds one of IB's market data lines
+        del _streams[symbol]
+    _submit(_cancel_market_data(symbol, stream))
+
+
+def _parse_duration(duration):
+    amount, _, unit = duration.strip().partition(" ")
+    if not amount.isdigit() or unit not in DURATION_UNITS or int(amount) <= 0:
+        raise ValueError(f"Invalid duration {duration!r}, expected e.g. '30 D' or '1 Y'")
+    return int(amount) * DURATION_UNITS[unit]
+
+
+def _ib_duration(seconds, bar_seconds):
+    # IB takes seconds only up to a day, and only for intraday bars
+    if seconds <= 86400 and bar_seconds < 86400:
+        return f"{max(30, math.ceil(seconds))} S"
+    days = math.ceil(seconds / 86400)
+    return f"{days} D" if days <= 365 else f"{math.ceil(days / 365)} Y"
+
+
+def _pacing_delay(symbol, now):
+    while _historic_sent and now - _historic_sent[0] >= PACING_WINDOW:
+        _historic_sent.popleft()
+    recent = _historic_sent_by_symbol.setdefault(symbol, deque())
+    while recent and now - recent[0] >= CONTRACT_PACING_WINDOW:
+        recent.popleft()
+
+    delay = 0.0
+    if len(_historic_sent) >= PACING_MAX_REQUESTS:
+        delay = _historic_sent[0] + PACING_WINDOW - now
+    if len(recent) >= CONTRACT_PACING_MAX_REQUESTS:
+        delay = max(delay, recent[0] + CONTRACT_PACING_WINDOW - now)
+    return delay
 
+
+# Helper function, one historical request within IB's pacing limits
+async def _paced_historical_data(contract, end, duration, bar_size):
+    async with _historic_semaphore:
+        loop = asyncio.get_running_loop()
+        while (delay := _pacing_delay(contract.symbol, loop.time())) > 0:
+            await asyncio.sleep(delay)
+        now = loop.time()
+        _historic_sent.append(now)
+        _historic_sent_by_symbol[contract.symbol].append(now)
+
+        return await _timed(
+            "historical_data",
+            ib.reqHistoricalDataAsync(
+                contract,
+                endDateTime=end,
+                durationStr=duration,
+                barSizeSetting=bar_size,
+                whatToShow="TRADES",
+                useRTH=True,
+                formatDate=2,
+            ),
+        )
+
+
+def _bars_to_array(bars):
+    array = np.empty(len(bars), dtype=ohlcv_store.IB_BAR_DTYPE)
+    for i, bar in enumerate(bars):
+        # Daily bars come back as dates, intraday ones as UTC datetimes (formatDate=2)
+        moment = bar.date
+        if not isinstance(moment, datetime):
+            moment = datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+        array[i] = (
+            np.datetime64(int(moment.timestamp()), "s"),
+            bar.open,
+            bar.high,
+            bar.low,
+            bar.close,
+            max(0, int(bar.volume)),
+        )
+    return array
+
+
+async def _qualify_stock(symbol):
+    contract = _stock_contracts.get(symbol)
+    if contract is None:
+        contract = Stock(symbol, "SMART", "USD")
+        await _timed("qualify", ib.qualifyContractsAsync(contract))
+        if not contract.conId:
+            raise ValueError(f"Unknown symbol {symbol}")
+        _stock_contracts[symbol] = contract
+    return contract
+
+
+# Helper function, brings one stored series up to date; returns IB requests made
+async def _update_series(symbol, bar_size, duration_seconds):
+    key = (symbol, bar_size)
+    bar_seconds = HISTORIC_BAR_SIZES[bar_size]
+    loop = asyncio.get_running_loop()
+    # Concurrent batches asking for the same series wait for one update
+    async with _historic_locks.setdefault(key, asyncio.Lock()):
+        staleness = max(HISTORIC_MIN_STALENESS, min(bar_seconds, HISTORIC_MAX_STALENESS))
+        fetched_at = _historic_fetched_at.get(key)
+        now = time.time()
+        start = now - duration_seconds
+        stored = await loop.run_in_executor(None, ohlcv_store.get_ib_bars, symbol, bar_size)
+        first = stored["date"][0].astype(int) if len(stored) else None
+        last = stored["date"][-1].astype(int) if len(stored) else None
+        head_missing = first is None or (
+            first - start > HISTORIC_HEAD_SLACK and _historic_backfilled.get(key, now) > start
+        )
+        if not head_missing and fetched_at is not None and loop.time() - fetched_at < staleness:
+            return 0
+
+        contract = await _qualify_stock(symbol)
+        requests = []
+        if first is None:
+            requests.append(("", _ib_duration(duration_seconds, bar_seconds)))
+        else:
+            if head_missing:
+                # Only the part before the first stored bar
+                end = datetime.fromtimestamp(first, timezone.utc)
+                requests.append((end, _ib_duration(first - start, bar_seconds)))
+            # From the last stored bar, which may still have been forming
+            requests.append(("", _ib_duration(now - last + bar_seconds, bar_seconds)))
+
+        fetched = await asyncio.gather(
+            *(_paced_historical_data(contract, end, d, bar_size) for end, d in requests)
+        )
+        appended = 0
+        for bars in fetched:
+            appended += await loop.run_in_executor(
+                None, ohlcv_store.append_ib_bars, symbol, bar_size, _bars_to_array(bars)
+            )
+        if head_missing:
+            _historic_backfilled[key] = min(start, _historic_backfilled.get(key, start))
+        _historic_fetched_at[key] = loop.time()
+        if appended:
+            print(f"--- Stored {appended} new {bar_size} {symbol} bars ---")
+        return len(requests)
+
+
+# Helper function
+async def _update_many(symbols, bar_size, duration_seconds):
+    results = await asyncio.gather(
+        *(_update_series(symbol, bar_size, duration_seconds) for symbol in symbols),
+        return_exceptions=True,
+    )
+    return dict(zip(symbols, results))
+
+
+def _stored_bar_to_dict(bar, daily):
+    moment = bar["date"].astype(datetime).replace(tzinfo=timezone.utc)
+    return {
+        "Date": str(moment.date() if daily else moment),
+        "Open": float(bar["open"]),
+        "High": float(bar["high"]),
+        "Low": float(bar["low"]),
+        "Close": float(bar["close"]),
+        "Volume": int(bar["volume"]),
+    }
+
+
+def get_historic_bars(symbols, bar_size=STREAM_BAR_SIZE, duration=STREAM_DURATION):
+    """Full OHLCV bars for several symbols, kept in a local store between calls.
+
+    Only what the store is missing is requested from IB: the bars since the
+    last stored one (none while the series is fresh) and, for a longer
+    duration than before, the older part. Requests for all symbols run
+    concurrently on the background loop within IB's pacing limits; a batch
+    that has to wait out the limits may time out, but keeps filling the
+    store, so a retry is fast. Returns {"data": {symbol: bars}, "errors":
+    {symbol: message}}.
+    """
+    symbols, duration_seconds = _parse_historic_request(symbols, bar_size, duration)
+    try:
+        results = _submit(_update_many(symbols, bar_size, duration_seconds)).result(
+            timeout=HISTORIC_BATCH_TIMEOUT
+        )
+    except TIMEOUT_ERRORS:
+        print("--- Historic data batch timed out waiting on IB pacing ---")
+        raise
+    return _historic_response(results, bar_size, duration_seconds)
+
+
+async def get_historic_bars_async(symbols, bar_size=STREAM_BAR_SIZE, duration=STREAM_DURATION):
+    symbols, duration_seconds = _parse_historic_request(symbols, bar_size, duration)
+    try:
+        # Shielded so a timed-out batch keeps filling the store, as above
+        results = await asyncio.wait_for(
+            asyncio.shield(_update_many(symbols, bar_size, duration_seconds)),
+            HISTORIC_BATCH_TIMEOUT,
+        )
+    except TIMEOUT_ERRORS:
+        print("--- Historic data batch timed out waiting on IB pacing ---")
+        raise
+    # Reading and converting a large batch of stored bars would stall the loop
+    return await asyncio.get_running_loop().run_in_executor(
+        None, _historic_response, results, bar_size, duration_seconds
+    )
+
+
+def _parse_historic_request(symbols, bar_size, duration):
+    symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()))
+    if not symbols:
+        raise ValueError("At least one symbol is required")
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        raise ValueError(f"At most {MAX_BATCH_SYMBOLS} symbols per request")
+    if bar_size not in HISTORIC_BAR_SIZES:
+        raise ValueError(f"Unsupported bar size {bar_size!r}, expected one of {list(HISTORIC_BAR_SIZES)}")
+    duration_seconds = _parse_duration(duration)
+    if not ib.isConnected() or not background_loop:
+        raise ConnectionError("IBKR not connected")
+    return symbols, duration_seconds
+
+
+def _historic_response(results, bar_size, duration_seconds):
+    start = np.datetime64(int(time.time() - duration_seconds), "s")
+    daily = HISTORIC_BAR_SIZES[bar_size] >= 86400
+    data, errors = {}, {}
+    for symbol, result in results.items():
+        if isinstance(result, Exception):
+            print(f"--- Failed to load {bar_size} bars for {symbol}: {result!r} ---")
+            errors[symbol] = str(result)
+            continue
+        bars = ohlcv_store.get_ib_bars(symbol, bar_size, start)
+        data[symbol] = [_stored_bar_to_dict(bar, daily) for bar in bars]
+    return {"data": data, "errors": errors}
+
+
+def _number(value):
+    # IB leaves missing prices as NaN, which is not valid JSON
+    return None if value is None or math.isnan(value) else value
+
+
+def _description_to_dict(description):
+    contract = description.contract
+    return {
+        "conId": contract.conId,
+        "symbol": contract.symbol,
+        "secType": contract.secType,
+        "primaryExchange": contract.primaryExchange,
+        "currency": contract.currency,
+        "name": contract.description,
+        "derivativeSecTypes": list(description.derivativeSecTypes or []),
+    }
+
+
+def _details_to_dict(details):
+    contract = details.contract
+    return {
+        "conId": contract.conId,
+        "symbol": contract.symbol,
+        "secType": contract.secType,
+        "exchange": contract.exchange,
+        "primaryExchange": contract.primaryExchange,
+        "currency": contract.currency,
+        "localSymbol": contract.localSymbol,
+        "name": details.longName,
+        "industry": details.industry,
+        "category": details.category,
+        "subcategory": details.subcategory,
+        "stockType": details.stockType,
+        "minTick": details.minTick,
+        "timeZoneId": details.timeZoneId,
+        "validExchanges": details.validExchanges.split(",") if details.validExchanges else [],
+    }
+
+
+def _ticker_to_dict(ticker):
+    return {
+        "conId": ticker.contract.conId,
+        "symbol": ticker.contract.symbol,
+        "bid": _number(ticker.bid),
+        "ask": _number(ticker.ask),
+        "last": _number(ticker.last),
+        "close": _number(ticker.close),
+        "open": _number(ticker.open),
+        "high": _number(ticker.high),
+        "low": _number(ticker.low),
+        "volume": _number(ticker.volume),
+        "marketPrice": _number(ticker.marketPrice()),
+        "time": ticker.time.isoformat() if ticker.time else None,
+    }
+
+
+# Helper function
+async def _match_symbols(pattern):
+    descriptions = await _timed("match_symbols", ib.reqMatchingSymbolsAsync(pattern))
+    # None when IB did not answer in time
+    if descriptions is None:
+        raise TimeoutError("Symbol search timed out.")
+    return [_description_to_dict(description) for description in descriptions]
+
+
+def match_symbols(pattern):
+    """IB's matches for a symbol or company name pattern (at most 16)."""
+    if not ib.isConnected() or not background_loop:
+        raise ConnectionError("IBKR not connected")
+
+    return _submit(_match_symbols(pattern)).result(timeout=SYMBOL_REQUEST_TIMEOUT)
+
+
+# Helper function, all symbols in one round-trip to the loop
+async def _contract_details(symbols):
+    results = await asyncio.gather(
+        *(
+            _timed("contract_details", ib.reqContractDetailsAsync(Stock(symbol, "SMART", "USD")))
+            for symbol in symbols
+        ),
+        return_exceptions=True,
+    )
+    return {
+        symbol: result if isinstance(result, Exception) else [_details_to_dict(d) for d in result]
+        for symbol, result in zip(symbols, results)
+    }
+
+
+def get_contract_details(symbols):
+    """US stock contract details per symbol: {symbol: [details] or exception}.
+
+    An unknown symbol maps to an empty list.
+    """
+    if not ib.isConnected() or not background_loop:
+        raise ConnectionError("IBKR not connected")
+
+    return _submit(_contract_details(list(symbols))).result(timeout=SYMBOL_REQUEST_TIMEOUT)
+
+
+# Helper function
+async def _quotes(contracts):
+    tickers = await _timed("tickers", ib.reqTickersAsync(*contracts))
+    return [_ticker_to_dict(ticker) for ticker in tickers]
+
+
+def get_quotes(contracts):
+    """Snapshot quotes for contract dicts with a ``conId``, from one reqTickers.
+
+    The contracts are already known (e.g. from ``get_contract_details``), so
+    nothing is qualified first. Returns one quote dict per contract that IB
+    answered for.
+    """
+    if not ib.isConnected() or not background_loop:
+        raise ConnectionError("IBKR not connected")
+
+    contracts = [
+        Stock(
+            contract["symbol"],
+            "SMART",
+            contract.get("currency", "USD"),
+            conId=contract["conId"],
+            primaryExchange=contract.get("primaryExchange", ""),
+        )
+        for contract in contracts
+    ]
+    return _submit(_quotes(contracts)).result(timeout=SYMBOL_REQUEST_TIMEOUT)
+
+
+def _option_key(symbol, expiration_date, strike, right):
+    return (symbol.upper(), str(expiration_date), float(strike), right.upper())
+
+
+# Helper function, qualifies every uncached leg in a single IB request
+async def _qualify_options(keys):
+    missing = [key for key in dict.fromkeys(keys) if key not in _qualified_contracts]
+    if missing:
+        contracts = [
+            Option(symbol, expiration_date, strike, right, "SMART", "100", "USD")
+            for symbol, expiration_date, strike, right in missing
+        ]
+        await _timed("qualify", ib.qualifyContractsAsync(*contracts))
+        for key, contract in zip(missing, contracts):
+            if contract.conId:
+                _qualified_contracts[key] = contract
+
+    return [_qualified_contracts.get(key) for key in keys]
+
+
+# placeOrder itself returns at once; its round-trip ends when IB acknowledges
+# the order with its first non-pending status
+def _place_order(contract, order):
+    started = time.perf_counter()
+    trade = ib.placeOrder(contract, order)
+
+    def on_status(trade):
+        if trade.orderStatus.status in PENDING_ORDER_STATES:
+            return
+        trade.statusEvent -= on_status
+        metrics_service.IB_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, request="place_order"
+        )
+
+    trade.statusEvent += on_status
+    return trade
+
+
+def _make_order(action, quantity, order_type, price=None):
     order = Order()
     order.action = action
     order.totalQuantity = quantity
     order.orderType = order_type
-    if price:
+    if price is not None:
         order.lmtPrice = price
-    trade = ib.placeOrder(contract, order)
+    return order
+
+
+def _make_vertical(symbol, short_contract, long_contract):
+    # Legs are written as the debit spread; SELLing this combo opens the credit
+    # spread (short strike sold, long strike bought) in one order
+    return Contract(
+        symbol=symbol,
+        secType="BAG",
+        exchange="SMART",
+        currency="USD",
+        comboLegs=[
+            ComboLeg(conId=short_contract.conId, ratio=1, action="BUY", exchange="SMART"),
+            ComboLeg(conId=long_contract.conId, ratio=1, action="SELL", exchange="SMART"),
+        ],
+    )
+
+
+def _order_keys(order):
+    if "short_strike" in order:
+        return [
+            _option_key(
+                order["symbol"], order["expiration_date"], strike, order["right"]
+            )
+            for strike in (order["short_strike"], order["long_strike"])
+        ]
+    return [
+        _option_key(
+            order["symbol"], order["expiration_date"], order["strike"], order["right"]
+        )
+    ]
+
+
+# Helper function
+async def _order_batch(orders, handles=None):
+    await _qualify_options([key for order in orders for key in _order_keys(order)])
+
+    results = []
+    for i, order in enumerate(orders):
+        legs = [_qualified_contracts.get(key) for key in _order_keys(order)]
+        result = {"order": order, "legs": legs, "trade": None, "error": None}
+        if not all(legs):
+            result["error"] = "Could not qualify contract"
+        elif len(legs) == 2:
+            result["trade"] = _place_order(
+                _make_vertical(order["symbol"].upper(), *legs),
+                _make_order(
+                    "SELL",
+                    order["quantity"],
+                    order.get("order_type", "LMT"),
+                    order.get("price"),
+                ),
+            )
+        else:
+            result["trade"] = _place_order(
+                legs[0],
+                _make_order(
+                    order["action"],
+                    order["quantity"],
+                    order.get("order_type", "MKT"),
+                    order.get("price"),
+                ),
+            )
+        if handles:
+            # Mapped before this loop can deliver a status or fill for the order
+            order_service.on_placed(handles[i], result)
+        results.append(result)
+    return results
+
+
+def order_batch(orders):
+    """Qualify and place several orders in one round-trip to the background loop.
+
+    Each order is a dict with ``symbol``, ``expiration_date``, ``right``,
+    ``quantity`` and optional ``order_type``/``price``, plus either ``strike``
+    and ``action`` for a single leg or ``short_strike``/``long_strike`` for a
+    vertical credit spread sent as one combo order.  Returns one dict per
+    order with the qualified ``legs``, the ``trade`` and any ``error``.
+    """
+    if not background_loop:
+        raise ConnectionError("IB event loop is not running")
+
+    future = _submit(_order_batch(orders))
+
+    try:
+        return future.result(timeout=10)
+    except TIMEOUT_ERRORS:
+        raise TimeoutError("Order placement timed out.")
+
+
+ORDER_SUBMIT_TIMEOUT = 30
+
+
+# Helper function
+async def _submit_batch(handles, orders):
+    try:
+        await asyncio.wait_for(_order_batch(orders, handles), ORDER_SUBMIT_TIMEOUT)
+    except Exception as e:
+        for handle in handles:
+            order_service.on_failed(handle, str(e) or type(e).__name__)
+
+
+def submit_batch(orders):
+    """Queue orders for placement and return their handles without waiting.
+
+    Takes the same order dicts as ``order_batch``.  Status and fills are
+    tracked by ``order_service`` from IB's order events.
+    """
+    if not ib.isConnected() or not background_loop:
+        raise ConnectionError("IBKR not connected")
+
+    handles = [order_service.create(order) for order in orders]
+    _submit(_submit_batch(handles, orders))
+    return handles
+
+
+def order_spread(
+    symbol,
+    expiration_date,
+    short_strike,
+    long_strike,
+    right,
+    quantity,
+    order_type="LMT",
+    price=None,
+):
+    return order_batch(
+        [
+            {
+                "symbol": symbol,
+                "expiration_date": expiration_date,
+                "short_strike": short_strike,
+                "long_strike": long_strike,
+                "right": right,
+                "quantity": quantity,
+                "order_type": order_type,
+                "price": price,
+            }
+        ]
+    )[0]
+
+
+# Helper function
+async def _order_contract(
+    symbol, expiration_date, strike, right, action, quantity, order_type, price=None
+):
+    [contract] = await _qualify_options(
+        [_option_key(symbol, expiration_date, strike, right)]
+    )
+    if contract is None:
+        raise ValueError("Could not qualify contract")
+
+    trade = _place_order(contract, _make_order(action, quantity, order_type, price))
     return trade
 
 
@@ -165,14 +1181,13 @@ def order_contract(
     if not background_loop:
         raise ConnectionError("IB event loop is not running")
 
-    future = asyncio.tasks.run_coroutine_threadsafe(
+    future = _submit(
         _order_contract(
             symbol, expiration_date, strike, right, action, quantity, order_type, price
-        ),
-        background_loop,
+        )
     )
 
     try:
         return future.result(timeout=10)
-    except asyncio.TimeoutError:
+    except TIMEOUT_ERRORS:
         raise TimeoutError("Order placement timed out.")
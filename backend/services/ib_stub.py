@@ -0,0 +1,479 @@
+import asyncio
+import itertools
+import json
+import os
+import random
+from datetime import date, datetime, timedelta, timezone
+
+from eventkit import Event
+from ib_async import (
+    AccountValue,
+    BarData,
+    BarDataList,
+    CommissionReport,
+    Contract,
+    ContractDescription,
+    ContractDetails,
+    Execution,
+    Fill,
+    OrderStatus,
+    PortfolioItem,
+    Stock,
+    Ticker,
+    Trade,
+)
+
+ACCOUNT = "DU0000000"
+# Simulated round-trip of every request, and delay between order steps
+LATENCY = float(os.getenv("IB_STUB_LATENCY", "0.05"))
+# Seconds between live bar updates
+BAR_INTERVAL = float(os.getenv("IB_STUB_BAR_SECONDS", "1.0"))
+# Session captured with `python -m services.ib_stub record`; replayed instead of synthetic data
+RECORDING_FILE = os.getenv("IB_STUB_RECORDING")
+# Fixes the synthetic prices and bars so benchmark runs are comparable
+SEED = os.getenv("IB_STUB_SEED")
+
+# Units of durationStr and lengths of the bar sizes the stub can generate
+DURATION_UNITS = {"S": 1, "D": 86400, "W": 7 * 86400, "M": 30 * 86400, "Y": 365 * 86400}
+BAR_SIZES = {
+    "1 min": 60,
+    "5 mins": 300,
+    "15 mins": 900,
+    "30 mins": 1800,
+    "1 hour": 3600,
+    "4 hours": 4 * 3600,
+    "1 day": 86400,
+}
+# Caps a synthetic series, like IB's limit on bars per request
+MAX_SYNTHETIC_BARS = 5000
+
+# Listings the stub knows for symbol search and contract details
+STOCKS = {
+    "AAPL": ("APPLE INC", "NASDAQ", "Technology"),
+    "AMD": ("ADVANCED MICRO DEVICES", "NASDAQ", "Technology"),
+    "AMZN": ("AMAZON.COM INC", "NASDAQ", "Communications"),
+    "GOOGL": ("ALPHABET INC-CL A", "NASDAQ", "Communications"),
+    "IWM": ("ISHARES RUSSELL 2000 ETF", "ARCA", "Funds"),
+    "META": ("META PLATFORMS INC-CLASS A", "NASDAQ", "Communications"),
+    "MSFT": ("MICROSOFT CORP", "NASDAQ", "Technology"),
+    "NVDA": ("NVIDIA CORP", "NASDAQ", "Technology"),
+    "QQQ": ("INVESCO QQQ TRUST SERIES 1", "NASDAQ", "Funds"),
+    "SPY": ("SPDR S&P 500 ETF TRUST", "ARCA", "Funds"),
+    "TSLA": ("TESLA INC", "NASDAQ", "Consumer, Cyclical"),
+}
+# IB answers a symbol search with at most this many matches
+MAX_MATCHING_SYMBOLS = 16
+
+CONTRACT_FIELDS = (
+    "secType",
+    "conId",
+    "symbol",
+    "lastTradeDateOrContractMonth",
+    "strike",
+    "right",
+    "multiplier",
+    "exchange",
+    "currency",
+    "localSymbol",
+)
+
+ACCOUNT_VALUES = {
+    "NetLiquidation": "100000.00",
+    "TotalCashValue": "92500.00",
+    "BuyingPower": "370000.00",
+    "AvailableFunds": "92500.00",
+    "GrossPositionValue": "7500.00",
+    "UnrealizedPnL": "125.00",
+    "RealizedPnL": "0.00",
+}
+
+
+class StubIB:
+    """In-process stand-in for ``ib_async.IB`` that never touches TWS.
+
+    Covers the calls and events ib_service, account_state_service and
+    order_service rely on: account values and a portfolio, contract
+    qualification, symbol search, contract details and snapshot quotes
+    for the STOCKS listings, keepUpToDate historical bars that tick every
+    BAR_INTERVAL seconds, and orders that go Submitted then Filled after
+    ``latency`` seconds each. Account values, portfolio and bars come from
+    ``recording`` when given; otherwise prices are a random walk per symbol.
+    Every request also waits ``latency`` seconds, like a round-trip to TWS.
+    """
+
+    def __init__(self, recording=RECORDING_FILE, latency=LATENCY, seed=SEED):
+        self.connectedEvent = Event("connectedEvent")
+        self.disconnectedEvent = Event("disconnectedEvent")
+        self.accountValueEvent = Event("accountValueEvent")
+        self.updatePortfolioEvent = Event("updatePortfolioEvent")
+        self.orderStatusEvent = Event("orderStatusEvent")
+        self.execDetailsEvent = Event("execDetailsEvent")
+
+        self.latency = latency
+        self._random = random.Random(seed)
+        self._connected = False
+        self._loop = None
+        self._ticker = None
+        self._subscriptions = []
+        self._order_ids = itertools.count(1)
+        self._exec_ids = itertools.count(1)
+        self._con_ids = {}
+        self._prices = {}
+        self._trades = []
+        self._account = [
+            AccountValue(ACCOUNT, tag, value, "USD", "")
+            for tag, value in ACCOUNT_VALUES.items()
+        ]
+        spy = Stock("SPY", "SMART", "USD", conId=756733, localSymbol="SPY")
+        self._portfolio = [
+            PortfolioItem(spy, 15.0, 500.0, 7500.0, 491.67, 125.0, 0.0, ACCOUNT)
+        ]
+        self._recorded_bars = {}
+        if recording:
+            self.load_recording(recording)
+
+    def load_recording(self, path):
+        with open(path, "r") as f:
+            recording = json.load(f)
+        self._account = [AccountValue(*value) for value in recording["account_values"]]
+        self._portfolio = [
+            PortfolioItem(Contract(**item["contract"]), *item["values"])
+            for item in recording["portfolio"]
+        ]
+        self._recorded_bars = {
+            symbol: [
+                BarData(date=_parse_bar_date(bar["date"]), **{k: v for k, v in bar.items() if k != "date"})
+                for bar in bars
+            ]
+            for symbol, bars in recording["bars"].items()
+        }
+        for symbol, bars in self._recorded_bars.items():
+            if bars:
+                self._prices[symbol] = bars[-1].close
+        print(f"--- Stub IB replaying {path} ---")
+
+    def isConnected(self):
+        return self._connected
+
+    async def connectAsync(self, host="127.0.0.1", port=4002, clientId=1, timeout=4, **kwargs):
+        await asyncio.sleep(self.latency)
+        self._loop = asyncio.get_running_loop()
+        self._connected = True
+        self._ticker = self._loop.create_task(self._tick_bars())
+        print(f"--- Stub IB connected (clientId {clientId}) ---")
+        self.connectedEvent.emit()
+        return self
+
+    def disconnect(self):
+        if not self._connected:
+            return
+        self._connected = False
+        self._subscriptions.clear()
+        if self._ticker:
+            self._loop.call_soon_threadsafe(self._ticker.cancel)
+        self.disconnectedEvent.emit()
+
+    def reqAccountUpdates(self, subscribe=True, account=""):
+        if not subscribe:
+            return
+        for value in self._account:
+            self.accountValueEvent.emit(value)
+        for item in self._portfolio:
+            self.updatePortfolioEvent.emit(item)
+
+    async def accountSummaryAsync(self, account=""):
+        await asyncio.sleep(self.latency)
+        return list(self._account)
+
+    def portfolio(self, account=""):
+        return list(self._portfolio)
+
+    async def qualifyContractsAsync(self, *contracts):
+        await asyncio.sleep(self.latency)
+        for contract in contracts:
+            key = (
+                contract.secType,
+                contract.symbol,
+                contract.lastTradeDateOrContractMonth,
+                contract.strike,
+                contract.right,
+            )
+            contract.conId = self._con_ids.setdefault(key, 100000 + len(self._con_ids))
+            if contract.secType == "OPT":
+                contract.localSymbol = (
+                    f"{contract.symbol:<6}{contract.lastTradeDateOrContractMonth[2:]}"
+                    f"{contract.right}{int(contract.strike * 1000):08d}"
+                )
+            else:
+                contract.localSymbol = contract.symbol
+        return list(contracts)
+
+    def _stock(self, symbol):
+        name, exchange, _ = STOCKS[symbol]
+        # Same conId qualifyContractsAsync gives the stock
+        key = ("STK", symbol, "", 0.0, "")
+        con_id = 756733 if symbol == "SPY" else self._con_ids.setdefault(key, 100000 + len(self._con_ids))
+        return Stock(
+            symbol,
+            "SMART",
+            "USD",
+            conId=con_id,
+            primaryExchange=exchange,
+            localSymbol=symbol,
+            description=name,
+        )
+
+    async def reqMatchingSymbolsAsync(self, pattern):
+        await asyncio.sleep(self.latency)
+        pattern = pattern.upper()
+        matches = [
+            symbol
+            for symbol, (name, _, _) in STOCKS.items()
+            if symbol.startswith(pattern) or pattern in name
+        ]
+        return [
+            ContractDescription(self._stock(symbol), ["OPT"])
+            for symbol in matches[:MAX_MATCHING_SYMBOLS]
+        ]
+
+    async def reqContractDetailsAsync(self, contract):
+        await asyncio.sleep(self.latency)
+        if contract.symbol not in STOCKS:
+            return []
+        name, exchange, industry = STOCKS[contract.symbol]
+        return [
+            ContractDetails(
+                contract=self._stock(contract.symbol),
+                marketName=contract.symbol,
+                minTick=0.01,
+                validExchanges=f"SMART,{exchange},BATS,IEX",
+                longName=name,
+                industry=industry,
+                timeZoneId="US/Eastern",
+                stockType="ETF" if industry == "Funds" else "COMMON",
+            )
+        ]
+
+    async def reqTickersAsync(self, *contracts, regulatorySnapshot=False):
+        await asyncio.sleep(self.latency)
+        now = datetime.now(timezone.utc)
+        tickers = []
+        for contract in contracts:
+            last = self._price(contract.symbol)
+            ticker = Ticker(contract=contract, time=now)
+            # Ticker clears its prices on creation, so they are set afterwards
+            ticker.bid = round(last - 0.01, 2)
+            ticker.ask = round(last + 0.01, 2)
+            ticker.last = round(last, 2)
+            ticker.close = round(last * (1 - self._random.gauss(0, 0.01)), 2)
+            ticker.volume = self._random.randint(100000, 5000000)
+            tickers.append(ticker)
+        return tickers
+
+    def _price(self, symbol):
+        if symbol not in self._prices:
+            self._prices[symbol] = 50 + random.Random(symbol).random() * 450
+        return self._prices[symbol]
+
+    def _step(self, symbol):
+        price = self._price(symbol) * (1 + self._random.gauss(0, 0.002))
+        self._prices[symbol] = price
+        return price
+
+    def _bar(self, date, open_, close):
+        return BarData(
+            date=date,
+            open=open_,
+            high=max(open_, close),
+            low=min(open_, close),
+            close=close,
+            volume=self._random.randint(1000, 50000),
+            average=(open_ + close) / 2,
+            barCount=self._random.randint(100, 1000),
+        )
+
+    async def reqHistoricalDataAsync(
+        self,
+        contract,
+        endDateTime="",
+        durationStr="30 D",
+        barSizeSetting="1 hour",
+        whatToShow="TRADES",
+        useRTH=True,
+        formatDate=1,
+        keepUpToDate=False,
+        **kwargs,
+    ):
+        await asyncio.sleep(self.latency)
+        bars = BarDataList()
+        bars.contract = contract
+        bars.keepUpToDate = keepUpToDate
+        amount, unit = durationStr.split()
+        end = endDateTime or datetime.now(timezone.utc)
+        if not isinstance(end, datetime):
+            end = datetime(end.year, end.month, end.day, tzinfo=timezone.utc)
+        start = end - timedelta(seconds=int(amount) * DURATION_UNITS[unit])
+        recorded = self._recorded_bars.get(contract.symbol)
+        if recorded and not endDateTime:
+            # Recordings age, so a request up to "now" replays all of it
+            bars.extend(recorded)
+        elif recorded:
+            bars.extend(bar for bar in recorded if start <= _bar_time(bar.date) <= end)
+        else:
+            step = BAR_SIZES[barSizeSetting]
+            # Bars open on multiples of their size, the last one is still forming
+            opened = datetime.fromtimestamp(end.timestamp() // step * step, timezone.utc)
+            # Walk backwards from the current price so the last bar matches live ticks
+            close = self._price(contract.symbol)
+            while opened >= start and len(bars) < MAX_SYNTHETIC_BARS:
+                open_ = close * (1 + self._random.gauss(0, 0.004))
+                bar_date = opened.date() if step >= 86400 else opened
+                bars.insert(0, self._bar(bar_date, open_, close))
+                close = open_
+                opened -= timedelta(seconds=step)
+        if keepUpToDate:
+            self._subscriptions.append(bars)
+        return bars
+
+    def cancelHistoricalData(self, bars):
+        if bars in self._subscriptions:
+            self._subscriptions.remove(bars)
+
+    async def _tick_bars(self):
+        ticks = 0
+        while True:
+            await asyncio.sleep(BAR_INTERVAL)
+            ticks += 1
+            for bars in list(self._subscriptions):
+                last = bars[-1]
+                close = self._step(bars.contract.symbol)
+                # Every tenth tick opens a new bar, the rest revise the current one
+                has_new_bar = ticks % 10 == 0
+                if has_new_bar:
+                    bars.append(self._bar(last.date + timedelta(hours=1), last.close, close))
+                else:
+                    bars[-1] = self._bar(last.date, last.open, close)
+                bars.updateEvent.emit(bars, has_new_bar)
+
+    def placeOrder(self, contract, order):
+        order.orderId = order.orderId or next(self._order_ids)
+        trade = Trade(
+            contract=contract,
+            order=order,
+            orderStatus=OrderStatus(
+                orderId=order.orderId, status="PendingSubmit", remaining=order.totalQuantity
+            ),
+        )
+        self._trades.append(trade)
+        self._loop.call_later(self.latency, self._submit, trade)
+        return trade
+
+    def _submit(self, trade):
+        trade.orderStatus.status = "Submitted"
+        trade.statusEvent.emit(trade)
+        self.orderStatusEvent.emit(trade)
+        self._loop.call_later(self.latency, self._fill, trade)
+
+    def _fill(self, trade):
+        order = trade.order
+        price = order.lmtPrice if order.orderType == "LMT" and order.lmtPrice < 1e300 else 1.0
+        now = datetime.now(timezone.utc)
+        execution = Execution(
+            execId=f"stub.{next(self._exec_ids):08d}",
+            time=now,
+            acctNumber=ACCOUNT,
+            exchange="SMART",
+            side="BOT" if order.action == "BUY" else "SLD",
+            shares=order.totalQuantity,
+            price=price,
+            orderId=order.orderId,
+            cumQty=order.totalQuantity,
+            avgPrice=price,
+        )
+        fill = Fill(trade.contract, execution, CommissionReport(execId=execution.execId), now)
+        trade.fills.append(fill)
+
+        status = trade.orderStatus
+        status.status = "Filled"
+        status.filled = order.totalQuantity
+        status.remaining = 0.0
+        status.avgFillPrice = price
+        status.lastFillPrice = price
+        trade.fillEvent.emit(trade, fill)
+        self.execDetailsEvent.emit(trade, fill)
+        trade.statusEvent.emit(trade)
+        self.orderStatusEvent.emit(trade)
+
+
+def _bar_time(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+
+
+def _parse_bar_date(value):
+    # Daily bars are dates, intraday bars timezone-aware datetimes
+    return date.fromisoformat(value) if len(value) == 10 else datetime.fromisoformat(value)
+
+
+def record(path, symbols, duration="30 D", bar_size="1 hour"):
+    """Save the live account, portfolio and bars of ``symbols`` for StubIB to replay.
+
+    Connects to TWS/Gateway with IB_HOST/IB_PORT and IB_RECORD_CLIENT_ID, so it
+    can run next to the backend's own connection.
+    """
+    from ib_async import IB
+
+    ib = IB()
+    ib.connect(
+        os.getenv("IB_HOST", "127.0.0.1"),
+        int(os.getenv("IB_PORT", "4002")),
+        clientId=int(os.getenv("IB_RECORD_CLIENT_ID", "99")),
+        timeout=10,
+    )
+    try:
+        ib.reqAccountUpdates(True)
+        recording = {
+            "account_values": [list(value) for value in ib.accountValues()],
+            "portfolio": [
+                {
+                    "contract": {field: getattr(item.contract, field) for field in CONTRACT_FIELDS},
+                    "values": list(item[1:]),
+                }
+                for item in ib.portfolio()
+            ],
+            "bars": {},
+        }
+        for symbol in symbols:
+            contract = Stock(symbol, "SMART", "USD")
+            ib.qualifyContracts(contract)
+            bars = ib.reqHistoricalData(contract, "", duration, bar_size, "TRADES", True)
+            recording["bars"][symbol] = [
+                {
+                    "date": bar.date.isoformat(),
+                    "open": bar.open,
+                    "high": bar.high,
+                    "low": bar.low,
+                    "close": bar.close,
+                    "volume": bar.volume,
+                    "average": bar.average,
+                    "barCount": bar.barCount,
+                }
+                for bar in bars
+            ]
+            print(f"--- Recorded {len(bars)} {symbol} bars ---")
+    finally:
+        ib.disconnect()
+
+    with open(path, "w") as f:
+        json.dump(recording, f, indent=2)
+    print(f"--- Wrote IB recording to {path} ---")
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python -m services.ib_stub record <file.json> SYMBOL [SYMBOL ...]
+    if len(sys.argv) < 4 or sys.argv[1] != "record":
+        sys.exit("usage: python -m services.ib_stub record <file.json> SYMBOL [SYMBOL ...]")
+    record(sys.argv[2], sys.argv[3:])
@@ -0,0 +1,325 @@
+import cProfile
+import math
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from threading import Lock, Thread
+
+from flask import g, request
+
+# Get the directory where this script is located (backend/services)
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "profiles")
+
+# Prometheus' default buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Requests carrying this header are profiled when PROFILE_REQUESTS is set
+PROFILE_HEADER = "X-Profile"
+PROFILERS = ("cprofile", "pyinstrument")
+# How often each web worker sends its metrics to the IB broker
+REPORT_SECONDS = 5.0
+
+_metrics = []
+# IB broker only: the last snapshot from each web worker, by pid. Kept after a
+# worker exits, so the summed counters never go backwards
+_worker_snapshots = {}
+_worker_lock = Lock()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def values(self):
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to build each response (first byte for streams)",
+    ["method", "route", "status"],
+)
+IB_REQUEST_SECONDS = Histogram(
+    "ib_request_duration_seconds",
+    "IB round-trip time by request type",
+    ["request"],
+)
+IB_LOOP_LAG_SECONDS = Gauge(
+    "ib_loop_lag_seconds",
+    "How late the IB background loop ran its last scheduled wake-up",
+)
+IB_INFLIGHT_FUTURES = Gauge(
+    "ib_inflight_futures",
+    "Coroutines submitted to the IB background loop that have not finished",
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by outcome (hit, miss, or shared an in-flight request)",
+    ["cache", "result"],
+)
+
+
+def snapshot():
+    """Every metric's current values; picklable, so the IB broker can send it."""
+    return {
+        metric.name: {
+            "kind": metric.kind,
+            "help": metric.help,
+            "labelnames": metric.labelnames,
+            "buckets": getattr(metric, "buckets", None),
+            "values": metric.values(),
+        }
+        for metric in _metrics
+    }
+
+
+def collect(worker, worker_snapshot):
+    """Store a web worker's snapshot; return this process's and every worker's.
+
+    Runs in the IB broker, which every worker reports to, so whichever worker
+    a scrape reaches can render the totals across all of them.
+    """
+    with _worker_lock:
+        _worker_snapshots[worker] = worker_snapshot
+        return [snapshot(), *_worker_snapshots.values()]
+
+
+def start_reporting(report, interval=REPORT_SECONDS):
+    """Call ``report(snapshot())`` every ``interval`` seconds on a daemon thread."""
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                report(snapshot())
+            except Exception as e:
+                print(f"--- Could not report metrics: {e!r} ---")
+
+    Thread(target=run, daemon=True).start()
+
+
+def _merge(snapshots):
+    merged = {}
+    for snap in snapshots:
+        for name, family in snap.items():
+            target = merged.setdefault(name, {**family, "values": {}})
+            for key, value in family["values"].items():
+                current = target["values"].get(key)
+                if current is None:
+                    target["values"][key] = value
+                elif family["kind"] == "histogram":
+                    target["values"][key] = [
+                        [a + b for a, b in zip(current[0], value[0])],
+                        current[1] + value[1],
+                        current[2] + value[2],
+                    ]
+                else:
+                    target["values"][key] = current + value
+    return merged
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def render(*snapshots):
+    """Prometheus text exposition of one or more snapshots, summed by label set."""
+    lines = []
+    for name, family in sorted(_merge(snapshots or [snapshot()]).items()):
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+        labelnames = family["labelnames"]
+        for key, value in sorted(family["values"].items()):
+            if family["kind"] != "histogram":
+                lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(family["buckets"], counts):
+                cumulative += bucket_count
+                le = (("le", _format_value(bound)),)
+                lines.append(f"{name}_bucket{_format_labels(labelnames, key, le)} {cumulative}")
+            inf = (("le", "+Inf"),)
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, inf)} {count}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labelnames, key)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def _start_profiler(kind):
+    if kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("--- pyinstrument is not installed, profiling with cProfile ---")
+            kind = "cprofile"
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return kind, profiler
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return kind, profiler
+
+
+def _save_profile(kind, profiler):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    endpoint = (request.endpoint or "unmatched").replace(".", "_")
+    stem = os.path.join(
+        PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{uuid.uuid4().hex[:8]}"
+    )
+    if kind == "pyinstrument":
+        profiler.stop()
+        path = stem + ".html"
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.disable()
+        # Open with `python -m pstats <file>` or snakeviz
+        path = stem + ".prof"
+        profiler.dump_stats(path)
+    return os.path.basename(path)
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    kind = request.headers.get(PROFILE_HEADER, "").lower()
+    if os.getenv("PROFILE_REQUESTS") and kind in PROFILERS:
+        g.profiler = _start_profiler(kind)
+
+
+def _after_request(response):
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            # The URL rule, not the path, so symbols and handles share a series
+            route=request.url_rule.rule if request.url_rule else "unmatched",
+            status=response.status_code,
+        )
+
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        # Saved under backend/profiles
+        response.headers["X-Profile-File"] = _save_profile(*profiler)
+    return response
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+
+def asgi_middleware(app):
+    """Wrap an ASGI app (asgi.py) to time its async routes like ``init_app`` does."""
+
+    async def middleware(scope, receive, send):
+        if scope["type"] != "http":
+            return await app(scope, receive, send)
+        started = time.perf_counter()
+
+        async def timed_send(message):
+            # The router has matched by now. Mounts are skipped: the Flask app
+            # mounted under one times its own routes
+            route = scope.get("route")
+            if message["type"] == "http.response.start" and getattr(route, "methods", None):
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started,
+                    method=scope["method"],
+                    route=route.path,
+                    status=message["status"],
+                )
+            await send(message)
+
+        await app(scope, receive, timed_send)
+
+    return middleware
@@ -1,70 +1,173 @@
 import numpy as np
-import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
-import torch
-import torch.nn as nn
-import joblib
+import json
 import os
+import queue
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from threading import Lock, Thread
+
+from services import metrics_service
+
+# Get the directory where this script is located (backend/services)
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(os.path.dirname(CURRENT_DIR), 'models')
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Number of trained models kept in memory
+MAX_LOADED_MODELS = 8
+# Concurrent predict() calls arriving within this window share a forward pass
+PREDICT_BATCH_WINDOW_SECONDS = 0.002
+PREDICT_MAX_BATCH = 64
+PREDICT_TIMEOUT = 10
+MAX_CACHED_WINDOWS = 256
+# Expected move (as a fraction of the last close) that maps to full confidence
+CONFIDENCE_SCALE = 0.02
+# Artifact the registry serves: the fp32 checkpoint, or an export written by
+# model_export_service ("torchscript" or dynamically quantized "int8")
+MODEL_VARIANTS = ('fp32', 'torchscript', 'int8')
+# The symbol the default trading_model.pth and its scaler were fit on. Scaled
+# against another symbol's prices its output means nothing, so only this
+# symbol falls back to it
+DEFAULT_MODEL_SYMBOL = os.getenv('DEFAULT_MODEL_SYMBOL', 'SPY').upper()
+
+
+# torch, sklearn, joblib and pandas (with the bar store) take seconds to import,
+# so they are imported by the functions that use them and the web app starts
+# without paying for them.
+# LSTMModel lives in lstm_model and is still reachable as ml_service.LSTMModel
+def __getattr__(name):
+    if name == 'LSTMModel':
+        from services.lstm_model import LSTMModel
+        return LSTMModel
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def load_history(symbol, start_date=None, end_date=None):
+    """Daily OHLCV bars for ``symbol`` from the bar store as a Date-indexed frame."""
+    from services import ohlcv_store
+
+    return ohlcv_store.get_bars(symbol, start_date, end_date)
+
+
+def model_paths(symbol=None):
+    """(model, scaler) paths for ``symbol``, or the shared default model."""
+    if symbol is None:
+        return os.path.join(MODEL_DIR, 'trading_model.pth'), os.path.join(MODEL_DIR, 'scaler.pkl')
+    symbol = symbol.upper()
+    return os.path.join(MODEL_DIR, f'{symbol}_model.pth'), os.path.join(MODEL_DIR, f'{symbol}_scaler.pkl')
+
+
+def variant_path(model_path, variant):
+    return f'{model_path[:-len(".pth")]}.{variant}.pt'
+
+
+def load_checkpoint(model_path, device='cpu'):
+    """Rebuild the fp32 LSTMModel (in eval mode) and its metadata from a saved checkpoint."""
+    import torch
+    from services.lstm_model import LSTMModel
+
+    checkpoint = torch.load(model_path, map_location=device)
+    if 'state_dict' not in checkpoint:
+        # Models saved before metadata was stored: Close-only, 60 bar lookback
+        checkpoint = {'state_dict': checkpoint, 'features': ['Close'], 'target': 'Close', 'lookback': 60}
+
+    model = LSTMModel(input_size=len(checkpoint['features']))
+    model.load_state_dict(checkpoint['state_dict'])
+    model.eval()
+    meta = {key: value for key, value in checkpoint.items() if key != 'state_dict'}
+    return model.to(device), meta
 
-class LSTMModel(nn.Module):
-    def __init__(self, input_size=1, hidden_size=50, num_layers=2, output_size=1):
-        super(LSTMModel, self).__init__()
-        self.hidden_size = hidden_size
-        self.num_layers = num_layers
-        
-        self.lstm = nn.LSTM(input_size, hidden_size, num_layers, batch_first=True)
-        self.dropout = nn.Dropout(0.2)
-        self.fc = nn.Linear(hidden_size, output_size)
-        
-    def forward(self, x):
-        # Initialize hidden state with zeros
-        h0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(x.device)
-        c0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(x.device)
-        
-        # Forward propagate LSTM
-        out, _ = self.lstm(x, (h0, c0))
-        out = self.dropout(out[:, -1, :])
-        out = self.fc(out)
-        return out
 
 class MLService:
-    def __init__(self):
+    def __init__(self, symbol=None):
+        import torch
+        from sklearn.preprocessing import MinMaxScaler
+
         self.model = None
         self.scaler = MinMaxScaler()
-        self.model_path = 'models/trading_model.pth'
-        self.scaler_path = 'models/scaler.pkl'
+        self.model_path, self.scaler_path = model_paths(symbol)
+        self.features = ['Close']
+        self.target = 'Close'
+        self.lookback = 60
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
-    def prepare_data(self, data, lookback=60):
-        # Convert data to numpy array
-        data = np.array(data)
-        
-        # Scale the data
-        scaled_data = self.scaler.fit_transform(data.reshape(-1, 1))
-        
-        X, y = [], []
-        for i in range(lookback, len(scaled_data)):
-            X.append(scaled_data[i-lookback:i, 0])
-            y.append(scaled_data[i, 0])
-            
-        return torch.FloatTensor(X), torch.FloatTensor(y)
-        
+    def prepare_data(self, data, lookback=60, features=None, target='Close', train_fraction=1.0, train_windows=None):
+        """Turn a price series into (N, lookback, n_features) windows and next-step targets.
+
+        ``data`` is either a 1-D series of closes or a frame/2-D array with one
+        column per feature. The scaler is fit only on the rows the first
+        ``train_fraction`` (or exactly ``train_windows``) of the windows can see,
+        so validation windows never leak into it. X is a strided view over a
+        single scaled buffer.
+        """
+        import pandas as pd
+        import torch
+
+        if isinstance(data, pd.DataFrame):
+            features = features or [c for c in OHLCV_COLUMNS if c in data.columns]
+            values = data[features].to_numpy(dtype=np.float64)
+            target_index = features.index(target)
+        else:
+            values = np.asarray(data, dtype=np.float64)
+            if values.ndim == 1:
+                values = values.reshape(-1, 1)
+            features = features or [target]
+            target_index = features.index(target) if target in features else 0
+        self.features, self.target, self.lookback = list(features), features[target_index], lookback
+
+        n_windows = len(values) - lookback
+        if n_windows < 1:
+            raise ValueError(f'Need more than {lookback} rows, got {len(values)}')
+        n_train = train_windows or max(1, int(n_windows * train_fraction))
+
+        # Window i reads rows [i, i + lookback) and predicts row i + lookback
+        self.scaler.fit(values[:n_train + lookback])
+        scaled = torch.from_numpy(self.scaler.transform(values).astype(np.float32))
+
+        # unfold gives (N, n_features, lookback); both it and the transpose are views
+        X = scaled[:-1].unfold(0, lookback, 1).transpose(1, 2)
+        y = scaled[lookback:, target_index]
+        return X, y
+
     def build_model(self, input_size=1):
+        from services.lstm_model import LSTMModel
+
         model = LSTMModel(input_size=input_size)
         return model.to(self.device)
         
-    def train(self, data, epochs=50, batch_size=32, learning_rate=0.01):
-        X, y = self.prepare_data(data)
-        X = X.reshape((X.shape[0], X.shape[1], 1))
+    def train(self, data, epochs=50, batch_size=32, learning_rate=0.01, lookback=60, features=None, validation_split=0.1):
+        X, y = self.prepare_data(data, lookback=lookback, features=features, train_fraction=1 - validation_split)
+        n_train = max(1, int(len(X) * (1 - validation_split)))
+        
+        self.model = None
+        self.fit(X[:n_train], y[:n_train], X[n_train:], y[n_train:], epochs=epochs, batch_size=batch_size, learning_rate=learning_rate)
+        self.save()
         
+    def fit(self, X, y, X_val=None, y_val=None, epochs=50, batch_size=32, learning_rate=0.01, patience=None, verbose=True):
+        """Train on (X, y), continuing from the current weights if a model is loaded.
+
+        With ``patience`` set, stops once validation loss has not improved for
+        that many epochs and restores the best weights.
+        """
+        if epochs < 1:
+            raise ValueError(f'epochs must be at least 1, got {epochs}')
+        import torch
+        import torch.nn as nn
+
         # Create data loader
         dataset = torch.utils.data.TensorDataset(X, y)
         dataloader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=True)
         
-        # Initialize model
-        self.model = self.build_model()
+        # Initialize model, unless warm-starting from the one already loaded
+        if self.model is None:
+            self.model = self.build_model(input_size=X.shape[2])
         criterion = nn.MSELoss()
         optimizer = torch.optim.Adam(self.model.parameters(), lr=learning_rate)
+        has_val = X_val is not None and len(X_val) > 0
+        best_loss, best_state, stale = float('inf'), None, 0
         
         # Training loop
         self.model.train()
@@ -74,31 +177,256 @@ class MLService:
                 
                 # Forward pass
                 outputs = self.model(batch_X)
-                loss = criterion(outputs.squeeze(), batch_y)
+                loss = criterion(outputs.squeeze(1), batch_y)
                 
                 # Backward and optimize
                 optimizer.zero_grad()
                 loss.backward()
                 optimizer.step()
                 
-            if (epoch + 1) % 10 == 0:
-                print(f'Epoch [{epoch+1}/{epochs}], Loss: {loss.item():.4f}')
+            if patience and has_val:
+                val_loss = self.evaluate(X_val, y_val)
+                if val_loss < best_loss:
+                    best_loss, stale = val_loss, 0
+                    best_state = {k: v.detach().clone() for k, v in self.model.state_dict().items()}
+                else:
+                    stale += 1
+                    if stale >= patience:
+                        break
+                
+            if verbose and (epoch + 1) % 10 == 0:
+                print(f'Epoch [{epoch+1}/{epochs}], Loss: {loss.item():.4f}, Val Loss: {self.evaluate(X_val, y_val) if has_val else float("nan"):.4f}')
+        
+        if best_state is not None:
+            self.model.load_state_dict(best_state)
+        return {
+            'epochs': epoch + 1,
+            'val_loss': self.evaluate(X_val, y_val) if has_val else float('nan'),
+        }
         
-        # Save model and scaler
-        os.makedirs('models', exist_ok=True)
-        torch.save(self.model.state_dict(), self.model_path)
+    def save(self, **metadata):
+        import joblib
+        import torch
+
+        # Save model and scaler, with what the registry needs to rebuild inputs
+        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
+        torch.save(
+            {
+                'state_dict': self.model.state_dict(),
+                'features': self.features,
+                'target': self.target,
+                'lookback': self.lookback,
+                **metadata,
+            },
+            self.model_path,
+        )
         joblib.dump(self.scaler, self.scaler_path)
+        registry.invalidate(self.model_path)
         
-    def predict(self, symbol):
-        # This is a placeholder - in a real implementation, you would:
-        # 1. Get historical data for the symbol
-        # 2. Load the trained model
-        # 3. Make predictions
+    def evaluate(self, X, y, batch_size=1024):
+        if len(X) == 0:
+            return float('nan')
+        import torch
+        import torch.nn as nn
+
+        criterion = nn.MSELoss(reduction='sum')
+        self.model.eval()
+        total = 0.0
+        with torch.no_grad():
+            for start in range(0, len(X), batch_size):
+                batch_X = X[start:start + batch_size].to(self.device)
+                batch_y = y[start:start + batch_size].to(self.device)
+                total += criterion(self.model(batch_X).squeeze(1), batch_y).item()
+        self.model.train()
+        return total / len(X)
         
-        # For now, return a dummy prediction
+    def predict(self, symbol):
+        return registry.predict(symbol)
+
+
+class ModelRegistry:
+    """Keeps trained models and scalers warm and batches predictions.
+
+    Models are loaded once per artifact mtime and evicted least recently used.
+    A symbol without its own model has none, except DEFAULT_MODEL_SYMBOL,
+    which is served by the default trading_model.pth.
+    """
+
+    def __init__(self, max_models=MAX_LOADED_MODELS, variant=None):
+        self.max_models = max_models
+        self.variant = variant or os.getenv('MODEL_VARIANT', 'fp32')
+        if self.variant not in MODEL_VARIANTS:
+            raise ValueError(f'Unknown model variant {self.variant}, expected one of {MODEL_VARIANTS}')
+        self.device = 'cpu'
+        self._models = OrderedDict()
+        self._windows = {}
+        self._lock = Lock()
+        self._requests = queue.Queue()
+        self._worker = None
+
+    def resolve(self, symbol):
+        candidates = [model_paths(symbol)]
+        if symbol.upper() == DEFAULT_MODEL_SYMBOL:
+            candidates.append(model_paths())
+        for paths in candidates:
+            if os.path.exists(paths[0]) and os.path.exists(paths[1]):
+                return paths
+        raise FileNotFoundError(f'No trained model for {symbol}')
+
+    def _load(self, model_path, scaler_path):
+        import joblib
+        import torch
+
+        variant = self.variant
+        export_path = variant_path(model_path, variant)
+        if variant != 'fp32' and os.path.exists(export_path) and os.path.getmtime(export_path) >= os.path.getmtime(model_path):
+            extra_files = {'meta.json': ''}
+            model = torch.jit.load(export_path, map_location=self.device, _extra_files=extra_files)
+            meta = json.loads(extra_files['meta.json'])
+        else:
+            if variant != 'fp32':
+                print(f"--- No up-to-date {variant} export of {model_path}, serving fp32 ---")
+                variant = 'fp32'
+            model, meta = load_checkpoint(model_path, self.device)
+
+        scaler = joblib.load(scaler_path)
+        target_index = meta['features'].index(meta['target'])
         return {
-            'symbol': symbol,
-            'prediction': 'BUY',
-            'confidence': 0.85,
-            'timestamp': pd.Timestamp.now().isoformat()
-        } 
\ No newline at end of file
+            'path': model_path,
+            'mtime': os.path.getmtime(model_path),
+            'variant': variant,
+            'model': model,
+            'scaler': scaler,
+            'features': meta['features'],
+            'lookback': meta['lookback'],
+            'target_min': scaler.data_min_[target_index],
+            'target_range': scaler.data_range_[target_index],
+        }
+
+    def get(self, symbol):
+        model_path, scaler_path = self.resolve(symbol)
+        mtime = os.path.getmtime(model_path)
+        with self._lock:
+            entry = self._models.get(model_path)
+            if entry is not None and entry['mtime'] == mtime:
+                self._models.move_to_end(model_path)
+                metrics_service.CACHE_REQUESTS.inc(cache='model', result='hit')
+                return entry
+
+        metrics_service.CACHE_REQUESTS.inc(cache='model', result='miss')
+        entry = self._load(model_path, scaler_path)
+        with self._lock:
+            self._models[model_path] = entry
+            self._models.move_to_end(model_path)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        return entry
+
+    def invalidate(self, model_path=None):
+        with self._lock:
+            if model_path is None:
+                self._models.clear()
+                self._windows.clear()
+            else:
+                self._models.pop(model_path, None)
+
+    def _window(self, symbol, entry):
+        from services import ohlcv_store
+
+        # The scaled input only changes when the model or the stored bars do
+        key = (symbol, entry['path'], entry['mtime'], ohlcv_store.get_version(symbol))
+        window = self._windows.get(key)
+        metrics_service.CACHE_REQUESTS.inc(cache='prediction_window', result='miss' if window is None else 'hit')
+        if window is None:
+            history = load_history(symbol).tail(entry['lookback'])
+            if len(history) < entry['lookback']:
+                raise ValueError(f'Need {entry["lookback"]} rows of history for {symbol}, got {len(history)}')
+            values = history[entry['features']].to_numpy(dtype=np.float64)
+            window = {
+                'input': entry['scaler'].transform(values).astype(np.float32),
+                'last_close': float(history['Close'].iloc[-1]),
+                'as_of': history.index[-1].strftime('%Y-%m-%d'),
+            }
+            if len(self._windows) >= MAX_CACHED_WINDOWS:
+                self._windows.clear()
+            self._windows[key] = window
+        return window
+
+    def _predict_batch(self, symbols):
+        """Results (or the exception raised) for each symbol, one forward pass per model."""
+        results = [None] * len(symbols)
+        groups = {}
+        for i, symbol in enumerate(symbols):
+            try:
+                entry = self.get(symbol)
+                window = self._window(symbol, entry)
+                groups.setdefault(entry['path'], (entry, []))[1].append((i, window))
+            except Exception as e:
+                results[i] = e
+
+        import torch
+
+        for entry, items in groups.values():
+            batch = torch.from_numpy(np.stack([window['input'] for _, window in items]))
+            with torch.inference_mode():
+                scaled = entry['model'](batch).squeeze(1).numpy()
+            closes = scaled * entry['target_range'] + entry['target_min']
+
+            for (i, window), predicted in zip(items, closes):
+                expected_return = (float(predicted) - window['last_close']) / window['last_close']
+                results[i] = {
+                    'symbol': symbols[i],
+                    'prediction': 'BUY' if expected_return > 0 else 'SELL',
+                    'confidence': round(min(1.0, abs(expected_return) / CONFIDENCE_SCALE), 4),
+                    'predicted_close': float(predicted),
+                    'last_close': window['last_close'],
+                    'expected_return': expected_return,
+                    'as_of': window['as_of'],
+                    'model_variant': entry['variant'],
+                    'timestamp': datetime.now().isoformat(),
+                }
+        return results
+
+    def predict_many(self, symbols):
+        symbols = [symbol.upper() for symbol in symbols]
+        return [
+            {'symbol': symbol, 'error': str(result)} if isinstance(result, Exception) else result
+            for symbol, result in zip(symbols, self._predict_batch(symbols))
+        ]
+
+    def predict(self, symbol, timeout=PREDICT_TIMEOUT):
+        future = Future()
+        self._requests.put((symbol.upper(), future))
+        with self._lock:
+            if self._worker is None:
+                self._worker = Thread(target=self._run_batcher, daemon=True)
+                self._worker.start()
+        return future.result(timeout=timeout)
+
+    # Drains whatever predict() calls arrive within the batch window and runs
+    # them together, so concurrent requests for a watchlist cost one forward
+    def _run_batcher(self):
+        while True:
+            pending = [self._requests.get()]
+            deadline = time.monotonic() + PREDICT_BATCH_WINDOW_SECONDS
+            while len(pending) < PREDICT_MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self._predict_batch([symbol for symbol, _ in pending])
+            except Exception as e:
+                results = [e] * len(pending)
+            for (_, future), result in zip(pending, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+registry = ModelRegistry()
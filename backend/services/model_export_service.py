@@ -0,0 +1,119 @@
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+
+from services import ml_service
+
+
+def _script(model, meta, path):
+    scripted = torch.jit.script(model)
+    # Metadata travels inside the artifact so serving never touches the .pth
+    torch.jit.save(scripted, path, _extra_files={'meta.json': json.dumps(meta)})
+
+
+def export_model(symbol=None, variants=('torchscript', 'int8')):
+    """Write TorchScript exports of a trained model next to its checkpoint.
+
+    ``int8`` is the same model with its LSTM and Linear weights dynamically
+    quantized; activations stay fp32, so no calibration data is needed.
+    Returns {variant: path}.
+    """
+    model_path, _ = ml_service.model_paths(symbol)
+    model, meta = ml_service.load_checkpoint(model_path)
+
+    paths = {}
+    for variant in variants:
+        path = ml_service.variant_path(model_path, variant)
+        if variant == 'torchscript':
+            _script(model, meta, path)
+        elif variant == 'int8':
+            quantized = torch.ao.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+            _script(quantized, meta, path)
+        else:
+            raise ValueError(f'Unknown export variant {variant}')
+        paths[variant] = path
+        print(f"--- Exported {variant} model to {path} ({os.path.getsize(path) / 1024:.0f} KB) ---")
+
+    ml_service.registry.invalidate(model_path)
+    return paths
+
+
+def _eval_windows(symbol, meta, scaler, limit):
+    history = ml_service.load_history(symbol)
+    values = history[meta['features']].to_numpy(dtype=np.float64)
+    scaled = torch.from_numpy(scaler.transform(values).astype(np.float32))
+    windows = scaled.unfold(0, meta['lookback'], 1).transpose(1, 2)
+    return windows[-limit:].contiguous()
+
+
+def _time(model, batch, iterations):
+    with torch.inference_mode():
+        for _ in range(10):
+            model(batch)
+        timings = np.empty(iterations)
+        for i in range(iterations):
+            start = time.perf_counter()
+            model(batch)
+            timings[i] = time.perf_counter() - start
+    return timings
+
+
+def benchmark(symbol='SPY', batch_sizes=(1, 16, 64), iterations=200, threads=None, eval_windows=512):
+    """Latency, throughput and drift of every available export against fp32.
+
+    Drift is measured in price units on the last ``eval_windows`` windows of
+    the symbol's cached history. Pass ``threads`` to pin torch's intra-op
+    thread count the way a gunicorn worker would.
+    """
+    if threads:
+        torch.set_num_threads(threads)
+
+    model_path, scaler_path = ml_service.registry.resolve(symbol)
+    fp32, meta = ml_service.load_checkpoint(model_path)
+    scaler = joblib.load(scaler_path)
+    target_index = meta['features'].index(meta['target'])
+    target_range = scaler.data_range_[target_index]
+
+    windows = _eval_windows(symbol, meta, scaler, eval_windows)
+    with torch.inference_mode():
+        reference = fp32(windows).squeeze(1).numpy()
+
+    models = {'fp32': (fp32, os.path.getsize(model_path))}
+    for variant in ml_service.MODEL_VARIANTS[1:]:
+        path = ml_service.variant_path(model_path, variant)
+        if os.path.exists(path):
+            models[variant] = (torch.jit.load(path), os.path.getsize(path))
+
+    rows = []
+    for variant, (model, size) in models.items():
+        with torch.inference_mode():
+            output = model(windows).squeeze(1).numpy()
+        drift = np.abs(output - reference) * target_range
+
+        for batch_size in batch_sizes:
+            timings = _time(model, windows[:batch_size], iterations)
+            rows.append({
+                'variant': variant,
+                'batch_size': batch_size,
+                'p50_ms': float(np.percentile(timings, 50) * 1000),
+                'p95_ms': float(np.percentile(timings, 95) * 1000),
+                'throughput_per_s': float(batch_size * iterations / timings.sum()),
+                'max_drift': float(drift.max()),
+                'mean_drift': float(drift.mean()),
+                'size_kb': size / 1024,
+            })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    import sys
+
+    symbol = sys.argv[1] if len(sys.argv) > 1 else None
+    export_model(symbol)
+    print(benchmark(symbol or 'SPY', threads=1).to_string(index=False))
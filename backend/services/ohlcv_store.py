@@ -0,0 +1,330 @@
+import glob
+import json
+import os
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Get the directory where this script is located (backend/services)
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Navigate up to the project root (backend/services -> backend -> root)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, "..", ".."))
+DATA_CACHE_DIR = os.path.join(
+    PROJECT_ROOT, "TradingAgents", "tradingagents", "dataflows", "data_cache"
+)
+STORE_DIR = os.path.join(DATA_CACHE_DIR, "bar_store")
+# Bars fetched from IB, one file per symbol and bar size
+IB_STORE_DIR = os.path.join(STORE_DIR, "ib")
+MANIFEST_FILE = os.path.join(STORE_DIR, "manifest.json")
+LOCK_FILE = os.path.join(STORE_DIR, ".lock")
+
+CSV_SUFFIX = "-YFin-data-"
+# How often the data_cache directory is rescanned for new downloads
+REFRESH_SECONDS = 2.0
+# Yahoo keeps revising the volume of the last few sessions, so the newest
+# stored bars may still be overwritten by a later download
+REVISABLE_BARS = 5
+
+# One fixed-size record per bar, appended in date order, so a symbol's file is
+# its own index: date ranges are a searchsorted over the memory-mapped dates.
+BAR_DTYPE = np.dtype(
+    [
+        ("date", "<M8[D]"),
+        ("open", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("close", "<f8"),
+        ("volume", "<i8"),
+    ]
+)
+# IB bars can be intraday, so their dates keep the time (UTC, to the second)
+IB_BAR_DTYPE = np.dtype([(name, "<M8[s]" if name == "date" else dtype) for name, dtype in BAR_DTYPE.descr])
+# Same column order as the yfinance CSV downloads
+FRAME_COLUMNS = {
+    "Close": "close",
+    "High": "high",
+    "Low": "low",
+    "Open": "open",
+    "Volume": "volume",
+}
+
+_maps = {}
+_checked_at = None
+_lock = Lock()
+
+
+def _bar_file(symbol):
+    return os.path.join(STORE_DIR, f"{symbol.upper()}.bars")
+
+
+def _lock_file(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return
+    lock_file.seek(0)
+    while True:
+        try:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK gives up after ten one-second retries; keep waiting
+            continue
+
+
+def _unlock_file(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def _write_lock():
+    # Workers in other processes (gunicorn, walk-forward pools) share the store
+    os.makedirs(STORE_DIR, exist_ok=True)
+    with _lock, open(LOCK_FILE, "w") as lock_file:
+        _lock_file(lock_file)
+        try:
+            yield
+        finally:
+            _unlock_file(lock_file)
+
+
+def _read_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return {"files": {}}
+    with open(MANIFEST_FILE, "r") as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest):
+    tmp_file = MANIFEST_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, MANIFEST_FILE)
+
+
+def _ib_bar_file(symbol, bar_size):
+    return os.path.join(IB_STORE_DIR, f"{symbol.upper()}_{bar_size.replace(' ', '')}.bars")
+
+
+def _open_file(path, dtype):
+    if not os.path.exists(path):
+        return np.empty(0, dtype=dtype)
+    # Ignore a trailing partial record from an append still in progress
+    rows = os.path.getsize(path) // dtype.itemsize
+    # A rewrite (IB backfill) replaces the file, so the inode is part of the key
+    key = (os.stat(path).st_ino, rows)
+    bars = _maps.get(path)
+    if bars is None or bars[0] != key:
+        data = (
+            np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+            if rows
+            else np.empty(0, dtype=dtype)
+        )
+        bars = (key, data)
+        _maps[path] = bars
+    return bars[1]
+
+
+def _open_bars(symbol):
+    return _open_file(_bar_file(symbol), BAR_DTYPE)
+
+
+def _frame_to_bars(df):
+    dates = pd.to_datetime(df["Date"], errors="coerce", format="%Y-%m-%d")
+    df = df.assign(Date=dates).dropna(subset=["Date", *FRAME_COLUMNS])
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    bars["date"] = df["Date"].to_numpy().astype("datetime64[D]")
+    for column, field in FRAME_COLUMNS.items():
+        bars[field] = df[column].to_numpy()
+    bars = bars[np.argsort(bars["date"], kind="stable")]
+    # Keep the last bar reported for a date
+    keep = np.append(bars["date"][1:] != bars["date"][:-1], True)
+    return bars[keep]
+
+
+def _append(symbol, bars):
+    return _append_file(_bar_file(symbol), _open_bars(symbol), bars)
+
+
+def _append_file(path, existing, bars):
+    start = max(0, len(existing) - REVISABLE_BARS)
+    if len(existing):
+        bars = bars[bars["date"] >= existing["date"][start]]
+    if not len(bars):
+        return 0
+
+    # Merge into the revisable tail (incoming bars win) and rewrite only that
+    tail = np.array(existing[start:])
+    merged = np.concatenate([bars, tail[~np.isin(tail["date"], bars["date"])]])
+    merged = merged[np.argsort(merged["date"], kind="stable")]
+    if np.array_equal(merged, tail):
+        return 0
+
+    with open(path, "r+b" if len(existing) else "wb") as f:
+        f.seek(start * existing.dtype.itemsize)
+        f.write(merged.tobytes())
+    return len(merged) - len(tail)
+
+
+def append_bars(symbol, df):
+    """Append bars newer than the last stored one.
+
+    ``df`` has the yfinance download layout (Date, Close, High, Low, Open,
+    Volume), with Date as a column or the index. Only the last REVISABLE_BARS
+    stored bars can be revised; older ones are never rewritten. Returns the
+    number of bars appended.
+    """
+    if df.index.name == "Date":
+        df = df.reset_index()
+    with _write_lock():
+        return _append(symbol, _frame_to_bars(df))
+
+
+def _symbol_from_filename(name):
+    return name.split(CSV_SUFFIX, 1)[0]
+
+
+def ingest_data_cache(force=False):
+    """Append new bars from ``<SYMBOL>-YFin-data-*.csv`` downloads in data_cache.
+
+    Only files whose mtime changed since the last run are read, oldest
+    download first. Returns {symbol: bars appended}.
+    """
+    files = glob.glob(os.path.join(glob.escape(DATA_CACHE_DIR), f"*{CSV_SUFFIX}*.csv"))
+    # File names end with the download date
+    files.sort(key=lambda f: f[-len("YYYY-MM-DD.csv"):])
+
+    appended = {}
+    with _write_lock():
+        manifest = _read_manifest()
+        for path in files:
+            name = os.path.basename(path)
+            mtime = os.path.getmtime(path)
+            if not force and manifest["files"].get(name) == mtime:
+                continue
+            symbol = _symbol_from_filename(name)
+            try:
+                count = _append(symbol, _frame_to_bars(pd.read_csv(path)))
+            except Exception as e:
+                print(f"--- Failed to ingest {name}: {e} ---")
+                continue
+            appended[symbol] = appended.get(symbol, 0) + count
+            manifest["files"][name] = mtime
+        if appended:
+            _write_manifest(manifest)
+
+    for symbol, count in appended.items():
+        if count:
+            print(f"--- Appended {count} {symbol} bars from data_cache ---")
+    return appended
+
+
+def refresh(force=False):
+    global _checked_at
+    now = time.monotonic()
+    if not force and _checked_at is not None and now - _checked_at < REFRESH_SECONDS:
+        return
+    _checked_at = now
+    ingest_data_cache()
+
+
+def symbols():
+    refresh()
+    if not os.path.isdir(STORE_DIR):
+        return []
+    return sorted(name[: -len(".bars")] for name in os.listdir(STORE_DIR) if name.endswith(".bars"))
+
+
+def get_version(symbol):
+    """Changes whenever bars are appended or revised for ``symbol``; useful as a cache key."""
+    refresh()
+    path = _bar_file(symbol)
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+
+def get_bars(symbol, start_date=None, end_date=None):
+    """Bars for ``symbol`` between two inclusive YYYY-MM-DD dates as a Date-indexed frame."""
+    refresh()
+    bars = _open_bars(symbol)
+    if not len(bars):
+        raise FileNotFoundError(f"No stored bars for {symbol}")
+
+    dates = bars["date"]
+    start = np.searchsorted(dates, np.datetime64(start_date, "D")) if start_date else 0
+    stop = (
+        np.searchsorted(dates, np.datetime64(end_date, "D"), side="right")
+        if end_date
+        else len(bars)
+    )
+    window = bars[start:stop]
+    return pd.DataFrame(
+        {column: np.asarray(window[field]) for column, field in FRAME_COLUMNS.items()},
+        index=pd.DatetimeIndex(np.asarray(window["date"]).astype("datetime64[ns]"), name="Date"),
+    )
+
+
+def append_ib_bars(symbol, bar_size, bars):
+    """Store bars fetched from IB; ``bars`` is an IB_BAR_DTYPE array in date order.
+
+    Bars newer than the stored ones are appended and overlapping ones in the
+    revisable tail are replaced, as for daily bars. Bars older than the first
+    stored one (a backfill for a longer duration) rewrite the file once.
+    Returns the number of new bars.
+    """
+    path = _ib_bar_file(symbol, bar_size)
+    with _write_lock():
+        os.makedirs(IB_STORE_DIR, exist_ok=True)
+        existing = _open_file(path, IB_BAR_DTYPE)
+        if not len(existing) or not len(bars) or bars["date"][0] >= existing["date"][0]:
+            return _append_file(path, existing, bars)
+
+        older = bars[bars["date"] < existing["date"][0]]
+        merged = np.concatenate([older, existing])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(merged.tobytes())
+        os.replace(tmp_path, path)
+        # The newer part of the fetch may still revise the tail
+        return len(older) + _append_file(path, _open_file(path, IB_BAR_DTYPE), bars)
+
+
+def get_ib_bars(symbol, bar_size, start=None):
+    """Stored IB bars for ``symbol`` from ``start`` (a datetime64) on, as an IB_BAR_DTYPE array."""
+    bars = _open_file(_ib_bar_file(symbol, bar_size), IB_BAR_DTYPE)
+    if start is not None:
+        bars = bars[np.searchsorted(bars["date"], start):]
+    return np.array(bars)
+
+
+def prune_data_cache():
+    """Delete the CSV downloads already ingested into the store."""
+    with _write_lock():
+        manifest = _read_manifest()
+        for name, mtime in manifest["files"].items():
+            path = os.path.join(DATA_CACHE_DIR, name)
+            if os.path.exists(path) and os.path.getmtime(path) == mtime:
+                os.remove(path)
+                print(f"--- Removed {name} ---")
+
+
+if __name__ == "__main__":
+    import sys
+
+    ingest_data_cache(force="--force" in sys.argv)
+    if "--prune" in sys.argv:
+        prune_data_cache()
+    for symbol in symbols():
+        bars = _open_bars(symbol)
+        print(f"{symbol}: {len(bars)} bars, {bars['date'][0]} to {bars['date'][-1]}")
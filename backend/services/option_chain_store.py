@@ -0,0 +1,282 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Get the directory where this script is located (backend/services)
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Navigate up to the project root (backend/services -> backend -> root)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, "..", ".."))
+HISTORICAL_DATA_DIR = os.path.join(PROJECT_ROOT, "TradingAgents", "Historical-Data")
+STORE_DIR = os.path.join(HISTORICAL_DATA_DIR, "chain_store")
+MANIFEST_FILE = os.path.join(STORE_DIR, "manifest.json")
+
+CSV_PATTERN = "UnderlyingOptionsEODQuotes_*.csv"
+
+# Column name -> on-disk dtype. Rows are sorted by (expiration, option_type, strike)
+# so every (expiration, option_type) pair is one contiguous, strike-sorted run.
+COLUMNS = {
+    "expiration": "datetime64[D]",
+    "option_type": "S1",
+    "strike": "float64",
+    "open": "float64",
+    "high": "float64",
+    "low": "float64",
+    "close": "float64",
+    "trade_volume": "int64",
+    "bid_size_1545": "int64",
+    "bid_1545": "float64",
+    "ask_size_1545": "int64",
+    "ask_1545": "float64",
+    "underlying_bid_1545": "float64",
+    "underlying_ask_1545": "float64",
+    "bid_size_eod": "int64",
+    "bid_eod": "float64",
+    "ask_size_eod": "int64",
+    "ask_eod": "float64",
+    "underlying_bid_eod": "float64",
+    "underlying_ask_eod": "float64",
+    "vwap": "float64",
+    "open_interest": "int64",
+}
+
+_manifest = None
+_partitions = {}
+_underlying_closes = None
+
+
+def _partition_dir(quote_date):
+    return os.path.join(STORE_DIR, f"quote_date={quote_date}")
+
+
+def _quote_date_from_path(csv_path):
+    name = os.path.basename(csv_path)
+    return name[len("UnderlyingOptionsEODQuotes_") : -len(".csv")]
+
+
+def _read_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return {"columns": list(COLUMNS), "dates": {}}
+    with open(MANIFEST_FILE, "r") as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest):
+    tmp_file = MANIFEST_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, MANIFEST_FILE)
+
+
+def _ingest_file(csv_path, quote_date):
+    df = pd.read_csv(csv_path, usecols=["underlying_symbol", *COLUMNS])
+    df["expiration"] = pd.to_datetime(df["expiration"]).values.astype("datetime64[D]")
+    df = df.sort_values(["expiration", "option_type", "strike"], kind="mergesort")
+
+    out_dir = _partition_dir(quote_date)
+    os.makedirs(out_dir, exist_ok=True)
+    for column, dtype in COLUMNS.items():
+        values = np.ascontiguousarray(df[column].to_numpy().astype(dtype))
+        np.save(os.path.join(out_dir, f"{column}.npy"), values)
+
+    # Offsets of each (expiration, option_type) run, used to slice without scanning
+    expirations = df["expiration"].to_numpy().astype("datetime64[D]")
+    option_types = df["option_type"].to_numpy().astype("U1")
+    changed = (expirations[1:] != expirations[:-1]) | (option_types[1:] != option_types[:-1])
+    starts = np.concatenate([[0], np.flatnonzero(changed) + 1]) if len(df) else []
+    stops = np.append(starts[1:], len(df)) if len(df) else []
+    index = [
+        {
+            "expiration": str(expirations[start]),
+            "option_type": str(option_types[start]),
+            "start": int(start),
+            "stop": int(stop),
+        }
+        for start, stop in zip(starts, stops)
+    ]
+
+    return {
+        "underlying_symbol": str(df["underlying_symbol"].iloc[0]) if len(df) else "",
+        "rows": int(len(df)),
+        "source_mtime": os.path.getmtime(csv_path),
+        "index": index,
+    }
+
+
+def ingest_historical_data(force=False):
+    """Convert the EOD option chain CSVs into the columnar store.
+
+    Only files that are new or changed since the last ingest are converted.
+    Returns the list of quote dates that were (re)written.
+    """
+    global _manifest, _underlying_closes
+
+    os.makedirs(STORE_DIR, exist_ok=True)
+    manifest = _read_manifest()
+    written = []
+
+    for csv_path in sorted(glob.glob(os.path.join(HISTORICAL_DATA_DIR, CSV_PATTERN))):
+        quote_date = _quote_date_from_path(csv_path)
+        entry = manifest["dates"].get(quote_date)
+        if (
+            not force
+            and entry
+            and entry["source_mtime"] == os.path.getmtime(csv_path)
+        ):
+            continue
+
+        manifest["dates"][quote_date] = _ingest_file(csv_path, quote_date)
+        _partitions.pop(quote_date, None)
+        written.append(quote_date)
+        print(f"--- Ingested option chain for {quote_date} ---")
+
+    manifest["columns"] = list(COLUMNS)
+    _write_manifest(manifest)
+    _manifest = manifest
+    if written:
+        _underlying_closes = None
+    return written
+
+
+def _get_manifest():
+    global _manifest
+    if _manifest is None:
+        _manifest = _read_manifest()
+    return _manifest
+
+
+def available_dates():
+    return sorted(_get_manifest()["dates"])
+
+
+def has_date(quote_date):
+    return str(quote_date) in _get_manifest()["dates"]
+
+
+def _open_partition(quote_date):
+    partition = _partitions.get(quote_date)
+    if partition is None:
+        entry = _get_manifest()["dates"].get(quote_date)
+        if entry is None:
+            raise KeyError(f"No option chain stored for {quote_date}")
+
+        out_dir = _partition_dir(quote_date)
+        partition = {
+            "columns": {
+                column: np.load(os.path.join(out_dir, f"{column}.npy"), mmap_mode="r")
+                for column in COLUMNS
+            },
+            "index": {
+                (item["expiration"], item["option_type"]): (item["start"], item["stop"])
+                for item in entry["index"]
+            },
+        }
+        _partitions[quote_date] = partition
+    return partition
+
+
+def get_expirations(quote_date, option_type=None):
+    partition = _open_partition(str(quote_date))
+    return sorted(
+        {
+            expiration
+            for expiration, right in partition["index"]
+            if option_type is None or right == option_type
+        }
+    )
+
+
+def get_runs(quote_date):
+    """{(expiration, option_type): (start, stop)} row ranges of one stored day.
+
+    Rows are strike-sorted within a run, and arrays derived from a full
+    ``get_chain_slice`` share the same row order.
+    """
+    return dict(_open_partition(str(quote_date))["index"])
+
+
+def partition_path(quote_date, name):
+    """Path of ``name`` inside a stored day's directory, for derived per-day files."""
+    return os.path.join(_partition_dir(str(quote_date)), name)
+
+
+def get_underlying_closes():
+    """Return (quote_dates, underlying EOD mid) across every stored day."""
+    global _underlying_closes
+    if _underlying_closes is None:
+        dates = available_dates()
+        closes = np.full(len(dates), np.nan)
+        for i, quote_date in enumerate(dates):
+            columns = _open_partition(quote_date)["columns"]
+            if len(columns["underlying_bid_eod"]):
+                closes[i] = (
+                    columns["underlying_bid_eod"][0] + columns["underlying_ask_eod"][0]
+                ) / 2
+        _underlying_closes = (np.array(dates, dtype="datetime64[D]"), closes)
+    return _underlying_closes
+
+
+def get_chain_slice(
+    quote_date,
+    expiration=None,
+    option_type=None,
+    min_strike=None,
+    max_strike=None,
+    columns=None,
+):
+    """Return a dict of read-only, memory-mapped column views for one chain slice.
+
+    The slice is located through the (expiration, option_type) index and a
+    searchsorted over strike, so only the pages that back the requested rows
+    are touched.  Passing only ``expiration`` and ``option_type`` yields a
+    zero-copy view; leaving either out concatenates the matching runs.
+    """
+    partition = _open_partition(str(quote_date))
+    columns = columns or list(COLUMNS)
+
+    runs = [
+        (start, stop)
+        for (run_expiration, run_type), (start, stop) in sorted(
+            partition["index"].items(), key=lambda item: item[1]
+        )
+        if (expiration is None or run_expiration == str(expiration))
+        and (option_type is None or run_type == option_type)
+    ]
+
+    strikes = partition["columns"]["strike"]
+    bounds = []
+    for start, stop in runs:
+        lo, hi = start, stop
+        if min_strike is not None:
+            lo = start + int(np.searchsorted(strikes[start:stop], min_strike, "left"))
+        if max_strike is not None:
+            hi = start + int(np.searchsorted(strikes[start:stop], max_strike, "right"))
+        if lo < hi:
+            bounds.append((lo, hi))
+
+    result = {}
+    for column in columns:
+        values = partition["columns"][column]
+        if len(bounds) == 1:
+            lo, hi = bounds[0]
+            result[column] = values[lo:hi]
+        elif bounds:
+            result[column] = np.concatenate([values[lo:hi] for lo, hi in bounds])
+        else:
+            result[column] = values[0:0]
+    return result
+
+
+def get_chain_frame(quote_date, **filters):
+    """Same as ``get_chain_slice`` but returned as a pandas DataFrame."""
+    chain = get_chain_slice(quote_date, **filters)
+    df = pd.DataFrame(chain, copy=False)
+    if "option_type" in df:
+        df["option_type"] = df["option_type"].str.decode("ascii")
+    return df
+
+
+if __name__ == "__main__":
+    ingest_historical_data()
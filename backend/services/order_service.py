@@ -0,0 +1,306 @@
+import asyncio
+import json
+import queue
+import uuid
+from datetime import datetime, timezone
+from threading import Lock, Thread
+
+from app import db
+from models.order import FillRecord, OrderRecord
+
+FILL_QUEUE_SIZE = 100
+
+# In-memory order book keyed by our own order handle. IB order ids are only
+# known once the background loop has placed the order.
+_orders = {}
+_handles_by_ib_id = {}
+_fill_listeners = set()
+_lock = Lock()
+
+_app = None
+_persist_queue = queue.Queue()
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _legs_to_dicts(order, legs):
+    if "short_strike" in order:
+        strikes = [order["short_strike"], order["long_strike"]]
+        actions = ["SELL", "BUY"]
+    else:
+        strikes = [order["strike"]]
+        actions = [order["action"]]
+
+    return [
+        {
+            "strike": strike,
+            "right": order["right"],
+            "action": action,
+            "conId": leg.conId if leg else None,
+            "localSymbol": leg.localSymbol if leg else None,
+            "qualified": leg is not None,
+        }
+        for strike, action, leg in zip(strikes, actions, legs or [None] * len(strikes))
+    ]
+
+
+def _to_json(record):
+    fill_latency = None
+    if record["placedAt"] and record["firstFillAt"]:
+        fill_latency = (record["firstFillAt"] - record["placedAt"]).total_seconds()
+
+    return {
+        **record,
+        "fills": list(record["fills"]),
+        "submittedAt": record["submittedAt"].isoformat(),
+        "placedAt": record["placedAt"].isoformat() if record["placedAt"] else None,
+        "firstFillAt": (
+            record["firstFillAt"].isoformat() if record["firstFillAt"] else None
+        ),
+        "fillLatencySeconds": fill_latency,
+    }
+
+
+# Called with _lock held so snapshots reach the writer in order
+def _persist(kind, data):
+    if _app is not None:
+        _persist_queue.put((kind, data))
+
+
+def create(order):
+    """Register an order about to be submitted and return its handle."""
+    handle = uuid.uuid4().hex
+    record = {
+        "id": handle,
+        "orderId": None,
+        "symbol": order["symbol"].upper(),
+        "request": order,
+        "legs": _legs_to_dicts(order, None),
+        "status": "Submitting",
+        "filled": 0.0,
+        "remaining": order["quantity"],
+        "avgFillPrice": 0.0,
+        "error": None,
+        "submittedAt": _now(),
+        "placedAt": None,
+        "firstFillAt": None,
+        "fills": [],
+    }
+    with _lock:
+        _orders[handle] = record
+        _persist("order", _to_json(record))
+    return handle
+
+
+# Runs on the background loop right after each ib.placeOrder, with no await in
+# between, so the order is mapped before any status update for it is processed
+def on_placed(handle, result):
+    with _lock:
+        record = _orders[handle]
+        record["legs"] = _legs_to_dicts(record["request"], result["legs"])
+        if result["error"]:
+            record["status"] = "Rejected"
+            record["error"] = result["error"]
+        else:
+            trade = result["trade"]
+            record["orderId"] = trade.order.orderId
+            record["status"] = trade.orderStatus.status
+            record["placedAt"] = _now()
+            _handles_by_ib_id[trade.order.orderId] = handle
+        _persist("order", _to_json(record))
+
+
+def on_failed(handle, error):
+    with _lock:
+        record = _orders[handle]
+        if record["status"] != "Submitting":
+            # Already placed (or rejected) before the batch failed
+            return
+        record["status"] = "Rejected"
+        record["error"] = error
+        _persist("order", _to_json(record))
+
+
+def on_order_status(trade):
+    with _lock:
+        handle = _handles_by_ib_id.get(trade.order.orderId)
+        if handle is None:
+            return
+        record = _orders[handle]
+        status = trade.orderStatus
+        record["status"] = status.status
+        record["filled"] = status.filled
+        record["remaining"] = status.remaining
+        record["avgFillPrice"] = status.avgFillPrice
+        _persist("order", _to_json(record))
+
+
+def on_exec_details(trade, fill):
+    execution = fill.execution
+    with _lock:
+        handle = _handles_by_ib_id.get(execution.orderId)
+        if handle is None:
+            return
+        record = _orders[handle]
+        if any(f["execId"] == execution.execId for f in record["fills"]):
+            return
+
+        fill_data = {
+            "execId": execution.execId,
+            "orderHandle": handle,
+            "orderId": execution.orderId,
+            "localSymbol": fill.contract.localSymbol,
+            "side": execution.side,
+            "shares": execution.shares,
+            "price": execution.price,
+            "time": fill.time.isoformat(),
+        }
+        record["fills"].append(fill_data)
+        if record["firstFillAt"] is None:
+            record["firstFillAt"] = _now()
+        _persist("order", _to_json(record))
+        _persist("fill", fill_data)
+        listeners = list(_fill_listeners)
+
+    for listener in listeners:
+        try:
+            listener.put_nowait(fill_data)
+        except (queue.Full, asyncio.QueueFull):
+            pass
+
+
+def attach(ib):
+    ib.orderStatusEvent += on_order_status
+    ib.execDetailsEvent += on_exec_details
+
+
+def get_order(handle):
+    with _lock:
+        record = _orders.get(handle)
+        if record is not None:
+            return _to_json(record)
+
+    # Orders from before the last restart only live in the database
+    row = db.session.get(OrderRecord, handle)
+    if row is None:
+        return None
+    fills = FillRecord.query.filter_by(order_id=handle).order_by(FillRecord.time).all()
+    return {
+        "id": row.id,
+        "orderId": row.ib_order_id,
+        "symbol": row.symbol,
+        "request": json.loads(row.request),
+        "legs": json.loads(row.legs) if row.legs else [],
+        "status": row.status,
+        "filled": row.filled,
+        "remaining": row.remaining,
+        "avgFillPrice": row.avg_fill_price,
+        "error": row.error,
+        "submittedAt": row.submitted_at.isoformat() if row.submitted_at else None,
+        "placedAt": row.placed_at.isoformat() if row.placed_at else None,
+        "firstFillAt": row.first_fill_at.isoformat() if row.first_fill_at else None,
+        "fillLatencySeconds": (
+            (row.first_fill_at - row.placed_at).total_seconds()
+            if row.placed_at and row.first_fill_at
+            else None
+        ),
+        "fills": [
+            {
+                "execId": f.exec_id,
+                "orderHandle": f.order_id,
+                "orderId": f.ib_order_id,
+                "localSymbol": f.local_symbol,
+                "side": f.side,
+                "shares": f.shares,
+                "price": f.price,
+                "time": f.time.isoformat() if f.time else None,
+            }
+            for f in fills
+        ],
+    }
+
+
+def listen_fills():
+    listener = queue.Queue(maxsize=FILL_QUEUE_SIZE)
+    with _lock:
+        _fill_listeners.add(listener)
+    return listener
+
+
+# For async routes on the IB event loop (asgi.py), which fills are reported on
+def listen_fills_async():
+    listener = asyncio.Queue(maxsize=FILL_QUEUE_SIZE)
+    with _lock:
+        _fill_listeners.add(listener)
+    return listener
+
+
+def unlisten_fills(listener):
+    with _lock:
+        _fill_listeners.discard(listener)
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    # SQLite stores naive datetimes; keep everything in UTC
+    return datetime.fromisoformat(value).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _write(kind, data):
+    if kind == "order":
+        db.session.merge(
+            OrderRecord(
+                id=data["id"],
+                ib_order_id=data["orderId"],
+                symbol=data["symbol"],
+                request=json.dumps(data["request"]),
+                legs=json.dumps(data["legs"]),
+                status=data["status"],
+                filled=data["filled"],
+                remaining=data["remaining"],
+                avg_fill_price=data["avgFillPrice"],
+                error=data["error"],
+                submitted_at=_parse_time(data["submittedAt"]),
+                placed_at=_parse_time(data["placedAt"]),
+                first_fill_at=_parse_time(data["firstFillAt"]),
+                updated_at=datetime.utcnow(),
+            )
+        )
+    else:
+        db.session.merge(
+            FillRecord(
+                exec_id=data["execId"],
+                order_id=data["orderHandle"],
+                ib_order_id=data["orderId"],
+                local_symbol=data["localSymbol"],
+                side=data["side"],
+                shares=data["shares"],
+                price=data["price"],
+                time=_parse_time(data["time"]),
+            )
+        )
+    db.session.commit()
+
+
+# Database writes happen on their own thread so neither the IB loop nor the
+# request threads ever wait on SQLite
+def _run_writer():
+    while True:
+        kind, data = _persist_queue.get()
+        with _app.app_context():
+            try:
+                _write(kind, data)
+            except Exception as e:
+                db.session.rollback()
+                print(f"--- Failed to persist {kind} {data.get('id')}: {e} ---")
+
+
+def init_app(app):
+    global _app
+    if _app is not None:
+        return
+    _app = app
+    Thread(target=_run_writer, daemon=True).start()
@@ -0,0 +1,155 @@
+import base64
+import csv
+import heapq
+import json
+import os
+import time
+from bisect import bisect_left, bisect_right
+from threading import Lock
+
+# Get the directory where this script is located (backend/services)
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PAST_TRADES_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "past_trades")
+
+# How often the directory is rescanned for new or modified CSVs
+REFRESH_SECONDS = 2.0
+
+# path -> (mtime, [trade, ...]) for every CSV seen so far
+_files = {}
+# All trades across files, ascending by sort key; pages walk it backwards.
+# Swapped as one tuple: (keys, trades, positions, dates), where for every
+# (symbol, direction) filter (None matching any) positions holds the matching
+# indexes into trades in order and dates the same as (trade date, index) pairs
+_index = ([], [], {}, {})
+_checked_at = None
+_lock = Lock()
+
+
+def _to_float(value):
+    return float(value) if value else 0
+
+
+def _to_int(value):
+    return int(value) if value else 0
+
+
+def _read_file(path):
+    trades = []
+    with open(path, "r", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            trades.append({
+                "run_timestamp_utc": row.get("run_timestamp_utc", ""),
+                "symbol": row.get("symbol", ""),
+                "prediction_for_trade_date": row.get("prediction_for_trade_date", ""),
+                "direction": row.get("direction", ""),
+                "spread_type": row.get("spread_type", ""),
+                "short_strike": _to_float(row.get("short_strike")),
+                "long_strike": _to_float(row.get("long_strike")),
+                "width": _to_float(row.get("width")),
+                "confidence": _to_int(row.get("confidence")),
+            })
+    return trades
+
+
+def refresh(force=False):
+    """Re-read only the CSVs whose mtime changed since the last scan."""
+    global _index, _checked_at
+
+    with _lock:
+        now = time.monotonic()
+        if not force and _checked_at is not None and now - _checked_at < REFRESH_SECONDS:
+            return
+        _checked_at = now
+
+        seen = {}
+        if os.path.isdir(PAST_TRADES_DIR):
+            with os.scandir(PAST_TRADES_DIR) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".csv"):
+                        seen[entry.path] = entry.stat().st_mtime
+
+        changed = set(_files) - set(seen)
+        for path in changed:  # deleted files
+            del _files[path]
+        for path, mtime in seen.items():
+            if path in _files and _files[path][0] == mtime:
+                continue
+            try:
+                _files[path] = (mtime, _read_file(path))
+            except Exception as e:
+                print(f"Error reading {path}: {str(e)}")
+                _files[path] = (mtime, [])
+            changed.add(path)
+
+        if not changed:
+            return
+
+        # (timestamp, file, row) is unique, so it doubles as the page cursor
+        rows = sorted(
+            ((trade["run_timestamp_utc"], os.path.basename(path), i), trade)
+            for path, (_, trades) in _files.items()
+            for i, trade in enumerate(trades)
+        )
+        keys = [key for key, _ in rows]
+        trades = [trade for _, trade in rows]
+
+        positions = {}
+        for i, trade in enumerate(trades):
+            symbol = trade["symbol"].upper()
+            direction = trade["direction"].upper()
+            for group in ((None, None), (symbol, None), (None, direction), (symbol, direction)):
+                positions.setdefault(group, []).append(i)
+        dates = {
+            group: sorted((trades[i]["prediction_for_trade_date"], i) for i in indexes)
+            for group, indexes in positions.items()
+        }
+        _index = (keys, trades, positions, dates)
+        print(f"--- Indexed {len(trades)} past trades from {len(_files)} files ---")
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        key = tuple(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    # Compared against (timestamp, file, row) keys, so anything else cannot be bisected
+    if len(key) != 3 or not isinstance(key[0], str) or not isinstance(key[1], str) or type(key[2]) is not int:
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def get_past_trades(limit=None, cursor=None, symbol=None, direction=None, start_date=None, end_date=None):
+    """Return (trades, next_cursor), most recent first.
+
+    Dates filter on prediction_for_trade_date and are inclusive. next_cursor
+    is None once the last matching trade has been returned.
+    """
+    refresh()
+    keys, trades, positions, dates = _index
+
+    end = bisect_left(keys, decode_cursor(cursor)) if cursor else len(keys)
+    group = (symbol.upper() if symbol else None, direction.upper() if direction else None)
+    # One extra match tells whether there is a next page
+    wanted = limit + 1 if limit is not None else len(keys)
+
+    if start_date or end_date:
+        # Only the trades in the date range are looked at, newest first
+        by_date = dates.get(group, [])
+        lo = bisect_left(by_date, (start_date,)) if start_date else 0
+        hi = bisect_right(by_date, (end_date, len(keys))) if end_date else len(by_date)
+        matches = heapq.nlargest(wanted, (i for _, i in by_date[lo:hi] if i < end))
+    else:
+        indexes = positions.get(group, [])
+        stop = bisect_left(indexes, end)
+        matches = indexes[max(stop - wanted, 0):stop][::-1]
+
+    next_cursor = None
+    if limit is not None and len(matches) > limit:
+        matches = matches[:limit]
+        next_cursor = encode_cursor(keys[matches[-1]])
+    return [trades[i] for i in matches], next_cursor
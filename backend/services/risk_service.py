@@ -0,0 +1,393 @@
+import time
+from datetime import datetime, timezone
+from threading import Lock
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from services import greeks_service, ib_broker
+
+# The portfolio (and spot prices) come through the IB broker when one is in use
+ib_service = ib_broker.service("ib_service")
+
+# Default scenario grid: underlying moves x IV shifts x days forward
+MOVE_STEPS = 50
+MOVE_RANGE = 0.20
+IV_STEPS = 20
+IV_RANGE = 0.10
+DAY_STEPS = 10
+MAX_GRID_STEPS = 200
+# Used when a leg's price cannot be inverted and its underlying has no other IV
+FALLBACK_IV = 0.25
+SECONDS_PER_YEAR = 365 * 24 * 3600
+# Options stop trading at the 16:00 New York close on their expiration date
+EXPIRY_HOUR = 16
+EXPIRY_ZONE = ZoneInfo("America/New_York")
+# Spot for underlyings held only through options: last close of recent bars
+SPOT_BAR_SIZE = "1 hour"
+SPOT_DURATION = "5 D"
+GREEKS = ("delta", "gamma", "theta", "vega")
+
+# Scenario points evaluated per pass; small enough to stay in cache
+CHUNK_POINTS = 65536
+# Expired legs are priced a moment before expiry, which is their intrinsic value
+MIN_YEARS = 1e-9
+# Abramowitz & Stegun 26.2.17 normal CDF, |error| < 7.5e-8
+_CDF_P = np.float32(0.2316419)
+_CDF_B = tuple(np.float32(b) for b in (1.330274429, -1.821255978, 1.781477937, -0.356563782, 0.319381530))
+_CDF_SCALE = np.float32(1 / np.sqrt(2 * np.pi))
+
+# conId -> parsed contract fields; contracts never change, so this only grows
+_contracts = {}
+_contracts_lock = Lock()
+
+
+def _contract_info(contract):
+    info = _contracts.get(contract.conId)
+    if info is not None:
+        return info
+
+    info = {
+        "conId": contract.conId,
+        "symbol": contract.symbol,
+        "localSymbol": contract.localSymbol or contract.symbol,
+        "secType": contract.secType,
+        "multiplier": float(contract.multiplier or (100 if contract.secType == "OPT" else 1)),
+    }
+    if contract.secType == "OPT":
+        expiry = datetime.strptime(contract.lastTradeDateOrContractMonth[:8], "%Y%m%d")
+        info.update(
+            strike=float(contract.strike),
+            right=contract.right[:1].upper(),
+            expiration=expiry.strftime("%Y-%m-%d"),
+            expires_at=expiry.replace(hour=EXPIRY_HOUR, tzinfo=EXPIRY_ZONE).timestamp(),
+        )
+    with _contracts_lock:
+        _contracts[contract.conId] = info
+    return info
+
+
+def _norm_cdf(x, out, tmp):
+    """Standard normal CDF of float32 ``x`` into ``out``, using ``tmp`` as scratch.
+
+    Several times faster than scipy's ndtr over millions of points, which is
+    what the scenario grid spends most of its time on.
+    """
+    np.abs(x, out=tmp)
+    tmp *= _CDF_P
+    tmp += 1
+    np.reciprocal(tmp, out=tmp)
+    out.fill(_CDF_B[0])
+    for b in _CDF_B[1:]:
+        out *= tmp
+        out += b
+    out *= tmp
+    np.square(x, out=tmp)
+    tmp *= -0.5
+    np.exp(tmp, out=tmp)
+    tmp *= _CDF_SCALE
+    # out is now the upper tail beyond |x|
+    out *= tmp
+    np.subtract(0.5, out, out=out)
+    np.copysign(out, x, out=out)
+    out += 0.5
+    return out
+
+
+def scenario_pnl(legs, move_axis, iv_axis, day_axis, rate, dividend_yield):
+    """Black-Scholes P&L of option legs over a moves x IV shifts x days grid.
+
+    ``legs`` holds equal-length arrays: spot, strike, years to expiry, iv,
+    is_call, price (today's, per share) and units (position x multiplier).
+    Every leg is re-priced at every grid point and the change from today's
+    price is summed over the legs, giving one (moves, IV shifts, days) array.
+    """
+    shape = (len(move_axis), len(iv_axis), len(day_axis))
+    units = legs["units"]
+    # Per-leg factors over each grid axis, exact in float64
+    spot = legs["spot"][:, None] * (1 + move_axis)
+    years = np.maximum(legs["T"][:, None] - day_axis / 365, MIN_YEARS)
+    sigma = np.maximum(legs["iv"][:, None] + iv_axis, greeks_service.IV_LOWER)
+    vol_time = sigma[:, :, None] * np.sqrt(years)[:, None, :]
+    drift = (rate - dividend_yield + 0.5 * sigma[:, :, None] ** 2) * years[:, None, :]
+    log_moneyness = np.log(spot / legs["strike"][:, None])
+    forward_units = units[:, None, None] * spot[:, :, None] * np.exp(-dividend_yield * years)[:, None, :]
+    strike_units = (units * legs["strike"])[:, None] * np.exp(-rate * years)
+
+    # Puts are calls plus K e^-rT - S e^-qT, which does not depend on IV
+    puts = ~legs["is_call"]
+    parity = (strike_units[puts][:, None, :] - forward_units[puts]).sum(axis=0)
+    pnl = np.broadcast_to(parity[:, None, :], shape) - np.dot(legs["price"], units)
+
+    # Calls over the full grid, a few legs at a time in float32
+    log_moneyness, drift, vol_time, forward_units, strike_units = (
+        factor.astype(np.float32) for factor in (log_moneyness, drift, vol_time, forward_units, strike_units)
+    )
+    per_leg = int(np.prod(shape))
+    step = max(1, CHUNK_POINTS // per_leg)
+    buffers = np.empty((4, step * per_leg), dtype=np.float32)
+    for start in range(0, len(units), step):
+        stop = min(start + step, len(units))
+        d1, d2, n1, tmp = (buffer[: (stop - start) * per_leg].reshape(stop - start, *shape) for buffer in buffers)
+        np.add(log_moneyness[start:stop, :, None, None], drift[start:stop, None], out=d1)
+        d1 /= vol_time[start:stop, None]
+        np.subtract(d1, vol_time[start:stop, None], out=d2)
+        _norm_cdf(d1, n1, tmp)
+        # d1 is not needed anymore; reuse it for N(d2)
+        n2 = _norm_cdf(d2, d1, tmp)
+        n1 *= forward_units[start:stop, :, None, :]
+        n2 *= strike_units[start:stop, None, None, :]
+        n1 -= n2
+        pnl += n1.sum(axis=0)
+    return pnl
+
+
+def _spot_prices(stocks, option_symbols):
+    spots = {info["symbol"]: item.marketPrice for item, info in stocks}
+    missing = sorted(set(option_symbols) - set(spots))
+    if not missing:
+        return spots, {}
+    bars = ib_service.get_historic_bars(missing, SPOT_BAR_SIZE, SPOT_DURATION)
+    for symbol, data in bars["data"].items():
+        if data:
+            spots[symbol] = data[-1]["Close"]
+    return spots, bars["errors"]
+
+
+def _option_legs(options, spots, rate, dividend_yield):
+    """Leg arrays for the scenario grid plus each leg's IV and position Greeks."""
+    now = time.time()
+    legs = {
+        "spot": np.array([spots[info["symbol"]] for _, info in options], dtype=np.float64),
+        "strike": np.array([info["strike"] for _, info in options], dtype=np.float64),
+        "T": np.array([(info["expires_at"] - now) / SECONDS_PER_YEAR for _, info in options]),
+        "is_call": np.array([info["right"] == "C" for _, info in options], dtype=bool),
+        "price": np.array([item.marketPrice for item, _ in options], dtype=np.float64),
+        "units": np.array([item.position * info["multiplier"] for item, info in options]),
+    }
+    live = legs["T"] > 0
+    years = np.where(live, legs["T"], 1.0)
+    iv = greeks_service.implied_volatility(
+        legs["price"], legs["spot"], legs["strike"], years, rate, dividend_yield, legs["is_call"]
+    )
+    # Legs whose price does not invert borrow the median IV of their underlying
+    estimated = ~np.isfinite(iv)
+    symbols = np.array([info["symbol"] for _, info in options], dtype=object)
+    for symbol in set(symbols[estimated]):
+        known = (symbols == symbol) & ~estimated
+        iv[(symbols == symbol) & estimated] = np.median(iv[known]) if known.any() else FALLBACK_IV
+    legs["iv"] = iv
+    # IB reports NaN for legs it has no quote for; value those at the model price
+    unquoted = ~np.isfinite(legs["price"])
+    legs["price"][unquoted] = greeks_service.black_scholes_price(
+        legs["spot"], legs["strike"], np.maximum(legs["T"], MIN_YEARS), rate, dividend_yield, iv, legs["is_call"]
+    )[unquoted]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_share = greeks_service.greeks(
+            legs["spot"], legs["strike"], years, rate, dividend_yield, iv, legs["is_call"]
+        )
+    # Expired legs settle at intrinsic value: delta 0 or +-1 and nothing else
+    itm = np.where(legs["is_call"], legs["spot"] > legs["strike"], legs["spot"] < legs["strike"])
+    expired_delta = np.where(legs["is_call"], 1.0, -1.0) * itm
+    position_greeks = {
+        "delta": np.where(live, per_share["delta"], expired_delta) * legs["units"],
+        **{greek: np.where(live, per_share[greek], 0.0) * legs["units"] for greek in GREEKS[1:]},
+    }
+    return legs, estimated, position_greeks
+
+
+def _pair_verticals(rows):
+    """Pair short and long option legs of one underlying, expiration and right.
+
+    Each short is matched with the nearest-strike long that still has
+    contracts left; whatever cannot be paired stays a single leg. Returns
+    (verticals, singles), each a list of ((row, signed contracts), ...).
+    """
+    buckets = {}
+    for row in rows:
+        info = row["info"]
+        key = (info["symbol"], info["expiration"], info["right"], info["multiplier"])
+        buckets.setdefault(key, []).append(row)
+
+    verticals, singles = [], []
+    for bucket in buckets.values():
+        shorts = [[row, -row["position"]] for row in bucket if row["position"] < 0]
+        longs = [[row, row["position"]] for row in bucket if row["position"] > 0]
+        for short in sorted(shorts, key=lambda entry: entry[0]["info"]["strike"]):
+            strike = short[0]["info"]["strike"]
+            while short[1] > 0:
+                open_longs = [entry for entry in longs if entry[1] > 0]
+                if not open_longs:
+                    break
+                long = min(open_longs, key=lambda entry: abs(entry[0]["info"]["strike"] - strike))
+                contracts = min(short[1], long[1])
+                verticals.append(((short[0], -contracts), (long[0], contracts)))
+                short[1] -= contracts
+                long[1] -= contracts
+        singles += [((row, -left),) for row, left in shorts if left > 0]
+        singles += [((row, left),) for row, left in longs if left > 0]
+    return verticals, singles
+
+
+def _group_summary(entries, kind):
+    """Greeks, value and P&L of a spread, a single leg or a stock, pro rata to its contracts."""
+    info = entries[0][0]["info"]
+    group = {"type": kind, "symbol": info["symbol"], "legs": []}
+    totals = dict.fromkeys((*GREEKS, "marketValue", "unrealizedPNL"), 0.0)
+    cost = 0.0
+    for row, contracts in entries:
+        item = row["item"]
+        share = contracts / row["position"]
+        group["legs"].append(
+            {"conId": row["info"]["conId"], "localSymbol": row["info"]["localSymbol"], "contracts": contracts}
+        )
+        for greek in GREEKS:
+            totals[greek] += row[greek] * share
+        totals["marketValue"] += item.marketValue * share
+        totals["unrealizedPNL"] += item.unrealizedPNL * share
+        cost += item.averageCost * contracts
+
+    if kind != "stock":
+        group.update(expiration=info["expiration"], right=info["right"])
+    if kind == "vertical":
+        (short, short_contracts), (long, _) = entries
+        quantity = -short_contracts
+        width = abs(short["info"]["strike"] - long["info"]["strike"]) * info["multiplier"] * quantity
+        # averageCost is per contract, so this is the cash taken in when opening
+        credit = -cost
+        group.update(
+            type="credit spread" if credit > 0 else "debit spread",
+            shortStrike=short["info"]["strike"],
+            longStrike=long["info"]["strike"],
+            quantity=quantity,
+            width=width,
+            maxProfit=credit if credit > 0 else width + credit,
+            maxLoss=width - credit if credit > 0 else -credit,
+        )
+    group.update(totals)
+    return group
+
+
+def get_risk(
+    moves=MOVE_STEPS,
+    iv_steps=IV_STEPS,
+    days=DAY_STEPS,
+    move_range=MOVE_RANGE,
+    iv_range=IV_RANGE,
+    rate=greeks_service.RISK_FREE_RATE,
+    dividend_yield=greeks_service.DIVIDEND_YIELD,
+):
+    """Greeks, spreads and a P&L scenario grid for the current IB portfolio.
+
+    Option legs are priced with Black-Scholes at the IV implied by IB's market
+    price and grouped into vertical spreads. Greeks are position-weighted:
+    delta in shares, gamma in shares per $1, theta in $ per day and vega in $
+    per vol point. The grid applies the same relative move to every
+    underlying, an absolute shift to every IV, and whole days of decay.
+    """
+    for name, steps in (("moves", moves), ("iv_steps", iv_steps), ("days", days)):
+        if not 1 <= steps <= MAX_GRID_STEPS:
+            raise ValueError(f"{name} must be between 1 and {MAX_GRID_STEPS}")
+    if not 0 <= move_range < 1 or not 0 <= iv_range < 1:
+        raise ValueError("move_range and iv_range must be between 0 and 1")
+    move_axis = np.linspace(-move_range, move_range, moves)
+    iv_axis = np.linspace(-iv_range, iv_range, iv_steps)
+    day_axis = np.arange(days, dtype=np.float64)
+
+    stocks, options, unsupported = [], [], []
+    for item in ib_service.get_portfolio():
+        info = _contract_info(item.contract)
+        if not item.position:
+            continue
+        if info["secType"] == "OPT":
+            options.append((item, info))
+        elif info["secType"] == "STK":
+            stocks.append((item, info))
+        else:
+            unsupported.append(info["localSymbol"])
+
+    spots, errors = _spot_prices(stocks, [info["symbol"] for _, info in options])
+    unsupported += [info["localSymbol"] for _, info in options if info["symbol"] not in spots]
+    options = [(item, info) for item, info in options if info["symbol"] in spots]
+
+    started = time.perf_counter()
+    pnl = np.zeros((moves, iv_steps, days))
+    rows = []
+    if options:
+        legs, estimated, position_greeks = _option_legs(options, spots, rate, dividend_yield)
+        pnl += scenario_pnl(legs, move_axis, iv_axis, day_axis, rate, dividend_yield)
+        for i, (item, info) in enumerate(options):
+            rows.append(
+                {
+                    "item": item,
+                    "info": info,
+                    "position": item.position,
+                    "spot": legs["spot"][i],
+                    "iv": float(legs["iv"][i]),
+                    "ivEstimated": bool(estimated[i]),
+                    **{greek: float(position_greeks[greek][i]) for greek in GREEKS},
+                }
+            )
+    stock_rows = [
+        {
+            "item": item,
+            "info": info,
+            "position": item.position,
+            **dict.fromkeys(GREEKS, 0.0),
+            "delta": item.position * info["multiplier"],
+        }
+        for item, info in stocks
+    ]
+    # Stock P&L only depends on the move
+    for row in stock_rows:
+        pnl += (row["delta"] * row["item"].marketPrice * move_axis)[:, None, None]
+
+    verticals, singles = _pair_verticals(rows)
+    groups = [_group_summary(entries, "vertical") for entries in verticals]
+    groups += [_group_summary(entries, "single") for entries in singles]
+    groups += [_group_summary(((row, row["position"]),), "stock") for row in stock_rows]
+
+    by_symbol = {}
+    for row in rows + stock_rows:
+        symbol = row["info"]["symbol"]
+        totals = by_symbol.setdefault(symbol, dict.fromkeys(GREEKS, 0.0))
+        for greek in GREEKS:
+            totals[greek] += row[greek]
+    for symbol, totals in by_symbol.items():
+        totals["spot"] = spots[symbol]
+        totals["dollarDelta"] = totals["delta"] * spots[symbol]
+    total = {key: sum(totals[key] for totals in by_symbol.values()) for key in (*GREEKS, "dollarDelta")}
+
+    return {
+        "asOf": datetime.now(timezone.utc).isoformat(),
+        "legs": [
+            {
+                "conId": row["info"]["conId"],
+                "symbol": row["info"]["symbol"],
+                "localSymbol": row["info"]["localSymbol"],
+                "expiration": row["info"]["expiration"],
+                "strike": row["info"]["strike"],
+                "right": row["info"]["right"],
+                "position": row["position"],
+                "marketPrice": row["item"].marketPrice,
+                "spot": row["spot"],
+                "iv": row["iv"],
+                "ivEstimated": row["ivEstimated"],
+                **{greek: row[greek] for greek in GREEKS},
+            }
+            for row in rows
+        ],
+        "groups": groups,
+        "greeks": {"total": total, "bySymbol": by_symbol},
+        "scenarios": {
+            "moves": move_axis.tolist(),
+            "ivShifts": iv_axis.tolist(),
+            "days": day_axis.tolist(),
+            # pnl[move][IV shift][day], in $ against today's prices
+            "pnl": pnl.tolist(),
+        },
+        "unsupported": unsupported,
+        "errors": errors,
+        "computeMs": (time.perf_counter() - started) * 1000,
+    }
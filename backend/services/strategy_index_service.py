@@ -0,0 +1,289 @@
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+from threading import Lock
+
+from services import past_trades_service, strategy_log_service
+
+# One SQLite file next to the logs: a row of structured fields per day, and an
+# FTS5 full-text index over the report and debate texts
+INDEX_FILE = os.path.join(os.path.dirname(strategy_log_service.LOG_DIR), "strategy_index.sqlite")
+# How often the log directory is rescanned for new or modified logs
+REFRESH_SECONDS = 2.0
+# Bump when the extracted fields or sections change; forces a full rebuild
+SCHEMA_VERSION = 1
+
+# Searchable section -> the log fields concatenated into it
+SECTIONS = {
+    "market": ("market_report",),
+    "news": ("news_report",),
+    "sentiment": ("sentiment_report",),
+    "fundamentals": ("fundamentals_report",),
+    "investment_debate": ("investment_debate_state.history", "investment_debate_state.judge_decision"),
+    "risk_debate": ("risk_debate_state.history", "risk_debate_state.judge_decision"),
+    "decision": ("trader_investment_decision", "investment_plan", "final_trade_decision"),
+}
+GROUP_FIELDS = ("decision", "direction", "spread_type")
+PERIODS = {
+    "month": "substr(date, 1, 7)",
+    "year": "substr(date, 1, 4)",
+    "week": "strftime('%Y-W%W', date)",
+}
+SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 500
+
+# The judge states its call as e.g. "Final Recommendation: **BUY SPY**"
+_RECOMMENDATION = re.compile(r"recommendation\W*(?:\w+\W+){0,2}?(BUY|SELL|HOLD)\b", re.IGNORECASE)
+_DECISION_WORD = re.compile(r"\b(BUY|SELL|HOLD)\b")
+
+_checked_at = None
+_trades_seen = None
+_lock = Lock()
+
+
+def _connect():
+    conn = sqlite3.connect(INDEX_FILE, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _create_schema(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != SCHEMA_VERSION:
+        conn.execute("DROP TABLE IF EXISTS days")
+        conn.execute("DROP TABLE IF EXISTS texts")
+    lengths = ", ".join(f"{section}_length INTEGER" for section in SECTIONS)
+    conn.execute(
+        f"""CREATE TABLE IF NOT EXISTS days (
+            id INTEGER PRIMARY KEY,
+            date TEXT UNIQUE NOT NULL,
+            file TEXT,
+            mtime REAL,
+            symbol TEXT,
+            decision TEXT,
+            direction TEXT,
+            spread_type TEXT,
+            confidence INTEGER,
+            {lengths}
+        )"""
+    )
+    # Rows share ids with days; porter stemming lets "tariff" match "tariffs"
+    conn.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS texts USING fts5({', '.join(SECTIONS)}, "
+        "tokenize='porter unicode61')"
+    )
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _field(state, path):
+    value = state
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value if isinstance(value, str) else ""
+
+
+def extract_decision(text):
+    """BUY, SELL or HOLD from the final trade decision text, or None."""
+    recommendations = _RECOMMENDATION.findall(text)
+    if recommendations:
+        return recommendations[-1].upper()
+    # Otherwise the last call spelled in capitals; lower-case "hold" is prose
+    words = _DECISION_WORD.findall(text)
+    return words[-1] if words else None
+
+
+def _parse_log(date, entry):
+    with open(entry["path"], "r") as f:
+        data = json.load(f)
+    state = next(iter(data.values())) if data else {}
+    texts = {
+        section: "\n\n".join(filter(None, (_field(state, path) for path in paths)))
+        for section, paths in SECTIONS.items()
+    }
+    row = {
+        "date": date,
+        "file": os.path.basename(entry["path"]),
+        "mtime": entry["mtime"],
+        "symbol": state.get("company_of_interest"),
+        "decision": extract_decision(_field(state, "final_trade_decision")),
+        **{f"{section}_length": len(text) for section, text in texts.items()},
+    }
+    return row, texts
+
+
+def _store(conn, row, texts):
+    existing = conn.execute("SELECT id FROM days WHERE date = ?", (row["date"],)).fetchone()
+    if existing:
+        conn.execute("DELETE FROM texts WHERE rowid = ?", (existing["id"],))
+        conn.execute("DELETE FROM days WHERE id = ?", (existing["id"],))
+    columns = ", ".join(row)
+    cursor = conn.execute(
+        f"INSERT INTO days ({columns}) VALUES ({', '.join('?' * len(row))})", tuple(row.values())
+    )
+    conn.execute(
+        f"INSERT INTO texts (rowid, {', '.join(SECTIONS)}) VALUES (?{', ?' * len(SECTIONS)})",
+        (cursor.lastrowid, *texts.values()),
+    )
+
+
+def _attach_trades(conn, trades):
+    """Copy direction, spread type and confidence from the past-trade CSVs."""
+    latest = {}
+    # Most recent run first, so that one wins for a date
+    for trade in trades:
+        latest.setdefault((trade["symbol"], trade["prediction_for_trade_date"]), trade)
+    conn.executemany(
+        """UPDATE days SET direction = ?, spread_type = ?, confidence = ?
+           WHERE symbol = ? AND date = ?
+             AND (direction IS NOT ? OR spread_type IS NOT ? OR confidence IS NOT ?)""",
+        [
+            (t["direction"], t["spread_type"], t["confidence"], symbol, date, t["direction"], t["spread_type"], t["confidence"])
+            for (symbol, date), t in latest.items()
+        ],
+    )
+
+
+def refresh(force=False, rebuild=False):
+    """Index logs added or modified since the last run and drop deleted ones.
+
+    Only changed files are parsed, so after the first run this costs a
+    directory scan. Returns the number of logs (re)indexed.
+    """
+    global _checked_at, _trades_seen
+
+    with _lock:
+        now = time.monotonic()
+        if not force and not rebuild and _checked_at is not None and now - _checked_at < REFRESH_SECONDS:
+            return 0
+        _checked_at = now
+
+        files = strategy_log_service.get_log_files()
+        with closing(_connect()) as conn, conn:
+            if rebuild:
+                conn.execute("PRAGMA user_version = 0")
+            _create_schema(conn)
+            indexed = {row["date"]: row["mtime"] for row in conn.execute("SELECT date, mtime FROM days")}
+
+            for date in set(indexed) - set(files):
+                conn.execute("DELETE FROM texts WHERE rowid = (SELECT id FROM days WHERE date = ?)", (date,))
+                conn.execute("DELETE FROM days WHERE date = ?", (date,))
+            changed = [date for date, entry in sorted(files.items()) if indexed.get(date) != entry["mtime"]]
+            for date in changed:
+                try:
+                    _store(conn, *_parse_log(date, files[date]))
+                except Exception as e:
+                    print(f"--- Failed to index strategy log {date}: {e} ---")
+            trades, _ = past_trades_service.get_past_trades()
+            # A new trades list means a CSV was added or rewritten
+            if changed or trades != _trades_seen:
+                _attach_trades(conn, trades)
+                _trades_seen = trades
+
+        if changed:
+            print(f"--- Indexed {len(changed)} strategy logs ---")
+        return len(changed)
+
+
+def _date_filters(start_date, end_date):
+    clauses, params = [], []
+    if start_date:
+        clauses.append("days.date >= ?")
+        params.append(start_date)
+    if end_date:
+        clauses.append("days.date <= ?")
+        params.append(end_date)
+    return clauses, params
+
+
+def search(query, section=None, start_date=None, end_date=None, limit=SEARCH_LIMIT):
+    """Days whose texts match an FTS5 ``query``, most recent first.
+
+    ``query`` takes FTS5 syntax: words (all must appear), "quoted phrases",
+    OR/NOT, and prefix* terms. ``section`` limits the match to one of
+    SECTIONS. Each hit carries a highlighted snippet.
+    """
+    if not query or not query.strip():
+        raise ValueError("A search query is required")
+    if section and section not in SECTIONS:
+        raise ValueError(f"Unknown section {section!r}, expected one of {list(SECTIONS)}")
+    limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+    refresh()
+
+    match = f"{{{section}}} : ({query})" if section else query
+    # snippet() column -1 picks the best-matching section
+    column = list(SECTIONS).index(section) if section else -1
+    clauses, params = _date_filters(start_date, end_date)
+    where = "".join(f" AND {clause}" for clause in clauses)
+    sql = f"""
+        SELECT days.date, days.decision, days.direction, days.spread_type, days.confidence,
+               snippet(texts, {column}, '[', ']', '…', 16) AS snippet
+        FROM texts JOIN days ON days.id = texts.rowid
+        WHERE texts MATCH ?{where}
+        ORDER BY days.date DESC
+        LIMIT ?
+    """
+    try:
+        with closing(_connect()) as conn:
+            return [dict(row) for row in conn.execute(sql, (match, *params, limit))]
+    except sqlite3.OperationalError as e:
+        # FTS5 syntax errors surface here
+        raise ValueError(f"Invalid search query: {e}")
+
+
+def get_days(start_date=None, end_date=None, decision=None):
+    """The structured per-day table, oldest first."""
+    refresh()
+    clauses, params = _date_filters(start_date, end_date)
+    if decision:
+        clauses.append("days.decision = ?")
+        params.append(decision.upper())
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with closing(_connect()) as conn:
+        return [dict(row) for row in conn.execute(f"SELECT * FROM days {where} ORDER BY date", params)]
+
+
+def get_distribution(field="decision", period="month", start_date=None, end_date=None):
+    """Counts of each ``field`` value per ``period``, with the period's mean confidence."""
+    if field not in GROUP_FIELDS:
+        raise ValueError(f"Unknown field {field!r}, expected one of {list(GROUP_FIELDS)}")
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}, expected one of {list(PERIODS)}")
+    refresh()
+
+    clauses, params = _date_filters(start_date, end_date)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"""
+        SELECT {PERIODS[period]} AS period, {field} AS value, COUNT(*) AS days,
+               AVG(confidence) AS avg_confidence, COUNT(confidence) AS rated
+        FROM days {where}
+        GROUP BY period, value
+        ORDER BY period
+    """
+    periods = {}
+    with closing(_connect()) as conn:
+        for row in conn.execute(sql, params):
+            entry = periods.setdefault(
+                row["period"], {"period": row["period"], "days": 0, "counts": {}, "_confidence": []}
+            )
+            entry["days"] += row["days"]
+            entry["counts"][row["value"] or "UNKNOWN"] = row["days"]
+            if row["rated"]:
+                entry["_confidence"].append((row["avg_confidence"], row["rated"]))
+
+    for entry in periods.values():
+        weighted = entry.pop("_confidence")
+        total = sum(days for _, days in weighted)
+        entry["avg_confidence"] = sum(avg * days for avg, days in weighted) / total if total else None
+    return list(periods.values())
+
+
+if __name__ == "__main__":
+    import sys
+
+    count = refresh(rebuild="--rebuild" in sys.argv)
+    with closing(_connect()) as conn:
+        total = conn.execute("SELECT COUNT(*) FROM days").fetchone()[0]
+    print(f"{total} strategy logs indexed ({count} updated) in {INDEX_FILE}")
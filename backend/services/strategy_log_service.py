@@ -1,6 +1,9 @@
 import os
 import json
-import glob
+import time
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
 
 # Get the directory where this script is located (backend/services)
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -8,33 +11,125 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, '..', '..'))
 LOG_DIR = os.path.join(PROJECT_ROOT, 'TradingAgents', 'eval_results', 'SPY', 'TradingAgentsStrategy_logs')
 
-def get_latest_strategy_log():
+LOG_PREFIX = 'full_states_log_'
+# How often the directory is rescanned for new or modified logs
+INDEX_REFRESH_SECONDS = 2.0
+# Number of parsed log files kept in memory
+LOG_CACHE_SIZE = 16
+
+# date (YYYY-MM-DD) -> {"path", "mtime", "size"}
+_index = {}
+_index_checked_at = None
+_cache = OrderedDict()
+_lock = Lock()
+
+
+def _date_from_filename(name):
+    # Some files are not zero padded (full_states_log_2025-11-5.json)
+    raw = name[len(LOG_PREFIX):-len('.json')]
     try:
-        # specific pattern for the files
-        pattern = os.path.join(LOG_DIR, 'full_states_log_*.json')
-        
-        files = glob.glob(pattern)
+        return datetime.strptime(raw, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def _refresh_index(force=False):
+    global _index, _index_checked_at
+
+    now = time.monotonic()
+    if not force and _index_checked_at is not None and now - _index_checked_at < INDEX_REFRESH_SECONDS:
+        return
+
+    index = {}
+    if os.path.isdir(LOG_DIR):
+        with os.scandir(LOG_DIR) as entries:
+            for entry in entries:
+                if not (entry.name.startswith(LOG_PREFIX) and entry.name.endswith('.json')):
+                    continue
+                date = _date_from_filename(entry.name)
+                if date is None:
+                    continue
+                stat = entry.stat()
+                # Padded and unpadded names can both exist for a date; keep the newer
+                if date in index and index[date]['mtime'] >= stat.st_mtime:
+                    continue
+                index[date] = {'path': entry.path, 'mtime': stat.st_mtime, 'size': stat.st_size}
+
+    _index = index
+    _index_checked_at = now
+
+
+def _load(entry):
+    # Keyed on mtime so a rewritten file is parsed again
+    key = (entry['path'], entry['mtime'])
+    with _lock:
+        data = _cache.get(key)
+        if data is not None:
+            _cache.move_to_end(key)
+            return data
+
+    with open(entry['path'], 'r') as f:
+        data = json.load(f)
 
-        if not files:
+    with _lock:
+        _cache[key] = data
+        while len(_cache) > LOG_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return data
+
+
+def _project(data, fields):
+    if not fields:
+        return data
+    return {field: data[field] for field in fields if field in data}
+
+
+def list_strategy_logs():
+    _refresh_index()
+    return [
+        {
+            'date': date,
+            'file': os.path.basename(entry['path']),
+            'size': entry['size'],
+            'modified': datetime.fromtimestamp(entry['mtime']).isoformat(),
+        }
+        for date, entry in sorted(_index.items(), reverse=True)
+    ]
+
+
+def get_log_files():
+    """Every log file by date: {date: {"path", "mtime", "size"}}."""
+    _refresh_index()
+    return dict(_index)
+
+
+def get_strategy_log(date, fields=None):
+    """Return one day's log, optionally projected down to ``fields``."""
+    try:
+        _refresh_index()
+        entry = _index.get(date)
+        if entry is None:
             return None
 
-        # Sort files by name (which contains the date) in descending order to get the latest
-        latest_file = max(files, key=os.path.getctime)
-        
-        with open(latest_file, 'r') as f:
-            data = json.load(f)
-            
-        # The JSON structure has a top-level key which is the date. 
+        data = _load(entry)
+        # The JSON structure has a top-level key which is the date.
         # We usually want the content of that key.
         # Assuming one key per file based on the sample "2025-05-09": {...}
         if data:
             key = list(data.keys())[0]
             return {
                 "date": key,
-                "data": data[key]
+                "data": _project(data[key], fields)
             }
         return None
 
     except Exception as e:
         print(f"Error reading strategy log: {e}")
         raise e
+
+
+def get_latest_strategy_log(fields=None):
+    _refresh_index()
+    if not _index:
+        return None
+    return get_strategy_log(max(_index), fields)
@@ -0,0 +1,170 @@
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from services import backtest_service, greeks_service, option_chain_store
+
+DEFAULT_GRID = {
+    "decisions": [
+        os.path.join(
+            option_chain_store.PROJECT_ROOT,
+            "TradingAgents",
+            "credit_spread_decisions_test3nohold.csv",
+        )
+    ],
+    "target_dte": [7],
+    "width": [None],
+    "short_delta": [None],
+    "min_confidence": [0],
+    "max_expiration_gap_days": [7],
+    "contracts": [1],
+}
+
+
+def expand_grid(grid):
+    """Cartesian product of a {param: [values]} grid, over DEFAULT_GRID."""
+    grid = {**DEFAULT_GRID, **grid}
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+
+@lru_cache(maxsize=None)
+def _load_decisions(path):
+    return backtest_service.load_decisions(path)
+
+
+def _nearest_expiration(trade_date, right, config):
+    target = np.datetime64(trade_date, "D") + config["target_dte"]
+    expirations = np.array(option_chain_store.get_expirations(trade_date, right), dtype="datetime64[D]")
+    if not len(expirations):
+        return None
+    gaps = np.abs((expirations - target).astype(np.int64))
+    best = int(np.argmin(gaps))  # ties go to the earlier expiration
+    if gaps[best] > config["max_expiration_gap_days"]:
+        return None
+    return str(expirations[best])
+
+
+def _strikes_by_delta(decisions, config):
+    # Move each short strike to the one nearest short_delta on the expiration
+    # the backtest will match, keeping the spread width
+    short_strikes = decisions["short_strike"].to_numpy(dtype=np.float64).copy()
+    for i, (trade_date, spread_type) in enumerate(
+        zip(decisions["prediction_for_trade_date"], decisions["spread_type"])
+    ):
+        right = backtest_service.OPTION_TYPE_BY_SPREAD.get(spread_type)
+        if right is None or not option_chain_store.has_date(trade_date):
+            continue
+        expiration = _nearest_expiration(trade_date, right, config)
+        if expiration is None:
+            continue
+        picks = greeks_service.strikes_near_delta(
+            trade_date, expiration, config["short_delta"], right
+        )
+        if len(picks):
+            short_strikes[i] = picks["strike"].iloc[0]
+
+    width = decisions["width"] if config["width"] is None else config["width"]
+    is_put = decisions["spread_type"] == "bull_put_credit_spread"
+    return decisions.assign(
+        short_strike=short_strikes,
+        long_strike=np.where(is_put, short_strikes - width, short_strikes + width),
+        width=width,
+    )
+
+
+def _apply_config(decisions, config):
+    decisions = decisions[decisions["confidence"] >= config["min_confidence"]]
+    if config["short_delta"] is not None:
+        return _strikes_by_delta(decisions, config)
+    if config["width"] is not None:
+        is_put = decisions["spread_type"] == "bull_put_credit_spread"
+        decisions = decisions.assign(
+            long_strike=np.where(
+                is_put,
+                decisions["short_strike"] - config["width"],
+                decisions["short_strike"] + config["width"],
+            ),
+            width=config["width"],
+        )
+    return decisions
+
+
+def _summarize(results):
+    matched = results["match_status"] == backtest_service.MATCHED
+    settled = results[results["pnl"].notna()].sort_values("trade_date", kind="stable")
+    equity = settled["pnl"].cumsum().to_numpy()
+    peaks = np.maximum.accumulate(np.concatenate([[0.0], equity]))[1:]
+
+    return {
+        "trades": int(len(results)),
+        "matched": int(matched.sum()),
+        "settled": int(len(settled)),
+        "total_pnl": float(settled["pnl"].sum()),
+        "avg_pnl": float(settled["pnl"].mean()) if len(settled) else np.nan,
+        "win_rate": float((settled["pnl"] > 0).mean()) if len(settled) else np.nan,
+        "max_drawdown": float((peaks - equity).max()) if len(settled) else 0.0,
+        "avg_premium": (
+            float(results.loc[matched, "premium_collected"].mean())
+            if matched.any()
+            else np.nan
+        ),
+    }
+
+
+def run_config(config):
+    decisions = _apply_config(_load_decisions(config["decisions"]), config)
+    results = backtest_service.run_backtest(
+        decisions,
+        target_dte=config["target_dte"],
+        max_expiration_gap_days=config["max_expiration_gap_days"],
+    )
+    results = backtest_service.settle_backtest(results, contracts=config["contracts"])
+    return {**config, **_summarize(results)}
+
+
+def _init_worker():
+    # Workers map the same store files, so they share one copy of the page
+    # cache; only the small manifest and underlying closes are per-process.
+    option_chain_store.get_underlying_closes()
+
+
+def run_sweep(grid, processes=None, output_path=None):
+    """Replay every configuration of ``grid`` across a process pool.
+
+    Returns one row per configuration with P&L, win rate and drawdown.
+    """
+    option_chain_store.ingest_historical_data()
+    configs = expand_grid(grid)
+    processes = processes or os.cpu_count() or 1
+
+    if processes == 1 or len(configs) == 1:
+        rows = [run_config(config) for config in configs]
+    else:
+        chunksize = max(1, len(configs) // (processes * 4))
+        with ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker
+        ) as executor:
+            rows = list(executor.map(run_config, configs, chunksize=chunksize))
+
+    summary = pd.DataFrame(rows)
+    summary["decisions"] = summary["decisions"].map(os.path.basename)
+    if output_path:
+        summary.to_csv(output_path, index=False)
+        print(f"--- Wrote {len(summary)} sweep results to {output_path} ---")
+    return summary
+
+
+if __name__ == "__main__":
+    import sys
+
+    grid = {}
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r") as f:
+            grid = json.load(f)
+    print(run_sweep(grid, output_path=sys.argv[2] if len(sys.argv) > 2 else None))
@@ -0,0 +1,297 @@
+import json
+import os
+import sqlite3
+import time
+from bisect import bisect_left, insort
+from contextlib import closing
+from threading import RLock
+
+from services import ib_broker, metrics_service
+
+# IB-backed services live in the broker process when IB_BROKER_ADDRESS is set
+ib_service = ib_broker.service("ib_service")
+
+# Get the directory where this script is located (backend/services)
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Symbol matches and contract details survive restarts in one SQLite file
+CACHE_FILE = os.path.join(os.path.dirname(CURRENT_DIR), "instance", "symbol_cache.sqlite")
+
+# IB answers a symbol search with at most this many matches; a pattern that
+# got fewer has every match for longer patterns starting with it, too
+IB_MATCH_LIMIT = 16
+# How long an IB answer for a pattern or a contract is trusted
+SEARCH_TTL = 7 * 86400
+DETAILS_TTL = 30 * 86400
+# Symbols IB does not know are not asked about again for this long
+UNKNOWN_TTL = 3600
+QUOTE_TTL = 2.0
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+MAX_QUOTE_SYMBOLS = 100
+# Index entries looked at per search before ranking
+MAX_CANDIDATES = 200
+
+_lock = RLock()
+_loaded = False
+# conId -> match dict, and a sorted (token, conId) list over symbols and name words
+_matches = {}
+_tokens = []
+# pattern -> (searched_at, number of IB matches)
+_searches = {}
+# symbol -> (fetched_at, details dict); symbol -> time it was found unknown
+_details = {}
+_unknown = {}
+# conId -> (expires_at, quote dict)
+_quotes = {}
+
+
+def _connect():
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    conn = sqlite3.connect(CACHE_FILE, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS matches (conId INTEGER PRIMARY KEY, symbol TEXT, data TEXT)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS searches (pattern TEXT PRIMARY KEY, searched_at REAL, results INTEGER)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS contracts (conId INTEGER PRIMARY KEY, symbol TEXT, fetched_at REAL, data TEXT)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS contracts_symbol ON contracts (symbol)")
+    return conn
+
+
+def _index(match):
+    previous = _matches.get(match["conId"])
+    if previous is not None:
+        for token in _match_tokens(previous):
+            i = bisect_left(_tokens, (token, match["conId"]))
+            if i < len(_tokens) and _tokens[i] == (token, match["conId"]):
+                del _tokens[i]
+    _matches[match["conId"]] = match
+    for token in _match_tokens(match):
+        insort(_tokens, (token, match["conId"]))
+
+
+def _match_tokens(match):
+    words = (match.get("name") or "").upper().replace(",", " ").split()
+    return {match["symbol"].upper(), *words}
+
+
+def _load():
+    """Read the cache file into memory once per process."""
+    global _loaded
+    if _loaded:
+        return
+    with closing(_connect()) as conn:
+        for row in conn.execute("SELECT data FROM matches"):
+            _index(json.loads(row["data"]))
+        for row in conn.execute("SELECT pattern, searched_at, results FROM searches"):
+            _searches[row["pattern"]] = (row["searched_at"], row["results"])
+        # Most recent last, so that one wins for a symbol
+        for row in conn.execute("SELECT symbol, fetched_at, data FROM contracts ORDER BY fetched_at"):
+            _details[row["symbol"]] = (row["fetched_at"], json.loads(row["data"]))
+    _loaded = True
+    print(f"--- Loaded {len(_matches)} symbols and {len(_details)} contracts from the symbol cache ---")
+
+
+def _lookup(pattern, limit):
+    # The index holds single words, so each word of the query must start one
+    # of a match's tokens. Candidates come from the longest (most selective) word
+    words = pattern.split()
+    first = max(words, key=len)
+    con_ids = {}
+    i = bisect_left(_tokens, (first,))
+    while i < len(_tokens) and len(con_ids) < MAX_CANDIDATES:
+        token, con_id = _tokens[i]
+        if not token.startswith(first):
+            break
+        con_ids[con_id] = None
+        i += 1
+    matches = [_matches[con_id] for con_id in con_ids]
+    if len(words) > 1:
+        matches = [
+            m for m in matches
+            if all(any(token.startswith(word) for token in _match_tokens(m)) for word in words)
+        ]
+    # Exact symbol, then symbols starting with the pattern (shortest first), then name matches
+    matches.sort(
+        key=lambda m: (
+            m["symbol"] != pattern,
+            not m["symbol"].startswith(pattern),
+            m["secType"] != "STK",
+            len(m["symbol"]),
+            m["symbol"],
+        )
+    )
+    return matches[:limit]
+
+
+def _searched(pattern, now):
+    """Whether IB already gave every match for ``pattern`` recently."""
+    for end in range(1, len(pattern) + 1):
+        entry = _searches.get(pattern[:end])
+        if entry is None or now - entry[0] > SEARCH_TTL:
+            continue
+        if end == len(pattern) or entry[1] < IB_MATCH_LIMIT:
+            return True
+    return False
+
+
+def _details_to_match(details):
+    return {
+        "conId": details["conId"],
+        "symbol": details["symbol"],
+        "secType": details["secType"],
+        "primaryExchange": details["primaryExchange"],
+        "currency": details["currency"],
+        "name": details["name"],
+        "derivativeSecTypes": _matches.get(details["conId"], {}).get("derivativeSecTypes", []),
+    }
+
+
+def _store_matches(conn, matches):
+    conn.executemany(
+        "INSERT OR REPLACE INTO matches (conId, symbol, data) VALUES (?, ?, ?)",
+        [(m["conId"], m["symbol"], json.dumps(m)) for m in matches],
+    )
+    for match in matches:
+        _index(match)
+
+
+def search(query, limit=SEARCH_LIMIT):
+    """Type-ahead matches for a symbol or company name prefix.
+
+    Answered from the in-memory prefix index; IB's symbol search is only
+    asked when no earlier search (of this pattern, or of a shorter one that
+    IB answered in full) covers the pattern.
+    """
+    pattern = " ".join((query or "").upper().replace(",", " ").split())
+    if not pattern:
+        raise ValueError("A search query is required")
+    limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+
+    with _lock:
+        _load()
+        now = time.time()
+        if _searched(pattern, now):
+            metrics_service.CACHE_REQUESTS.inc(cache="symbol_search", result="hit")
+            return _lookup(pattern, limit)
+
+    metrics_service.CACHE_REQUESTS.inc(cache="symbol_search", result="miss")
+    matches = ib_service.match_symbols(pattern)
+    with _lock, closing(_connect()) as conn, conn:
+        _store_matches(conn, matches)
+        conn.execute(
+            "INSERT OR REPLACE INTO searches (pattern, searched_at, results) VALUES (?, ?, ?)",
+            (pattern, now, len(matches)),
+        )
+        _searches[pattern] = (now, len(matches))
+        return _lookup(pattern, limit)
+
+
+def _parse_symbols(symbols):
+    symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()))
+    if not symbols:
+        raise ValueError("At least one symbol is required")
+    if len(symbols) > MAX_QUOTE_SYMBOLS:
+        raise ValueError(f"At most {MAX_QUOTE_SYMBOLS} symbols per request")
+    return symbols
+
+
+def get_contracts(symbols):
+    """US stock contract details per symbol, from the cache or one IB batch.
+
+    Returns ({symbol: details}, {symbol: error message}).
+    """
+    symbols = _parse_symbols(symbols)
+    now = time.time()
+    contracts, errors, missing = {}, {}, []
+    with _lock:
+        _load()
+        for symbol in symbols:
+            entry = _details.get(symbol)
+            if entry and now - entry[0] < DETAILS_TTL:
+                contracts[symbol] = entry[1]
+            elif now - _unknown.get(symbol, 0) < UNKNOWN_TTL:
+                errors[symbol] = f"Unknown symbol {symbol}"
+            else:
+                missing.append(symbol)
+    metrics_service.CACHE_REQUESTS.inc(len(symbols) - len(missing), cache="contract_details", result="hit")
+    if not missing:
+        return contracts, errors
+
+    metrics_service.CACHE_REQUESTS.inc(len(missing), cache="contract_details", result="miss")
+    results = ib_service.get_contract_details(missing)
+    with _lock, closing(_connect()) as conn, conn:
+        for symbol, result in results.items():
+            if isinstance(result, Exception):
+                print(f"--- Failed to load contract details for {symbol}: {result!r} ---")
+                errors[symbol] = str(result)
+            elif not result:
+                _unknown[symbol] = now
+                errors[symbol] = f"Unknown symbol {symbol}"
+            else:
+                # Several listings can share a symbol; prefer the primary-listed stock
+                details = min(result, key=lambda d: (d["secType"] != "STK", d["conId"]))
+                _details[symbol] = (now, details)
+                contracts[symbol] = details
+                conn.execute(
+                    "INSERT OR REPLACE INTO contracts (conId, symbol, fetched_at, data) VALUES (?, ?, ?, ?)",
+                    (details["conId"], symbol, now, json.dumps(details)),
+                )
+                _store_matches(conn, [_details_to_match(details)])
+    return contracts, errors
+
+
+def _get_quotes(contracts):
+    now = time.monotonic()
+    data, errors, missing = {}, {}, {}
+    with _lock:
+        for symbol, contract in contracts.items():
+            entry = _quotes.get(contract["conId"])
+            if entry and entry[0] > now:
+                data[symbol] = entry[1]
+            else:
+                missing[symbol] = contract
+    metrics_service.CACHE_REQUESTS.inc(len(data), cache="quote", result="hit")
+    if not missing:
+        return data, errors
+
+    metrics_service.CACHE_REQUESTS.inc(len(missing), cache="quote", result="miss")
+    quotes = {quote["conId"]: quote for quote in ib_service.get_quotes(list(missing.values()))}
+    expires = time.monotonic() + QUOTE_TTL
+    with _lock:
+        for symbol, contract in missing.items():
+            quote = quotes.get(contract["conId"])
+            if quote is None:
+                errors[symbol] = "No quote returned"
+                continue
+            _quotes[contract["conId"]] = (expires, quote)
+            data[symbol] = quote
+    return data, errors
+
+
+def get_quotes(symbols):
+    """Snapshot quotes for several symbols: {"data": {symbol: quote}, "errors": {...}}.
+
+    Contracts come from the details cache, and quotes younger than QUOTE_TTL
+    are reused; the rest are requested from IB together in one reqTickers.
+    """
+    contracts, errors = get_contracts(symbols)
+    data, quote_errors = _get_quotes(contracts)
+    return {"data": data, "errors": {**errors, **quote_errors}}
+
+
+def get_market_data(symbol):
+    """Contract details and a snapshot quote for one symbol, or None if IB does not know it."""
+    contracts, errors = get_contracts([symbol])
+    if not contracts:
+        [(symbol, message)] = errors.items()
+        if symbol in _unknown:
+            return None
+        raise RuntimeError(message)
+    [(symbol, contract)] = contracts.items()
+    data, _ = _get_quotes({symbol: contract})
+    return {"symbol": symbol, "contract": contract, "quote": data.get(symbol)}
@@ -0,0 +1,163 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import torch
+
+from services import ml_service
+
+DEFAULT_PARAMS = {
+    "train_size": 756,  # ~3 years of daily bars
+    "val_size": 63,  # ~1 quarter
+    "step": 63,
+    "lookback": 60,
+    "features": None,
+    "epochs": 50,
+    "patience": 5,
+    "batch_size": 64,
+    "learning_rate": 0.001,
+}
+
+
+def make_folds(n_rows, train_size, val_size, step):
+    """Rolling (train_start, train_end, val_end) row ranges, oldest first.
+
+    Folds are anchored on the end of the history, so the newest rows are
+    always in the last fold's validation window.
+    """
+    folds = []
+    val_end = n_rows
+    while val_end - val_size - train_size >= 0:
+        train_end = val_end - val_size
+        folds.append((train_end - train_size, train_end, val_end))
+        val_end -= step
+    return folds[::-1]
+
+
+def _init_worker(threads):
+    # One process per fold chain; more intra-op threads than cores just thrash
+    torch.set_num_threads(threads)
+
+
+def _run_folds(task):
+    symbol, folds, params, warm_start, resume, save = task
+    history = ml_service.load_history(symbol)
+    service = ml_service.MLService(symbol)
+    lookback = params["lookback"]
+
+    if resume:
+        service.model, _ = ml_service.load_checkpoint(service.model_path, service.device)
+
+    rows = []
+    for train_start, train_end, val_end in folds:
+        if not warm_start:
+            service.model = None
+
+        train_windows = train_end - train_start - lookback
+        X, y = service.prepare_data(
+            history.iloc[train_start:val_end],
+            lookback=lookback,
+            features=params["features"],
+            train_windows=train_windows,
+        )
+        started = time.perf_counter()
+        result = service.fit(
+            X[:train_windows],
+            y[:train_windows],
+            X[train_windows:],
+            y[train_windows:],
+            epochs=params["epochs"],
+            batch_size=params["batch_size"],
+            learning_rate=params["learning_rate"],
+            patience=params["patience"],
+            verbose=False,
+        )
+        rows.append({
+            "symbol": symbol,
+            "train_start": history.index[train_start].strftime("%Y-%m-%d"),
+            "train_end": history.index[train_end - 1].strftime("%Y-%m-%d"),
+            "val_end": history.index[val_end - 1].strftime("%Y-%m-%d"),
+            "warm_start": warm_start and (resume or len(rows) > 0),
+            "epochs": result["epochs"],
+            "val_loss": result["val_loss"],
+            "seconds": time.perf_counter() - started,
+        })
+
+    if save and folds:
+        service.save(trained_through=rows[-1]["val_end"])
+        print(f"--- Saved {symbol} model trained through {rows[-1]['val_end']} ---")
+    return rows
+
+
+def _plan(symbol, params, warm_start, resume):
+    history = ml_service.load_history(symbol)
+    folds = make_folds(len(history), params["train_size"], params["val_size"], params["step"])
+
+    model_path, _ = ml_service.model_paths(symbol)
+    trained_through = None
+    if resume and warm_start and os.path.exists(model_path):
+        _, meta = ml_service.load_checkpoint(model_path)
+        if meta["lookback"] == params["lookback"] and (
+            params["features"] is None or meta["features"] == params["features"]
+        ):
+            trained_through = meta.get("trained_through")
+
+    # Daily retrains only need the folds that end after the saved model's data
+    if trained_through:
+        folds = [
+            fold for fold in folds
+            if history.index[fold[2] - 1].strftime("%Y-%m-%d") > trained_through
+        ]
+    return folds, trained_through is not None
+
+
+def walk_forward(symbols, warm_start=True, resume=True, processes=None, threads=1, output_path=None, **params):
+    """Walk-forward train each symbol over rolling folds of its cached history.
+
+    With ``warm_start`` each fold continues from the previous fold's weights,
+    so a symbol's folds run in order and symbols run in parallel; without it
+    every fold is independent and folds run in parallel. ``resume`` picks up
+    from the saved model and only trains folds newer than it. The last fold's
+    model is saved as the symbol's model. Returns one row per fold.
+    """
+    params = {**DEFAULT_PARAMS, **params}
+    tasks = []
+    for symbol in symbols:
+        folds, resumed = _plan(symbol, params, warm_start, resume)
+        if not folds:
+            print(f"--- {symbol} model is already trained through the latest data ---")
+        elif warm_start:
+            tasks.append((symbol, folds, params, True, resumed, True))
+        else:
+            tasks.extend(
+                (symbol, [fold], params, False, False, i == len(folds) - 1)
+                for i, fold in enumerate(folds)
+            )
+
+    processes = processes or max(1, (os.cpu_count() or 1) // threads)
+    if processes == 1 or len(tasks) <= 1:
+        _init_worker(threads)
+        results = [_run_folds(task) for task in tasks]
+    else:
+        # spawn: forking after torch has started its thread pools can deadlock
+        with ProcessPoolExecutor(
+            max_workers=min(processes, len(tasks)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(threads,),
+        ) as executor:
+            results = list(executor.map(_run_folds, tasks))
+
+    folds = pd.DataFrame([row for rows in results for row in rows])
+    if output_path:
+        folds.to_csv(output_path, index=False)
+        print(f"--- Wrote {len(folds)} walk-forward folds to {output_path} ---")
+    return folds
+
+
+if __name__ == "__main__":
+    import sys
+
+    print(walk_forward(sys.argv[1:] or ["SPY"]).to_string(index=False))
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Never reach a real gateway or broker, and keep the database out of the tree
+os.environ["IB_STUB"] = "1"
+os.environ["IB_BROKER_ADDRESS"] = ""
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+
+# order_service imports the app's db, so the app has to be loaded before any
+# service that pulls in ib_service
+import app  # noqa: E402,F401
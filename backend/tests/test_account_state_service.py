@@ -0,0 +1,94 @@
+from collections import deque
+
+import pytest
+from ib_async import AccountValue, Contract, PortfolioItem
+
+from services import account_state_service
+
+HISTORY_SIZE = 5
+
+
+@pytest.fixture(autouse=True)
+def state(monkeypatch):
+    monkeypatch.setattr(account_state_service, "_account", {})
+    monkeypatch.setattr(account_state_service, "_portfolio", {})
+    monkeypatch.setattr(account_state_service, "_version", 0)
+    monkeypatch.setattr(account_state_service, "_changes", deque(maxlen=HISTORY_SIZE))
+    monkeypatch.setattr(
+        account_state_service, "_snapshot", {"version": 0, "account": {}, "portfolio": []}
+    )
+
+
+def _value(tag, value, currency="USD"):
+    return AccountValue(account="DU1", tag=tag, value=value, currency=currency, modelCode="")
+
+
+def _item(con_id, position, price=1.0):
+    contract = Contract(conId=con_id, symbol=f"SYM{con_id}", secType="STK", exchange="SMART")
+    return PortfolioItem(contract, position, price, position * price, price, 0.0, 0.0, "DU1")
+
+
+def _version():
+    return account_state_service.get_snapshot()["version"]
+
+
+def test_no_changes_since_current_version():
+    account_state_service.on_account_value(_value("NetLiquidation", "1000"))
+
+    delta = account_state_service.get_changes(_version())
+
+    assert delta == {"version": _version(), "account": {}, "portfolio": {}}
+
+
+def test_delta_holds_only_updated_keys():
+    account_state_service.on_account_value(_value("NetLiquidation", "1000"))
+    account_state_service.on_portfolio_item(_item(1, 10))
+    since = _version()
+
+    account_state_service.on_account_value(_value("NetLiquidation", "1100"))
+    account_state_service.on_account_value(_value("NetLiquidation", "1200"))
+    account_state_service.on_portfolio_item(_item(2, 5))
+    # Unchanged values do not bump the version
+    account_state_service.on_portfolio_item(_item(1, 10))
+
+    delta = account_state_service.get_changes(since)
+
+    assert delta["version"] == since + 3
+    assert delta["account"] == {"NetLiquidation": ("1200", "USD")}
+    assert list(delta["portfolio"]) == ["2"]
+    assert delta["portfolio"]["2"]["position"] == 5
+
+
+def test_closed_position_is_sent_as_none():
+    account_state_service.on_portfolio_item(_item(1, 10))
+    since = _version()
+
+    account_state_service.on_portfolio_item(_item(1, 0))
+
+    assert account_state_service.get_changes(since)["portfolio"] == {"1": None}
+    assert account_state_service.get_snapshot()["portfolio"] == []
+
+
+def test_version_from_the_future_needs_a_snapshot():
+    account_state_service.on_account_value(_value("NetLiquidation", "1000"))
+
+    assert account_state_service.get_changes(_version() + 1) is None
+
+
+def test_client_too_far_behind_needs_a_snapshot():
+    for i in range(HISTORY_SIZE + 1):
+        account_state_service.on_account_value(_value("NetLiquidation", str(i)))
+
+    assert account_state_service.get_changes(0) is None
+    assert account_state_service.get_changes(1) is not None
+
+
+def test_versions_from_before_a_reset_need_a_snapshot():
+    account_state_service.on_account_value(_value("NetLiquidation", "1000"))
+    since = _version()
+
+    account_state_service.reset()
+    account_state_service.on_account_value(_value("NetLiquidation", "1000"))
+
+    assert account_state_service.get_changes(since) is None
+    assert account_state_service.get_changes(_version()) is not None
@@ -0,0 +1,48 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import backtest_service, option_chain_store
+
+TRADING_AGENTS_DIR = os.path.join(option_chain_store.PROJECT_ROOT, "TradingAgents")
+
+
+@pytest.fixture(scope="module", autouse=True)
+def chain_store():
+    # Converts Historical-Data/ on the first run, a no-op afterwards
+    option_chain_store.ingest_historical_data()
+
+
+@pytest.mark.parametrize(
+    "decisions, expected",
+    [
+        ("credit_spread_decisions.csv", "test1/backtest_results.csv"),
+        ("credit_spread_decisions_test2.csv", "test2/backtest_results2.csv"),
+    ],
+)
+def test_run_backtest_reproduces_saved_results(decisions, expected):
+    results = backtest_service.run_backtest(
+        backtest_service.load_decisions(os.path.join(TRADING_AGENTS_DIR, decisions))
+    )
+    saved = pd.read_csv(os.path.join(TRADING_AGENTS_DIR, "backtestResults", expected))
+
+    # Compared as written to CSV, the way the saved results were produced
+    written = pd.read_csv(io.StringIO(results.to_csv(index=False)))
+    pd.testing.assert_frame_equal(written, saved)
+
+
+def test_settle_backtest_without_chain_history(monkeypatch):
+    empty = (np.array([], dtype="datetime64[D]"), np.array([]))
+    monkeypatch.setattr(option_chain_store, "get_underlying_closes", lambda: empty)
+    results = backtest_service.run_backtest(
+        backtest_service.load_decisions(
+            os.path.join(TRADING_AGENTS_DIR, "credit_spread_decisions_test2.csv")
+        )
+    )
+
+    settled = backtest_service.settle_backtest(results)
+    assert len(settled) == len(results)
+    assert settled["pnl"].isna().all()
@@ -0,0 +1,66 @@
+import numpy as np
+from scipy.optimize import brentq
+
+from services import greeks_service
+
+RATE = greeks_service.RISK_FREE_RATE
+DIVIDEND_YIELD = greeks_service.DIVIDEND_YIELD
+
+
+def _contracts(n, seed=0):
+    rng = np.random.default_rng(seed)
+    spot = rng.uniform(400, 600, n)
+    strike = spot * rng.uniform(0.7, 1.3, n)
+    years = rng.uniform(1 / 365, 1.0, n)
+    sigma = rng.uniform(0.05, 1.5, n)
+    is_call = rng.random(n) < 0.5
+    return spot, strike, years, sigma, is_call
+
+
+def test_implied_volatility_matches_brentq():
+    spot, strike, years, sigma, is_call = _contracts(500)
+    price = greeks_service.black_scholes_price(spot, strike, years, RATE, DIVIDEND_YIELD, sigma, is_call)
+
+    iv = greeks_service.implied_volatility(price, spot, strike, years, RATE, DIVIDEND_YIELD, is_call)
+
+    expected = np.full(len(price), np.nan)
+    for i in range(len(price)):
+        def error(vol):
+            return (
+                greeks_service.black_scholes_price(
+                    spot[i], strike[i], years[i], RATE, DIVIDEND_YIELD, vol, is_call[i]
+                )
+                - price[i]
+            )
+
+        # No root within [IV_LOWER, IV_UPPER]: the solver must give NaN as well
+        if error(greeks_service.IV_LOWER) < 0 < error(greeks_service.IV_UPPER):
+            expected[i] = brentq(error, greeks_service.IV_LOWER, greeks_service.IV_UPPER, xtol=1e-12)
+
+    solvable = np.isfinite(expected)
+    assert solvable.sum() > 400
+    np.testing.assert_array_equal(np.isfinite(iv), solvable)
+
+    # Both solve to within IV_TOLERANCE in price...
+    repriced = greeks_service.black_scholes_price(
+        spot[solvable], strike[solvable], years[solvable], RATE, DIVIDEND_YIELD, iv[solvable], is_call[solvable]
+    )
+    np.testing.assert_allclose(repriced, price[solvable], rtol=0, atol=greeks_service.IV_TOLERANCE)
+    # ...which pins the vol down wherever the price moves with it
+    vega = greeks_service.greeks(spot, strike, years, RATE, DIVIDEND_YIELD, sigma, is_call)["vega"] * 100
+    sensitive = solvable & (vega > 0.01)
+    assert sensitive.sum() > 300
+    np.testing.assert_allclose(iv[sensitive], expected[sensitive], rtol=0, atol=1e-4)
+
+
+def test_implied_volatility_rejects_prices_outside_arbitrage_bounds():
+    spot = np.array([500.0, 500.0, 500.0, 500.0])
+    strike = np.array([450.0, 550.0, 500.0, 500.0])
+    years = np.array([0.1, 0.1, 0.1, 0.0])
+    is_call = np.array([True, False, True, True])
+    # Below intrinsic, below intrinsic, above the spot, expired
+    price = np.array([10.0, 10.0, 600.0, 5.0])
+
+    iv = greeks_service.implied_volatility(price, spot, strike, years, RATE, DIVIDEND_YIELD, is_call)
+
+    assert np.isnan(iv).all()
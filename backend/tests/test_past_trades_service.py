@@ -0,0 +1,104 @@
+import base64
+import csv
+import json
+
+import pytest
+
+import app as app_module
+from services import past_trades_service
+
+FIELDS = ["run_timestamp_utc", "symbol", "prediction_for_trade_date", "direction", "confidence"]
+
+
+def _write(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def trades_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(past_trades_service, "PAST_TRADES_DIR", str(tmp_path))
+    monkeypatch.setattr(past_trades_service, "_files", {})
+    monkeypatch.setattr(past_trades_service, "_index", ([], [], {}, {}))
+    monkeypatch.setattr(past_trades_service, "_checked_at", None)
+
+    _write(tmp_path / "a.csv", [
+        {"run_timestamp_utc": f"2025-01-0{day}T00:00:00", "symbol": "SPY",
+         "prediction_for_trade_date": f"2025-01-0{day + 1}", "direction": "UP", "confidence": day}
+        for day in range(1, 6)
+    ])
+    _write(tmp_path / "b.csv", [
+        {"run_timestamp_utc": f"2025-01-0{day}T12:00:00", "symbol": "QQQ",
+         "prediction_for_trade_date": f"2025-01-0{day + 1}", "direction": "DOWN", "confidence": 10 + day}
+        for day in range(1, 4)
+    ])
+    past_trades_service.refresh(force=True)
+    return tmp_path
+
+
+def _encode(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def test_pages_walk_every_trade_newest_first(trades_dir):
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = past_trades_service.get_past_trades(limit=3, cursor=cursor)
+        seen.extend(page)
+        if cursor is None:
+            break
+        assert len(page) == 3
+
+    timestamps = [trade["run_timestamp_utc"] for trade in seen]
+    assert len(timestamps) == 8
+    assert timestamps == sorted(timestamps, reverse=True)
+
+
+def test_filters_combine_with_paging(trades_dir):
+    page, cursor = past_trades_service.get_past_trades(limit=2, symbol="spy")
+    assert [trade["confidence"] for trade in page] == [5, 4]
+
+    page, cursor = past_trades_service.get_past_trades(limit=2, cursor=cursor, symbol="spy")
+    assert [trade["confidence"] for trade in page] == [3, 2]
+
+    page, _ = past_trades_service.get_past_trades(
+        direction="down", start_date="2025-01-03", end_date="2025-01-04"
+    )
+    assert [trade["confidence"] for trade in page] == [13, 12]
+
+
+def test_cursor_round_trips(trades_dir):
+    key = ("2025-01-03T00:00:00", "a.csv", 2)
+    assert past_trades_service.decode_cursor(past_trades_service.encode_cursor(key)) == key
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        base64.urlsafe_b64encode(b"not json").decode(),
+        _encode(["2025-01-03T00:00:00", "a.csv"]),
+        _encode(["2025-01-03T00:00:00", "a.csv", 2, 0]),
+        _encode([20250103, "a.csv", 2]),
+        _encode(["2025-01-03T00:00:00", None, 2]),
+        _encode(["2025-01-03T00:00:00", "a.csv", "2"]),
+        _encode(["2025-01-03T00:00:00", "a.csv", 2.0]),
+        _encode(["2025-01-03T00:00:00", "a.csv", True]),
+        _encode(42),
+    ],
+)
+def test_invalid_cursor_is_rejected(trades_dir, cursor):
+    with pytest.raises(ValueError):
+        past_trades_service.get_past_trades(limit=2, cursor=cursor)
+
+
+def test_route_answers_invalid_cursor_with_400(trades_dir):
+    client = app_module.app.test_client()
+
+    response = client.get("/api/trading/past-trades", query_string={"cursor": "bad"})
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid cursor"}
@@ -0,0 +1,73 @@
+import numpy as np
+
+from services import greeks_service, risk_service
+
+RATE = greeks_service.RISK_FREE_RATE
+DIVIDEND_YIELD = greeks_service.DIVIDEND_YIELD
+
+
+def _legs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    spot = rng.choice([450.0, 520.0, 610.0], n)
+    strike = np.round(spot * rng.uniform(0.85, 1.15, n))
+    years = rng.uniform(0, 60, n) / 365
+    iv = rng.uniform(0.1, 0.6, n)
+    is_call = rng.random(n) < 0.5
+    price = greeks_service.black_scholes_price(spot, strike, years, RATE, DIVIDEND_YIELD, iv, is_call)
+    units = rng.choice([-3, -1, 1, 2], n) * 100.0
+    return {
+        "spot": spot,
+        "strike": strike,
+        "T": years,
+        "iv": iv,
+        "is_call": is_call,
+        "price": price,
+        "units": units,
+    }
+
+
+def _brute_force(legs, move_axis, iv_axis, day_axis):
+    pnl = np.zeros((len(move_axis), len(iv_axis), len(day_axis)))
+    for leg in range(len(legs["units"])):
+        for i, move in enumerate(move_axis):
+            for j, shift in enumerate(iv_axis):
+                for k, days in enumerate(day_axis):
+                    value = greeks_service.black_scholes_price(
+                        legs["spot"][leg] * (1 + move),
+                        legs["strike"][leg],
+                        max(legs["T"][leg] - days / 365, risk_service.MIN_YEARS),
+                        RATE,
+                        DIVIDEND_YIELD,
+                        max(legs["iv"][leg] + shift, greeks_service.IV_LOWER),
+                        legs["is_call"][leg],
+                    )
+                    pnl[i, j, k] += (value - legs["price"][leg]) * legs["units"][leg]
+    return pnl
+
+
+def test_scenario_pnl_matches_black_scholes_loop():
+    legs = _legs(12)
+    move_axis = np.linspace(-0.2, 0.2, 9)
+    iv_axis = np.linspace(-0.1, 0.1, 5)
+    # Runs past some expirations, where legs are worth their intrinsic value
+    day_axis = np.arange(0, 70, 10, dtype=np.float64)
+
+    pnl = risk_service.scenario_pnl(legs, move_axis, iv_axis, day_axis, RATE, DIVIDEND_YIELD)
+
+    expected = _brute_force(legs, move_axis, iv_axis, day_axis)
+    assert pnl.shape == expected.shape
+    # Calls are priced in float32 with an approximate normal CDF; the error
+    # scales with the notional, not with the P&L
+    notional = np.sum(np.abs(legs["units"]) * legs["spot"] * 1.2)
+    np.testing.assert_allclose(pnl, expected, rtol=0, atol=notional * 1e-6)
+
+
+def test_scenario_pnl_is_zero_at_the_origin():
+    legs = _legs(40, seed=1)
+
+    pnl = risk_service.scenario_pnl(
+        legs, np.array([0.0]), np.array([0.0]), np.array([0.0]), RATE, DIVIDEND_YIELD
+    )
+
+    notional = np.sum(np.abs(legs["units"]) * legs["spot"])
+    assert abs(pnl[0, 0, 0]) < notional * 1e-6
@@ -12,32 +12,47 @@ const Chart: React.FC = () => {
   const [loading, setLoading] = useState<boolean>(true);
 
   useEffect(() => {
-    const fetchChartData = async () => {
-      try {
-        // Using 'SPY' as a default symbol for portfolio performance proxy
-        const response = await fetch('/api/trading/historic-data/SPY');
-        if (!response.ok) {
-          throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        const result = await response.json();
-        if (result.data) {
-          const formattedData = result.data.map((item: any) => ({
-            Date: new Date(item.Date).toLocaleDateString(),
-            Close: item.Close,
-          }));
-          setData(formattedData);
-        } else {
-          setError("No data received from server.");
-        }
-      } catch (e: any) {
-        setError(`Failed to fetch chart data: ${e.message}`);
-        console.error("Error fetching chart data:", e);
-      } finally {
-        setLoading(false);
+    const toChartData = (item: any): ChartData => ({
+      Date: new Date(item.Date).toLocaleDateString(),
+      Close: item.Close,
+    });
+
+    // Using 'SPY' as a default symbol for portfolio performance proxy.
+    // The server keeps one live subscription per symbol and pushes bar updates.
+    const source = new EventSource('/api/trading/historic-data/SPY/stream');
+
+    source.addEventListener('snapshot', (event) => {
+      const result = JSON.parse((event as MessageEvent).data);
+      if (result.data) {
+        setData(result.data.map(toChartData));
+        setError(null);
+      } else {
+        setError("No data received from server.");
       }
+      setLoading(false);
+    });
+
+    source.addEventListener('bar', (event) => {
+      const update = JSON.parse((event as MessageEvent).data);
+      const bar = toChartData(update.bar);
+      setData((prev) => {
+        if (!prev) return [bar];
+        return update.newBar ? [...prev, bar] : [...prev.slice(0, -1), bar];
+      });
+    });
+
+    source.onerror = () => {
+      // EventSource reconnects on its own; only surface errors before the first snapshot
+      setLoading((stillLoading) => {
+        if (stillLoading) {
+          setError("Failed to fetch chart data: stream unavailable");
+          console.error("Error streaming chart data.");
+        }
+        return false;
+      });
     };
 
-    fetchChartData();
+    return () => source.close();
   }, []);
 
   if (loading) {
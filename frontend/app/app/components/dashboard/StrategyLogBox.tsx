@@ -25,7 +25,7 @@ const StrategyLogBox: React.FC = () => {
   useEffect(() => {
     const fetchStrategyLog = async () => {
       try {
-        const response = await fetch('/api/trading/strategy-log');
+        const response = await fetch('/api/trading/strategy-log?fields=final_trade_decision,market_report,sentiment_report,news_report,investment_plan');
         if (response.ok) {
           const data = await response.json();
           setLogData(data);